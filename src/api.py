@@ -1,35 +1,50 @@
-from fastapi import FastAPI, HTTPException, Body, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Body, BackgroundTasks, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel, Field
 from typing import Dict, List, Optional, Any, Union
 from enum import Enum
 from uuid import uuid4
+import hmac
 import json
 import os
 import time
 import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
+try:
+    from src.utils.logger import Logger, get_logger
+    from src.utils.log_context import log_context
+    from src.utils.profiling import request_profiling
+except ImportError:
+    from utils.logger import Logger, get_logger
+    from utils.log_context import log_context
+    from utils.profiling import request_profiling
+logger = get_logger(__name__)
 
-# Import the actual CrewAI integration
+# Import the actual CrewAI integration (cheap: crewai and the crews load lazily, see warmup below)
 try:
-    from src.crew import run_prompt_weaver_crew
+    from src.crew import (
+        run_prompt_weaver_crew, run_prompt_weaver_variants, refine_prompt, start_background_warmup, warmup_status
+    )
     logger.info("Successfully imported run_prompt_weaver_crew function from src.crew")
 except ImportError:
     try:
         # Try alternative import if the first one fails
-        from crew import run_prompt_weaver_crew
+        from crew import (
+            run_prompt_weaver_crew, run_prompt_weaver_variants, refine_prompt, start_background_warmup, warmup_status
+        )
         logger.info("Successfully imported run_prompt_weaver_crew function from crew")
     except ImportError:
         logger.error("Failed to import run_prompt_weaver_crew! Using fallback implementation.")
         
         # Fallback implementation if imports fail
-        def run_prompt_weaver_crew(instruction: str) -> str:
+        def run_prompt_weaver_crew(instruction: str, stage_sink: Optional[Dict[str, str]] = None) -> str:
             """Fallback implementation when crew.py is not available"""
             logger.warning(f"Using fallback implementation for prompt: {instruction[:50]}...")
             return f"""# {instruction.title()}
@@ -52,7 +67,168 @@ This prompt was generated by the fallback implementation, as the main CrewAI int
 - Maintain proper structure
 """
 
-app = FastAPI(title="PromptWeaver A2A API")
+        def run_prompt_weaver_variants(instruction: str, n: int = 3, rank: bool = True, lean_mode: Optional[bool] = None) -> List[Dict[str, Any]]:
+            """Fallback implementation: a single variant from the fallback crew"""
+            return [{"variant": 1, "prompt": run_prompt_weaver_crew(instruction)}]
+
+        def refine_prompt(instruction: str, stages: Dict[str, str], feedback: str):
+            """Fallback implementation: refinement is unavailable without crew.py"""
+            return "Error: Prompt refinement is unavailable (crew.py could not be loaded).", stages
+
+        def start_background_warmup(presets: Optional[bool] = None, rerun: bool = False):
+            """Fallback implementation: nothing to warm up"""
+            return None
+
+        def warmup_status() -> Dict[str, Any]:
+            """Fallback implementation: always ready"""
+            return {"state": "ready", "ready": True, "steps": {}, "running": False}
+
+# Generated prompts are persisted by a background writer (see utils.output_writer)
+try:
+    from src.utils.output_writer import persist_output, shutdown_output_writer
+    from src.utils.prompt_search import save_prompt_search, search_prompts
+    from src.utils.metrics import register_collector, render as render_metrics, state_counts
+    from src.utils.usage import UsageLedger, collect_usage
+except ImportError:
+    from utils.output_writer import persist_output, shutdown_output_writer
+    from utils.prompt_search import save_prompt_search, search_prompts
+    from utils.metrics import register_collector, render as render_metrics, state_counts
+    from utils.usage import UsageLedger, collect_usage
+
+# Build crews in the background so uvicorn binds immediately and the first
+# request does not pay for importing crewai and loading knowledge.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP_ON_STARTUP:
+        logger.info("Starting background crew warmup")
+        start_background_warmup()
+    try:
+        yield
+    finally:
+        # Write any outputs still queued before the process exits, then the search index that covers them
+        await asyncio.to_thread(shutdown_output_writer)
+        await asyncio.to_thread(save_prompt_search)
+
+app = FastAPI(title="PromptWeaver A2A API", lifespan=lifespan)
+
+# === Health and readiness ===
+STARTED_AT = time.time()
+
+def is_ready() -> bool:
+    """Ready once the startup warmup has succeeded (always, when it is turned off)."""
+    return not WARMUP_ON_STARTUP or warmup_status()["ready"]
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and its event loop answers."""
+    return {"status": "ok", "uptime_s": round(time.time() - STARTED_AT, 1)}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 after the warmup, 503 while it runs or if the crews could not be built."""
+    status = warmup_status()
+    ready = is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else status["state"], "warmup": status},
+    )
+
+# === Admin access ===
+# With ADMIN_TOKEN set, /admin endpoints need it as "Authorization: Bearer <token>"
+# or "X-Admin-Token". Without it they only serve local clients that are not
+# browsers (no Origin header), since CORS allows every origin.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+LOOPBACK_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+def require_admin(request: Request):
+    """Dependency for admin endpoints (see ADMIN_TOKEN)."""
+    if ADMIN_TOKEN:
+        supplied = request.headers.get("x-admin-token") or request.headers.get("authorization", "")
+        if supplied.lower().startswith("bearer "):
+            supplied = supplied[7:]
+        if not hmac.compare_digest(supplied.strip().encode(), ADMIN_TOKEN.encode()):
+            raise HTTPException(status_code=401, detail="Admin token required")
+        return
+    host = request.client.host if request.client else ""
+    if host not in LOOPBACK_HOSTS or "origin" in request.headers:
+        raise HTTPException(status_code=403, detail="Admin endpoints need ADMIN_TOKEN for non-local or browser clients")
+
+@app.post("/admin/warmup", dependencies=[Depends(require_admin)])
+async def warmup_run(wait: bool = False):
+    """Run the warmup again (presets are precomputed only with WARMUP_PRESETS)."""
+    thread = start_background_warmup(rerun=True)
+    if wait and thread is not None:
+        await asyncio.to_thread(thread.join)
+    return warmup_status()
+
+# === Knowledge admin endpoints ===
+def _knowledge_admin():
+    try:
+        from src.tools import knowledge_index, knowledge_watcher, retrieval
+    except ImportError:
+        from tools import knowledge_index, knowledge_watcher, retrieval
+    return knowledge_index, knowledge_watcher, retrieval
+
+@app.get("/admin/knowledge", dependencies=[Depends(require_admin)])
+async def knowledge_status():
+    """Index version, last reload outcome and watcher state."""
+    knowledge_index, knowledge_watcher, retrieval = _knowledge_admin()
+    return {
+        **knowledge_index.get_reload_status(),
+        "watcher": knowledge_watcher.get_watcher_status(),
+        "retrieval_cache": retrieval.retrieval_cache.stats(),
+    }
+
+@app.post("/admin/knowledge/reload", dependencies=[Depends(require_admin)])
+async def knowledge_reload(background_tasks: BackgroundTasks, force: bool = False, wait: bool = False):
+    """Re-index changed knowledge files and swap the index into running crews."""
+    knowledge_index, _, _ = _knowledge_admin()
+    if wait:
+        return await asyncio.to_thread(knowledge_index.reload_knowledge_index, force)
+    background_tasks.add_task(knowledge_index.reload_knowledge_index, force)
+    return {"status": "scheduled", "force": force}
+
+# === Logging admin endpoints ===
+class LogLevelUpdate(BaseModel):
+    level: Optional[str] = None  # application loggers (LOG_LEVEL)
+    library_level: Optional[str] = None  # crewai, litellm, httpx, ... (LIBRARY_LOG_LEVEL)
+    loggers: Optional[Dict[str, str]] = None  # individual loggers by name
+
+@app.get("/admin/logging", dependencies=[Depends(require_admin)])
+async def logging_status():
+    """Current application and library log levels."""
+    return Logger.get_levels()
+
+@app.post("/admin/logging", dependencies=[Depends(require_admin)])
+async def logging_update(update: LogLevelUpdate):
+    """Change log levels without a restart (e.g. DEBUG for crewai while debugging a slow task)."""
+    try:
+        return Logger.set_levels(app=update.level, library=update.library_level, loggers=update.loggers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# === Metrics ===
+def _task_metrics():
+    """Task state counts at scrape time; submitted tasks are the ones waiting for a crew."""
+    counts = {state.value: 0 for state in TaskState}
+    for task in list(tasks_db.values()):
+        counts[TaskState(task["state"]).value] += 1
+    return [
+        state_counts("promptweaver_tasks", "A2A tasks by state.", counts),
+        ("promptweaver_task_queue_depth", "gauge", "A2A tasks submitted but not started yet.",
+         [("promptweaver_task_queue_depth", {}, counts[TaskState.SUBMITTED.value])]),
+        ("promptweaver_ready", "gauge", "1 once the startup warmup has finished (see /readyz).",
+         [("promptweaver_ready", {}, 1 if is_ready() else 0)]),
+    ]
+
+register_collector(_task_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: tasks, active runs, stage/LLM/retrieval latency, retries, fallbacks, caches, tokens."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # Configure CORS
 app.add_middleware(
@@ -112,6 +288,22 @@ class Task(BaseModel):
 
 # In-memory storage for tasks
 tasks_db = {}
+# Per-task stage outputs (analysis, research, draft, final...) reused for refinement
+task_stage_cache: Dict[str, Dict[str, str]] = {}
+# Token usage and estimated cost per task, including its refinements (see utils.usage)
+task_usage: Dict[str, UsageLedger] = {}
+
+def start_task(task_id: str, mode: str, coroutine_fn, *args):
+    """
+    Run a task coroutine in the background; its log records carry the task id
+    and mode. Tasks sent with "profile" are profiled (see utils.profiling) and
+    list their profile files in parameters["profiles"].
+    """
+    parameters = tasks_db[task_id]["parameters"]
+    profiles = parameters.setdefault("profiles", []) if parameters.get("profile") else None
+    # create_task copies the current context, so the fields apply to the whole task
+    with log_context(task_id=task_id, mode=mode), request_profiling(profiles is not None, profiles):
+        asyncio.create_task(coroutine_fn(task_id, *args))
 
 # Set environment variables based on mode
 async def set_mode_environment(mode: OperatingMode):
@@ -126,12 +318,19 @@ async def set_mode_environment(mode: OperatingMode):
     # You can set additional environment variables here if needed
     # os.environ["CREWAI_VERBOSE"] = "true"  # Uncomment to enable verbose CrewAI logs
 
+async def persist_prompt(prompt: str, instruction: str, **metadata):
+    """Save a generated prompt off the event loop (persist_output may wait for a full write queue, or write inline)."""
+    await asyncio.to_thread(persist_output, prompt, instruction, **metadata)
+
 # PromptWeaver crew execution
-async def run_promptweaver(task_id: str, description: str, mode: OperatingMode):
+async def run_promptweaver(task_id: str, description: str, mode: OperatingMode, variants: int = 1):
     """
     Runs the PromptWeaver crew to generate a prompt.
     This integrates with the actual crew.py implementation.
+    With variants > 1, analysis/research run once and N candidates are drafted.
     """
+    if variants > 1:
+        return await run_promptweaver_variants(task_id, description, mode, variants)
     try:
         # Update task state to working
         tasks_db[task_id]["state"] = TaskState.WORKING
@@ -145,7 +344,16 @@ async def run_promptweaver(task_id: str, description: str, mode: OperatingMode):
         logger.info(f"Mode: {mode.value}, Description: {description[:100]}...")
         
         # Actual call to the CrewAI implementation
-        prompt_result = run_prompt_weaver_crew(description)
+        stages: Dict[str, str] = {}
+        started = time.perf_counter()
+        # A regeneration after a follow-up adds to the task's existing ledger.
+        # The crew runs in a worker thread (the context, and with it the ledger,
+        # is copied along) so health checks and metrics scrapes still answer.
+        with collect_usage(task_usage.get(task_id)) as usage:
+            prompt_result = await asyncio.to_thread(run_prompt_weaver_crew, description, stage_sink=stages)
+        elapsed = time.perf_counter() - started
+        task_usage[task_id] = usage
+        tasks_db[task_id]["parameters"]["usage"] = usage.summary()
         logger.info(f"CrewAI execution completed for task {task_id}")
         
         # Check for error response
@@ -173,6 +381,11 @@ async def run_promptweaver(task_id: str, description: str, mode: OperatingMode):
                 ]
             )
             tasks_db[task_id]["state"] = TaskState.COMPLETED
+            # Only a successful run fills the stages; fallback prompts leave nothing to refine from
+            if stages:
+                task_stage_cache[task_id] = stages
+            await persist_prompt(prompt_result, description, mode=mode.value, timings={"total_s": round(elapsed, 2)},
+                                 usage=tasks_db[task_id]["parameters"]["usage"])
         
         # Update task with the result
         tasks_db[task_id]["messages"].append(agent_message)
@@ -195,6 +408,110 @@ async def run_promptweaver(task_id: str, description: str, mode: OperatingMode):
         tasks_db[task_id]["messages"].append(error_message)
         tasks_db[task_id]["updated_at"] = datetime.now().isoformat()
 
+async def run_promptweaver_variants(task_id: str, description: str, mode: OperatingMode, variants: int):
+    """
+    Generates several ranked prompt variants from a shared analysis/research pass.
+    Each variant is returned as its own text part, plus a data part with scores.
+    """
+    try:
+        tasks_db[task_id]["state"] = TaskState.WORKING
+        tasks_db[task_id]["updated_at"] = datetime.now().isoformat()
+
+        logger.info(f"Starting PromptWeaver variant generation for task {task_id} ({variants} variants)")
+        started = time.perf_counter()
+        with collect_usage(task_usage.get(task_id)) as usage:
+            results = await asyncio.to_thread(
+                run_prompt_weaver_variants,
+                description,
+                variants,
+                lean_mode=(mode == OperatingMode.LEAN),
+            )
+        task_usage[task_id] = usage
+        tasks_db[task_id]["parameters"]["usage"] = usage.summary()
+        successful = [r for r in results if not r["prompt"].startswith("Error:")]
+        logger.info(f"Variant generation completed for task {task_id}: {len(successful)}/{len(results)} succeeded")
+
+        if not successful:
+            tasks_db[task_id]["state"] = TaskState.FAILED
+            parts = [Part(type="text", text=f"Failed to generate prompt variants: {results[0]['prompt']}")]
+        else:
+            tasks_db[task_id]["state"] = TaskState.COMPLETED
+            parts = [
+                Part(
+                    type="text",
+                    text=f"Variant {r['variant']} ({r.get('framework', 'default')}, score {r.get('score', 'n/a')}):\n\n{r['prompt']}"
+                )
+                for r in successful
+            ]
+            parts.append(Part(
+                type="data",
+                data={"variants": [{k: v for k, v in r.items() if k != "prompt"} for r in successful]}
+            ))
+            # The usage is the task's running total, so only the best-ranked variant's record carries it
+            timings = {"total_s": round(time.perf_counter() - started, 2)}
+            for rank, r in enumerate(successful):
+                await persist_prompt(r["prompt"], description, mode=mode.value, timings=timings,
+                                     usage=tasks_db[task_id]["parameters"]["usage"] if rank == 0 else None)
+
+        tasks_db[task_id]["messages"].append(Message(role=MessageRole.AGENT, parts=parts))
+        tasks_db[task_id]["updated_at"] = datetime.now().isoformat()
+
+    except Exception as e:
+        logger.exception(f"Exception during PromptWeaver variant generation: {e}")
+        tasks_db[task_id]["state"] = TaskState.FAILED
+        tasks_db[task_id]["messages"].append(Message(
+            role=MessageRole.AGENT,
+            parts=[Part(type="text", text=f"An error occurred while generating prompt variants: {str(e)}")]
+        ))
+        tasks_db[task_id]["updated_at"] = datetime.now().isoformat()
+
+async def run_promptweaver_refinement(task_id: str, feedback: str):
+    """
+    Refines a completed task's prompt with the user's follow-up feedback,
+    reusing the cached analysis/research outputs (draft + finalize only).
+    """
+    try:
+        tasks_db[task_id]["state"] = TaskState.WORKING
+        tasks_db[task_id]["updated_at"] = datetime.now().isoformat()
+
+        instruction = tasks_db[task_id]["parameters"]["description"]
+        logger.info(f"Starting refinement for task {task_id}: {feedback[:100]}...")
+        started = time.perf_counter()
+        with collect_usage(task_usage.get(task_id)) as usage:
+            refined, stages = await asyncio.to_thread(
+                refine_prompt, instruction, task_stage_cache[task_id], feedback
+            )
+        task_usage[task_id] = usage
+        tasks_db[task_id]["parameters"]["usage"] = usage.summary()
+
+        if refined.startswith("Error:"):
+            logger.error(f"Refinement failed for task {task_id}: {refined}")
+            tasks_db[task_id]["state"] = TaskState.FAILED
+            text = f"Failed to refine prompt: {refined}"
+        else:
+            task_stage_cache[task_id] = stages
+            parameters = tasks_db[task_id]["parameters"]
+            parameters["refinements"] = parameters.get("refinements", 0) + 1
+            tasks_db[task_id]["state"] = TaskState.COMPLETED
+            text = f"Here's your refined prompt:\n\n{refined}"
+            # Usage is the task's running total, including the original generation
+            await persist_prompt(refined, instruction, mode=parameters["mode"],
+                                 timings={"total_s": round(time.perf_counter() - started, 2)}, usage=parameters["usage"])
+
+        tasks_db[task_id]["messages"].append(
+            Message(role=MessageRole.AGENT, parts=[Part(type="text", text=text)])
+        )
+        tasks_db[task_id]["updated_at"] = datetime.now().isoformat()
+
+    except Exception as e:
+        logger.exception(f"Exception during PromptWeaver refinement: {e}")
+        tasks_db[task_id]["state"] = TaskState.FAILED
+        tasks_db[task_id]["messages"].append(Message(
+            role=MessageRole.AGENT,
+            parts=[Part(type="text", text=f"An error occurred while refining the prompt: {str(e)}")]
+        ))
+        tasks_db[task_id]["updated_at"] = datetime.now().isoformat()
+
 # A2A Protocol Endpoints
 @app.post("/a2a", response_model=Dict[str, Any])
 async def handle_jsonrpc(request: Dict[str, Any] = Body(...)):
@@ -214,6 +531,8 @@ async def handle_jsonrpc(request: Dict[str, Any] = Body(...)):
         return await handle_tasks_get(params, id)
     elif method == "tasks/cancel":
         return await handle_tasks_cancel(params, id)
+    elif method == "prompts/search":
+        return await handle_prompts_search(params, id)
     else:
         return {
             "jsonrpc": "2.0",
@@ -240,6 +559,8 @@ async def handle_tasks_send(params: Dict[str, Any], id: Any):
         # Extract description from user message
         description = None
         mode = OperatingMode.LEAN  # Default mode
+        variants = 1  # Number of candidate prompts to generate
+        profile = False  # Profile the crew runs (see utils.profiling)
         
         for part in user_message.parts:
             if part.type == "text":
@@ -247,12 +568,16 @@ async def handle_tasks_send(params: Dict[str, Any], id: Any):
             elif part.type == "data" and part.data:
                 if "mode" in part.data:
                     mode = OperatingMode(part.data["mode"])
+                if "variants" in part.data:
+                    variants = int(part.data["variants"])
+                if "profile" in part.data:
+                    profile = bool(part.data["profile"])
         
         if not description:
             raise ValueError("User message must contain a text part")
         
         # Log the received task
-        logger.info(f"Received task: ID={task_id}, Mode={mode.value}")
+        logger.info(f"Received task: ID={task_id}, Mode={mode.value}, Variants={variants}")
         logger.info(f"Description: {description[:100]}...")
         
         # Create or update task
@@ -264,16 +589,41 @@ async def handle_tasks_send(params: Dict[str, Any], id: Any):
                 "messages": [user_message],
                 "created_at": datetime.now().isoformat(),
                 "updated_at": datetime.now().isoformat(),
-                "parameters": {"mode": mode.value, "description": description}
+                "parameters": {"mode": mode.value, "description": description, "variants": variants}
             }
+            if profile:
+                task["parameters"]["profile"] = True
             tasks_db[task_id] = task
             
             # Process the task asynchronously
-            asyncio.create_task(run_promptweaver(task_id, description, mode))
+            start_task(task_id, mode.value, run_promptweaver, description, mode, variants)
         else:
-            # Update existing task
+            # Follow-up message on an existing task: treat it as refinement feedback
+            state = tasks_db[task_id]["state"]
+            if state in [TaskState.FAILED, TaskState.CANCELED]:
+                raise ValueError(f"Task {task_id} is {TaskState(state).value}; send the instruction as a new task")
             tasks_db[task_id]["messages"].append(user_message)
             tasks_db[task_id]["updated_at"] = datetime.now().isoformat()
+            if profile:
+                tasks_db[task_id]["parameters"]["profile"] = True
+
+            if state in [TaskState.SUBMITTED, TaskState.WORKING]:
+                logger.info(f"Task {task_id} is still running; follow-up message recorded without refinement.")
+            elif task_id in task_stage_cache:
+                # Reuse cached analysis/research and re-run only draft + finalize
+                tasks_db[task_id]["state"] = TaskState.SUBMITTED
+                start_task(task_id, tasks_db[task_id]["parameters"]["mode"], run_promptweaver_refinement, description)
+            else:
+                # Nothing cached (variants, or a fallback prompt): regenerate with the feedback folded in,
+                # in the task's own mode rather than the follow-up message's default
+                parameters = tasks_db[task_id]["parameters"]
+                task_mode = OperatingMode(parameters["mode"])
+                tasks_db[task_id]["state"] = TaskState.SUBMITTED
+                start_task(
+                    task_id, task_mode.value, run_promptweaver,
+                    f"{parameters['description']}\n\nAdditional feedback: {description}", task_mode,
+                    parameters.get("variants", 1),
+                )
         
         # Return the task
         return {
@@ -313,6 +663,39 @@ async def handle_tasks_get(params: Dict[str, Any], id: Any):
             "id": id
         }
 
+async def handle_prompts_search(params: Dict[str, Any], id: Any):
+    """
+    Handle prompts/search method: full-text search over previously generated prompts.
+    Params: query (required), limit (default 10), offset (default 0).
+    """
+    try:
+        query = (params.get("query") or "").strip()
+        if not query:
+            raise ValueError("Search query is required")
+        try:
+            limit = max(1, min(int(params.get("limit", 10)), 100))
+            offset = max(int(params.get("offset", 0)), 0)
+        except (TypeError, ValueError):
+            return {
+                "jsonrpc": "2.0",
+                "error": {"code": -32602, "message": "Invalid params: limit and offset must be integers"},
+                "id": id
+            }
+        result = await asyncio.to_thread(search_prompts, query, limit, offset)
+        return {
+            "jsonrpc": "2.0",
+            "result": result,
+            "id": id
+        }
+
+    except Exception as e:
+        logger.exception(f"Error handling prompts/search: {e}")
+        return {
+            "jsonrpc": "2.0",
+            "error": {"code": -32000, "message": str(e)},
+            "id": id
+        }
+
 async def handle_tasks_cancel(params: Dict[str, Any], id: Any):
     """
     Handle tasks/cancel method to cancel a task
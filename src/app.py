@@ -2,6 +2,7 @@
 
 import os
 import sys
+import time
 import logging
 import streamlit as st
 from dotenv import load_dotenv
@@ -27,10 +28,17 @@ try:
     logger.info("Logger loaded successfully for Streamlit.")
 
     # Then import other modules
-    from src.crew import run_prompt_weaver_crew, OPERATING_MODE, USE_LEAN_MODE
-    from src.utils.output_writer import save_clean_output
+    from src.crew import run_prompt_weaver_crew, start_background_warmup, OPERATING_MODE, USE_LEAN_MODE
+    from src.presets import PRESETS
+    from src.utils.output_writer import persist_output
+    from src.utils.prompt_search import search_prompts
+    from src.utils.prompt_store import get_prompt_store
+    from src.utils.usage import collect_usage
 
     logger.info("Streamlit App imports successful using absolute imports.")
+
+    # Crews load lazily; build them in the background while the page renders
+    start_background_warmup()
 except ImportError as e:
     logger.error(
         f"CRITICAL Import Error: Failed to load core components: {e}. Application cannot start."
@@ -53,23 +61,7 @@ else:
     )
 
 # -- PRESET DEFINITIONS --------------------------------------
-PRESETS = {
-    "Breakthrough Business Idea": "Create a unique online business concept that requires zero upfront investment, leverages existing platforms, and has potential to scale to 7-figures. Include target audience, revenue model, and first 30-day action plan.",
-    "Passive Income Generator": "Design a scalable online business that can generate $5,000/month in passive income within 12 months. Focus on minimal maintenance, automation, and leveraging digital assets or platforms.",
-    "AI-Powered Startup": "Develop a business concept that uses AI tools to solve a meaningful problem for a specific industry. Include monetization strategy, competitive advantage, and why now is the perfect timing for this solution.",
-    "Micro-SaaS Opportunity": "Create a highly focused SaaS concept targeting a specific business pain point. Outline the solution, target market, pricing strategy, and how to build a minimum viable product with limited resources.",
-    "Bootstrapped Empire": "Design a business that can start with under $1,000 investment and scale to $1M+ annual revenue. Focus on high-margin digital products, viral growth mechanisms, and strategic partnerships.",
-    "Product Manager - Feature Pitch": "Create a compelling one-pager to pitch a new feature that drives user engagement. Include problem statement, proposed solution, success metrics, implementation timeline, and ROI projection.",
-    "Developer - API Documentation": "Generate comprehensive API documentation for a microservice. Include authentication methods, endpoints with request/response examples, error handling, rate limits, and integration best practices.",
-    "Newsletter Growth Strategy": "Develop a comprehensive plan to grow an email newsletter from 100 to 10,000 engaged subscribers in 6 months. Include content strategy, growth tactics, monetization options, and automation workflows.",
-    "QA Test Suite Creator": "Create detailed test cases for a critical user flow in a web/mobile application. Include happy paths, edge cases, security considerations, and performance testing scenarios.",
-    "Personal Brand Builder": "Design a 90-day strategy to establish yourself as a thought leader in your industry. Include content pillars, platform strategy, networking tactics, and visibility milestones.",
-    "Digital Product Launch": "Create a step-by-step launch strategy for a digital product (course, ebook, template, etc.) that maximizes initial sales and builds long-term momentum. Include pre-launch, launch day, and post-launch phases.",
-    "Niche Marketplace Concept": "Develop a concept for a specialized marketplace connecting buyers and sellers in an underserved niche. Include platform features, monetization model, and critical mass acquisition strategy.",
-    "Content Creator Expansion": "Design a strategy to expand a successful social media presence on one platform into a multi-channel brand with diverse revenue streams. Include content repurposing, audience migration, and monetization diversification.",
-    "B2B Service Positioning": "Create positioning for a B2B service that commands premium pricing. Include unique value proposition, ideal client profile, competitive differentiation, and sales messaging framework.",
-    "Community-Based Business": "Design a business model built around a passionate community. Include community structure, value exchange, monetization approach, and growth strategy that preserves culture.",
-}
+# PRESETS live in src/presets.py so the crew warmup can precompute them
 
 
 def load_preset(preset: str) -> str:
@@ -170,6 +162,8 @@ st.markdown(
 # -- SESSION STATE INIT --------------------------------------
 if "output" not in st.session_state:
     st.session_state.output = ""
+if "usage" not in st.session_state:
+    st.session_state.usage = None
 if "input_text" not in st.session_state:
     st.session_state.input_text = ""
 if "processing" not in st.session_state:
@@ -200,18 +194,22 @@ def call_crew_backend(user_input):
 
     try:
         # Call the imported function
-        final_prompt = run_prompt_weaver_crew(user_input)
+        started = time.perf_counter()
+        with collect_usage() as usage:
+            final_prompt = run_prompt_weaver_crew(user_input)
+        elapsed = time.perf_counter() - started
+        st.session_state.usage = usage.summary()
         logger.info(f"Crew backend call completed. Output: {final_prompt[:100]}...")
 
-        # Save output (handle potential errors)
+        # Save output in the background (handle potential errors)
         try:
-            # Define output directory relative to project root
-            output_dir = os.path.join(parent_dir, "output")
-            os.makedirs(output_dir, exist_ok=True)
-            save_clean_output(
-                prompt=final_prompt, instruction=user_input, output_dir=output_dir
+            # Saved to the project's output/ store (OUTPUT_DIR), which the history search reads
+            persist_output(
+                prompt=final_prompt, instruction=user_input,
+                mode=OPERATING_MODE.lower(), timings={"total_s": round(elapsed, 2)},
+                usage=st.session_state.usage,
             )
-            logger.info("Streamlit saved output successfully.")
+            logger.info("Streamlit queued output for saving.")
         except Exception as e:
             logger.error(f"Streamlit failed to save output: {e}")
             st.warning(f"Note: Could not save output file due to error: {e}")
@@ -344,6 +342,29 @@ with st.sidebar:
             # As a fallback if the script doesn't work
             st.rerun()
 
+    st.markdown("---")
+    st.markdown("### 🔎 Prompt History")
+    history_query = st.text_input(
+        "Search past prompts",
+        key="history_query",
+        placeholder="e.g., launch plan",
+        label_visibility="collapsed",
+    )
+    if history_query.strip():
+        try:
+            found = search_prompts(history_query, limit=10)
+            st.caption(f"{found['total']} matches in {found['took_ms']:.1f} ms")
+            for hit in found["results"]:
+                with st.expander(f"{hit.get('title') or hit['instruction'][:60]} · {hit['created_at'][:10]}"):
+                    st.caption(hit["snippet"])
+                    if st.button("Load prompt", key=f"history_{hit['id']}", use_container_width=True):
+                        st.session_state.output = get_prompt_store().read(hit["id"]) or ""
+                        st.session_state.usage = (get_prompt_store().get(hit["id"]) or {}).get("usage")
+                        st.rerun()
+        except Exception as e:
+            logger.error(f"Prompt history search failed: {e}")
+            st.warning(f"History search is unavailable: {e}")
+
     st.markdown("---")
     st.markdown("### About")
     st.info(
@@ -412,6 +433,18 @@ if st.session_state.output:
         # View raw markdown
         with st.expander("View Raw Markdown", expanded=False):
             st.code(st.session_state.output, language="markdown")
+
+        # Token usage and estimated cost of the generation
+        usage = st.session_state.usage
+        if usage and usage.get("calls"):
+            with st.expander(f"Token Usage · {usage['total_tokens']:,} tokens · ${usage['cost_usd']:.4f}", expanded=False):
+                st.table([
+                    {"stage": stage, "calls": row["calls"], "prompt tokens": row["prompt_tokens"],
+                     "completion tokens": row["completion_tokens"], "cost (USD)": f"{row['cost_usd']:.6f}"}
+                    for stage, row in usage["stages"].items()
+                ])
+                if usage.get("unpriced_models"):
+                    st.caption(f"No price configured for: {', '.join(usage['unpriced_models'])} (see LLM_PRICES)")
 else:
     st.info("Output will appear here after generation.")
 
@@ -0,0 +1,105 @@
+"""
+ANN benchmark: recall@k and query latency of the dense search backends.
+
+Generates a synthetic, clustered corpus of unit vectors (topics with noise, so
+it has the structure real embeddings have), computes exact neighbours with a
+flat scan and reports, per corpus size and configuration: build time, memory,
+recall@k against the exact neighbours, and p50/p99 query latency. Queries are
+perturbed corpus vectors.
+
+Usage:
+    python -m src.benchmarks.ann_benchmark --sizes 10000,100000,1000000 --dim 384
+    python -m src.benchmarks.ann_benchmark --sizes 100000 --nprobe 4,16,64 --budget-mb 64
+"""
+import time
+import argparse
+from typing import List
+
+import numpy as np
+
+from src.tools.ann_index import FlatIndex, IVFIndex, storage_for_budget
+
+LATENT_DIM = 24  # real embeddings vary along far fewer directions than they have dimensions
+TOPICS_PER_SQRT = 2  # topics = 2 * sqrt(size)
+NOISE = 0.9  # spread around a topic, and per-vector noise, relative to unit length
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def synthetic_corpus(size: int, dim: int, seed: int = 0) -> np.ndarray:
+    """
+    Unit vectors around 2*sqrt(size) topics that live in a shared low-rank
+    subspace, so neighbouring topics overlap the way embedding clusters do.
+    """
+    rng = np.random.default_rng(seed)
+    basis = rng.standard_normal((LATENT_DIM, dim), dtype=np.float32)
+    topics = _normalise(rng.standard_normal((max(1, int(TOPICS_PER_SQRT * size ** 0.5)), LATENT_DIM), dtype=np.float32))
+    corpus = np.empty((size, dim), dtype=np.float32)
+    for start in range(0, size, 65536):
+        stop = min(size, start + 65536)
+        latent = topics[rng.integers(len(topics), size=stop - start)]
+        latent = latent + rng.standard_normal(latent.shape, dtype=np.float32) * (NOISE / LATENT_DIM ** 0.5)
+        noise = rng.standard_normal((stop - start, dim), dtype=np.float32) * (NOISE / dim ** 0.5)
+        corpus[start:stop] = _normalise(_normalise(latent @ basis) + noise)
+    return corpus
+
+
+def _queries(corpus: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picks = corpus[rng.integers(len(corpus), size=count)]
+    return _normalise(picks + rng.standard_normal(picks.shape, dtype=np.float32) * (NOISE / corpus.shape[1] ** 0.5))
+
+
+def _measure(index, queries: np.ndarray, truth: List[set], k: int, **search_args):
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        ids, _ = index.search(query, k, **search_args)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len(expected.intersection(ids.tolist()))
+    return hits / (k * len(queries)), _percentile(latencies, 50), _percentile(latencies, 99)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ANN recall and latency on synthetic embeddings.")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated corpus sizes.")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension (default: 384, all-MiniLM-L6-v2).")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per configuration (default: 200).")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query for recall@k (default: 10).")
+    parser.add_argument("--nprobe", default="4,16,64", help="Comma-separated IVF nprobe values.")
+    parser.add_argument("--budget-mb", type=float, default=0, help="Memory budget for IVF vectors (0 = unlimited).")
+    args = parser.parse_args(argv)
+
+    print(f"{'chunks':>9} {'configuration':<28} {'build s':>8} {'MB':>8} "
+          f"{'recall@' + str(args.k):>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        corpus = synthetic_corpus(size, args.dim)
+        queries = _queries(corpus, args.queries)
+
+        flat = FlatIndex(corpus)
+        truth = [set(flat.search(query, args.k)[0].tolist()) for query in queries]
+        recall, p50, p99 = _measure(flat, queries, truth, args.k)
+        print(f"{size:>9} {'flat (exact)':<28} {0:>8.2f} {flat.nbytes / 2 ** 20:>8.1f} "
+              f"{recall:>10.3f} {p50:>8.3f} {p99:>8.3f}")
+
+        storage = storage_for_budget(size, args.dim, args.budget_mb)
+        started = time.perf_counter()
+        ivf = IVFIndex(corpus, storage=storage)
+        build_s = time.perf_counter() - started
+        for nprobe in [int(n) for n in args.nprobe.split(",")]:
+            recall, p50, p99 = _measure(ivf, queries, truth, args.k, nprobe=nprobe)
+            label = f"ivf {storage} nprobe={min(nprobe, ivf.nlist)}/{ivf.nlist}"
+            print(f"{size:>9} {label:<28} {build_s:>8.2f} {ivf.nbytes / 2 ** 20:>8.1f} "
+                  f"{recall:>10.3f} {p50:>8.3f} {p99:>8.3f}")
+        del corpus, flat, ivf
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Embedding benchmark: default (torch) vs ONNX vs int8-quantized ONNX encoders.
+
+Encodes the knowledge chunks with each backend and reports chunks/sec, plus
+single-query latency (uncached) and cached query latency through embed_query.
+
+Usage:
+    python -m src.benchmarks.embedding_benchmark --queries 50
+"""
+import time
+import argparse
+from typing import List
+
+from src.tools import embeddings
+from src.tools.docling_tool import get_knowledge_files
+from src.tools.ingest import ingest_file
+
+BACKENDS = [("torch", "torch", "none"), ("onnx", "onnx", "none"), ("onnx-int8", "onnx", "int8")]
+QUERIES = ["RISEN framework", "few-shot prompting", "chain of thought", "DeepSeek cheatsheet", "output format JSON"]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _corpus() -> List[str]:
+    from pathlib import Path
+    files, knowledge_dir = get_knowledge_files("knowledge")
+    return [chunk["text"] for name in sorted(files) for chunk in ingest_file(Path(knowledge_dir) / name)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends.")
+    parser.add_argument("--queries", type=int, default=50, help="Single-query encodes per backend (default: 50).")
+    args = parser.parse_args(argv)
+
+    try:
+        import sentence_transformers  # noqa: F401
+    except ImportError:
+        print("sentence-transformers is not installed; nothing to benchmark.")
+        return
+
+    texts = _corpus()
+    print(f"Corpus: {len(texts)} chunks, batch size {embeddings.EMBEDDING_BATCH_SIZE}, "
+          f"{embeddings.EMBEDDING_THREADS} threads\n")
+    print(f"{'backend':<10} {'load s':>7} {'chunks/sec':>11} {'query p50 ms':>13} {'query p99 ms':>13}")
+    for label, backend, quantize in BACKENDS:
+        try:
+            started = time.perf_counter()
+            model = embeddings.load_encoder(backend, quantize)
+            load_s = time.perf_counter() - started
+        except Exception as e:
+            print(f"{label:<10} unavailable ({str(e).splitlines()[0][:60]})")
+            continue
+        model.encode(texts[:8], batch_size=8)  # warm up
+        started = time.perf_counter()
+        model.encode(texts, batch_size=embeddings.EMBEDDING_BATCH_SIZE, normalize_embeddings=True)
+        chunks_per_sec = len(texts) / (time.perf_counter() - started)
+        latencies = []
+        for i in range(args.queries):
+            started = time.perf_counter()
+            model.encode([QUERIES[i % len(QUERIES)]], normalize_embeddings=True)
+            latencies.append((time.perf_counter() - started) * 1000)
+        print(f"{label:<10} {load_s:>7.2f} {chunks_per_sec:>11.1f} "
+              f"{_percentile(latencies, 50):>13.2f} {_percentile(latencies, 99):>13.2f}")
+
+    # Cached path through the service (configured backend)
+    if embeddings.get_embedding_model() is not None:
+        for query in QUERIES:
+            embeddings.embed_query(query)
+        started = time.perf_counter()
+        for i in range(args.queries):
+            embeddings.embed_query(QUERIES[i % len(QUERIES)])
+        cached_us = (time.perf_counter() - started) * 1e6 / args.queries
+        print(f"\nembed_query cached: {cached_us:.1f} us/query ({embeddings.query_cache_info()})")
+
+
+if __name__ == "__main__":
+    main()
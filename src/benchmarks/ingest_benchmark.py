@@ -0,0 +1,57 @@
+"""
+Ingest benchmark: native Markdown/text ingestion vs docling conversion.
+
+Ingests every knowledge file through both paths (docling only if installed)
+and reports files/sec and chunks produced for each.
+
+Usage:
+    python -m src.benchmarks.ingest_benchmark --repeat 5
+"""
+import time
+import argparse
+from pathlib import Path
+from typing import Callable, List
+
+from src.tools.docling_tool import get_knowledge_files
+from src.tools.ingest import NATIVE_EXTENSIONS, chunk_markdown, convert_with_docling, ingest_file
+
+
+def _time_path(paths: List[Path], ingest: Callable[[Path], list], repeat: int):
+    chunks = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        chunks = sum(len(ingest(path)) for path in paths)
+    elapsed = time.perf_counter() - started
+    return elapsed, chunks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark knowledge ingestion paths.")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the corpus per path (default: 5).")
+    args = parser.parse_args(argv)
+
+    files, knowledge_dir = get_knowledge_files("knowledge")
+    paths = [Path(knowledge_dir) / name for name in sorted(files)]
+    native = [path for path in paths if path.suffix.lower() in NATIVE_EXTENSIONS]
+    total_bytes = sum(path.stat().st_size for path in native)
+    print(f"Corpus: {len(paths)} files ({len(native)} Markdown/text, {total_bytes / 1024:.0f} KiB)\n")
+    print(f"{'path':<10} {'files':>6} {'chunks':>7} {'files/sec':>12} {'ms/file':>9}")
+
+    elapsed, chunks = _time_path(native, ingest_file, args.repeat)
+    processed = len(native) * args.repeat
+    print(f"{'native':<10} {len(native):>6} {chunks:>7} {processed / elapsed:>12.1f} {elapsed * 1000 / processed:>9.2f}")
+
+    try:
+        import docling  # noqa: F401
+    except ImportError:
+        print(f"{'docling':<10} {'-':>6} {'-':>7} {'not installed':>12}")
+        return
+    # First conversion loads docling's models; keep it out of the measurement
+    convert_with_docling(paths[0])
+    elapsed, chunks = _time_path(paths, lambda p: chunk_markdown(convert_with_docling(p), p.name), args.repeat)
+    processed = len(paths) * args.repeat
+    print(f"{'docling':<10} {len(paths):>6} {chunks:>7} {processed / elapsed:>12.1f} {elapsed * 1000 / processed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
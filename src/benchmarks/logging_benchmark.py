@@ -0,0 +1,112 @@
+"""
+Logging benchmark: per-call overhead on the calling thread.
+
+Compares the previous setup (console and FileHandler on the calling thread,
+print() captured with an ANSI-stripping, line-buffered file write) against
+the queue-based setup in utils.logger (callers enqueue; a listener thread
+formats, writes in batches and rotates). Console output goes to /dev/null in
+both cases. The time the listener needs to drain its queue is reported
+separately.
+
+Usage:
+    python -m src.benchmarks.logging_benchmark --calls 20000
+"""
+import os
+import time
+import queue
+import logging
+import logging.handlers
+import argparse
+import tempfile
+
+from src.utils.logger import (
+    ANSI_ESCAPE_PATTERN, APP_LOGGER_NAME, AppRecordFilter, BatchedStreamHandler, BatchingQueueListener,
+    CompressingRotatingFileHandler, ConsoleFormatter, FileFormatter, StdoutInterceptor,
+)
+
+
+class LegacyStdoutInterceptor:
+    """The previous print() capture: regex and file write on every call."""
+
+    def __init__(self, terminal, log_path):
+        self.terminal = terminal
+        self.log = open(log_path, "a", encoding="utf-8", buffering=1)
+
+    def write(self, message):
+        self.terminal.write(message)
+        self.log.write(ANSI_ESCAPE_PATTERN.sub('', message))
+
+    def flush(self):
+        self.terminal.flush()
+        self.log.flush()
+
+
+def _logger(name, *handlers):
+    logger = logging.getLogger(f"{APP_LOGGER_NAME}.bench.{name}")
+    logger.handlers = list(handlers)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def _per_call_us(fn, calls):
+    started = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - started) * 1e6 / calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark per-call logging overhead.")
+    parser.add_argument("--calls", type=int, default=20000, help="Log calls / prints per configuration (default: 20000).")
+    args = parser.parse_args(argv)
+
+    devnull = open(os.devnull, "w")
+    with tempfile.TemporaryDirectory() as log_dir:
+        # Previous: synchronous handlers
+        console = logging.StreamHandler(devnull)
+        console.setFormatter(ConsoleFormatter())
+        file_handler = logging.FileHandler(os.path.join(log_dir, "sync.log"), encoding="utf-8")
+        file_handler.setFormatter(FileFormatter())
+        sync_logger = _logger("sync", console, file_handler)
+        sync_log = _per_call_us(lambda i: sync_logger.info("request %d handled in %.2f ms", i, 1.5), args.calls)
+        legacy = LegacyStdoutInterceptor(devnull, os.path.join(log_dir, "sync_stdout.log"))
+        sync_print = _per_call_us(lambda i: print(f"\x1b[32mstep {i} done\x1b[0m", file=legacy), args.calls)
+        file_handler.close()
+
+        # Queue-based, listener running (its work competes with the caller for the GIL)
+        queued_log, queued_print, _ = _queued(log_dir, "running", devnull, args.calls, start_first=True)
+        # Queue-based, enqueue cost alone (the listener starts after the calls)
+        enqueue_log, enqueue_print, drain_ms = _queued(log_dir, "deferred", devnull, args.calls, start_first=False)
+
+    print(f"{'call':<12} {'sync us/call':>13} {'queued us/call':>15} {'enqueue only':>13}")
+    print(f"{'logger.info':<12} {sync_log:>13.2f} {queued_log:>15.2f} {enqueue_log:>13.2f}")
+    print(f"{'print':<12} {sync_print:>13.2f} {queued_print:>15.2f} {enqueue_print:>13.2f}")
+    print(f"\nlistener wrote {2 * args.calls} queued items in {drain_ms:.1f} ms")
+
+
+def _queued(log_dir, name, devnull, calls, start_first):
+    log_queue = queue.SimpleQueue()
+    console = BatchedStreamHandler(devnull)
+    console.setFormatter(ConsoleFormatter())
+    console.addFilter(AppRecordFilter())
+    rotating = CompressingRotatingFileHandler(os.path.join(log_dir, f"{name}.log"))
+    rotating.setFormatter(FileFormatter())
+    listener = BatchingQueueListener(log_queue, console, rotating, file_handler=rotating)
+    if start_first:
+        listener.start()
+    logger = _logger(name, logging.handlers.QueueHandler(log_queue))
+    log_us = _per_call_us(lambda i: logger.info("request %d handled in %.2f ms", i, 1.5), calls)
+    interceptor = StdoutInterceptor(devnull, log_queue)
+    print_us = _per_call_us(lambda i: print(f"\x1b[32mstep {i} done\x1b[0m", file=interceptor), calls)
+    started = time.perf_counter()
+    if not start_first:
+        listener.start()
+    listener.stop()
+    drain_ms = (time.perf_counter() - started) * 1000
+    rotating.close()
+    return log_us, print_us, drain_ms
+
+
+if __name__ == "__main__":
+    main()
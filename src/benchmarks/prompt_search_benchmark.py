@@ -0,0 +1,75 @@
+"""
+Prompt history search benchmark: indexing rate and query latency.
+
+Indexes a synthetic prompt history (Zipf-distributed vocabulary, prompt-sized
+documents) directly into a PromptSearchIndex and reports p50/p99 latency for
+single-word, multi-word and prefix queries. Latency covers ranking; reading
+result records from the store is excluded since the synthetic documents have
+no blobs.
+
+Usage:
+    python -m src.benchmarks.prompt_search_benchmark --docs 100000
+"""
+import time
+import tempfile
+import argparse
+from typing import List
+
+import numpy as np
+
+from src.utils.prompt_search import PromptSearchIndex
+from src.utils.prompt_store import PromptStore
+
+VOCABULARY = 50000
+WORDS_PER_DOC = 150
+QUERIES = {
+    "one word": ["launch", "newsletter", "strategy", "python", "podcast"],
+    "three words": ["launch plan checklist", "email newsletter growth", "python api tutorial"],
+    "prefix": ["laun", "news", "strat", "pyth", "pod"],
+}
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _documents(count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    words = [f"w{i}" for i in range(VOCABULARY)]
+    # Query words are topic words: mid-frequency ranks, not the most common ones
+    topic_words = sorted({word for queries in QUERIES.values() for query in queries for word in query.split()})
+    for rank, word in zip(range(100, VOCABULARY, 97), topic_words):
+        words[rank] = word
+    for i in range(count):
+        picks = np.minimum(rng.zipf(1.2, WORDS_PER_DOC) - 1, VOCABULARY - 1)
+        yield f"doc{i}", " ".join(words[p] for p in picks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark prompt history search.")
+    parser.add_argument("--docs", type=int, default=100000, help="Synthetic prompts to index (default: 100000).")
+    parser.add_argument("--iterations", type=int, default=200, help="Queries per query type (default: 200).")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as root:
+        index = PromptSearchIndex(PromptStore(root))
+        started = time.perf_counter()
+        for record_id, text in _documents(args.docs):
+            index.add(record_id, text)
+        elapsed = time.perf_counter() - started
+        print(f"Indexed {args.docs} prompts in {elapsed:.1f}s ({args.docs / elapsed:.0f} docs/s), "
+              f"{len(index.postings)} terms\n")
+        print(f"{'query type':<12} {'p50 ms':>8} {'p99 ms':>8} {'avg matches':>12}")
+        for label, queries in QUERIES.items():
+            latencies, matches = [], 0
+            for i in range(args.iterations):
+                response = index.search(queries[i % len(queries)] + ("" if label == "prefix" else " "))
+                latencies.append(response["took_ms"])
+                matches += response["total"]
+            print(f"{label:<12} {_percentile(latencies, 50):>8.2f} {_percentile(latencies, 99):>8.2f} "
+                  f"{matches / args.iterations:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Retrieval benchmark: query latency of the hybrid knowledge retriever.
+
+Measures retriever construction time and per-query latency (p50/p99) for
+BM25-only and, when an embedding model is available, hybrid retrieval, plus
+the same queries served from the result cache. The hybrid figures include
+embedding the query.
+
+Usage:
+    python -m src.benchmarks.retrieval_benchmark --iterations 200
+"""
+import time
+import argparse
+from typing import List
+
+from src.tools.knowledge_index import get_knowledge_index
+from src.tools.retrieval import HybridRetriever, RetrievalCache
+
+QUERIES = [
+    "RISEN framework role instructions steps",
+    "few-shot examples for classification",
+    "chain of thought reasoning prompts",
+    "DeepSeek prompt tips",
+    "how to structure a system prompt",
+    "output format constraints JSON",
+    "PECRA purpose expectation context request action",
+    "retrieval augmented generation citations",
+]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _run(retriever: HybridRetriever, iterations: int, sources=None) -> List[float]:
+    latencies = []
+    for i in range(iterations):
+        query = QUERIES[i % len(QUERIES)]
+        started = time.perf_counter()
+        retriever.search(query, top_k=5, sources=sources)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark knowledge retrieval latency.")
+    parser.add_argument("--iterations", type=int, default=200, help="Queries per configuration (default: 200).")
+    args = parser.parse_args(argv)
+
+    index = get_knowledge_index()
+    started = time.perf_counter()
+    bm25_only = HybridRetriever(index, dense_weight=0.0)
+    build_ms = (time.perf_counter() - started) * 1000
+    print(f"Index {index.version}: {len(index.chunks)} chunks; retriever built in {build_ms:.1f} ms\n")
+    print(f"{'configuration':<24} {'p50 ms':>8} {'p99 ms':>8}")
+
+    cache = RetrievalCache(maxsize=len(QUERIES))
+    configurations = [("bm25", bm25_only, None), ("bm25 + source filter", bm25_only, ["deepseek"])]
+    if index.embeddings is not None:
+        configurations.append(("hybrid", HybridRetriever(index), None))
+        configurations.append(("hybrid, cached", HybridRetriever(index, cache=cache), None))
+    else:
+        configurations.append(("bm25, cached", HybridRetriever(index, dense_weight=0.0, cache=cache), None))
+    for label, retriever, sources in configurations:
+        _run(retriever, len(QUERIES), sources)  # warm caches
+        latencies = _run(retriever, args.iterations, sources)
+        print(f"{label:<24} {_percentile(latencies, 50):>8.3f} {_percentile(latencies, 99):>8.3f}")
+    if index.embeddings is None:
+        print(f"{'hybrid':<24} {'-':>8} {'-':>8}  (no embeddings in index)")
+    stats = cache.stats()
+    print(f"\ncache: {stats['hits']} hits, {stats['misses']} misses, hit rate {stats['hit_rate']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
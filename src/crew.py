@@ -1,12 +1,22 @@
 # src/crew.py
 
+from __future__ import annotations
+
 import os
 import sys
 import logging
+import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache, wraps
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
-from crewai import Agent, Task, Crew, Process
-from crewai.llm import LLM
-import openai  # For fallback mechanism
+
+# crewai (and through it litellm/openai), openai and docling are imported on
+# first use inside the functions below, so importing this module stays cheap.
+if TYPE_CHECKING:
+    from crewai import Agent, Task, Crew
+    from crewai.llm import LLM
 
 # --- Setup Logging ---
 # Configure basic logging first (will be enhanced if logger module loads)
@@ -71,25 +81,79 @@ except ImportError:
             return func(*args, **kwargs)
 
 try:
-    # Assuming tools/docling_tool.py exists in src/tools/
-    from .tools.docling_tool import get_docling_tool
-    knowledge_source_config = get_docling_tool()
-    if knowledge_source_config:
-         logger.info("Knowledge source configured successfully via get_docling_tool.")
-    else:
-         logger.info("get_docling_tool ran but returned no knowledge source config.")
+    from .utils.prompt_scorer import score_prompt
 except ImportError:
     try:
-        # Try direct import if relative import fails
-        from tools.docling_tool import get_docling_tool
+        from utils.prompt_scorer import score_prompt
+    except ImportError:
+        logger.warning("Could not import score_prompt from prompt_scorer. Variant ranking disabled.")
+        score_prompt = None
+
+# Correlation fields (task/run id, stage, mode, model) attached to every log record
+try:
+    from .utils.log_context import bind_context, current_context, new_run
+    from .utils.tracing import current_span, instrument_crewai_tasks, instrument_llm, span, stage_span, traced
+    from .utils.metrics import FALLBACKS, RUNS_ACTIVE
+    from .utils.profiling import profile_run
+except ImportError:
+    from utils.log_context import bind_context, current_context, new_run
+    from utils.tracing import current_span, instrument_crewai_tasks, instrument_llm, span, stage_span, traced
+    from utils.metrics import FALLBACKS, RUNS_ACTIVE
+    from utils.profiling import profile_run
+
+
+# Knowledge backend: "index" (prebuilt on-disk index + search tool) or "docling"
+# (legacy CrewDoclingSource, re-converts and re-embeds the corpus on every start)
+KNOWLEDGE_BACKEND = os.getenv("KNOWLEDGE_BACKEND", "index").lower()
+
+
+@lru_cache(maxsize=None)
+def get_knowledge_tools() -> Tuple[Any, ...]:
+    """Load the persistent knowledge index and return the researcher's hybrid search tool."""
+    try:
+        try:
+            from .tools.retrieval import get_retriever
+            from .tools.knowledge_search_tool import KnowledgeSearchTool
+            from .tools.knowledge_watcher import start_knowledge_watcher
+        except ImportError:
+            from tools.retrieval import get_retriever
+            from tools.knowledge_search_tool import KnowledgeSearchTool
+            from tools.knowledge_watcher import start_knowledge_watcher
+        # Loads the index and builds the BM25 postings before the first query
+        get_retriever()
+        # The tool resolves the current index on every call, so reloads go live without rebuilding crews
+        start_knowledge_watcher()
+        return (KnowledgeSearchTool(),)
+    except Exception as e:
+        logger.error(f"Failed to load knowledge index: {e}", exc_info=True)
+        return ()
+
+
+@lru_cache(maxsize=None)
+def get_knowledge_source():
+    """Configure the knowledge source on first use (docling conversion is slow)."""
+    try:
+        # Assuming tools/docling_tool.py exists in src/tools/
+        from .tools.docling_tool import get_docling_tool
         knowledge_source_config = get_docling_tool()
-        logger.info("Knowledge source configured successfully via direct import.")
+        if knowledge_source_config:
+             logger.info("Knowledge source configured successfully via get_docling_tool.")
+        else:
+             logger.info("get_docling_tool ran but returned no knowledge source config.")
+        return knowledge_source_config
     except ImportError:
-        logger.warning("Could not import get_docling_tool from docling_tool. Knowledge source disabled.")
-        knowledge_source_config = None
-except Exception as e:
-    logger.error(f"Failed to load knowledge source via get_docling_tool: {e}", exc_info=True)
-    knowledge_source_config = None
+        try:
+            # Try direct import if relative import fails
+            from tools.docling_tool import get_docling_tool
+            knowledge_source_config = get_docling_tool()
+            logger.info("Knowledge source configured successfully via direct import.")
+            return knowledge_source_config
+        except ImportError:
+            logger.warning("Could not import get_docling_tool from docling_tool. Knowledge source disabled.")
+            return None
+    except Exception as e:
+        logger.error(f"Failed to load knowledge source via get_docling_tool: {e}", exc_info=True)
+        return None
 
 
 # --- Configuration Flags (Read from Environment) ---
@@ -111,7 +175,6 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")  # Fallback to OpenAI if available
 # Configure OpenAI as fallback if available
 has_openai_fallback = bool(OPENAI_API_KEY)
 if has_openai_fallback:
-    openai.api_key = OPENAI_API_KEY
     logger.info("OpenAI fallback configured with API key.")
 else:
     logger.warning("No OpenAI fallback configured. Will rely only on OpenRouter.")
@@ -126,17 +189,25 @@ if not OPENROUTER_API_KEY:
         # raise EnvironmentError("Missing required API keys")
 
 # Create a fallback function for when OpenRouter fails
+@traced("llm.fallback_completion", require_parent=True)
 def fallback_completion(prompt):
     """Fallback to OpenAI API when OpenRouter fails"""
     try:
         if has_openai_fallback:
             logger.info("Using OpenAI fallback for completion")
+            import openai  # Deferred: only needed when OpenRouter fails
+            openai.api_key = OPENAI_API_KEY
             response = openai.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.7,
                 max_tokens=2000
             )
+            current = current_span()
+            current.set_attribute("llm.model", "openai/gpt-3.5-turbo")
+            if getattr(response, "usage", None):
+                current.set_attribute("llm.prompt_tokens", response.usage.prompt_tokens)
+                current.set_attribute("llm.completion_tokens", response.usage.completion_tokens)
             return response.choices[0].message.content
         else:
             # Generate a simple response when no fallback is available
@@ -147,25 +218,42 @@ def fallback_completion(prompt):
         return "Error: Both primary and fallback LLM connections failed. Please check your API keys and network connection."
 
 # Setup the LLM configuration object
-try:
-    llm = LLM(
+@lru_cache(maxsize=None)
+def get_llm() -> LLM:
+    """Create the primary LLM configuration object on first use."""
+    from crewai.llm import LLM
+    try:
+        llm = LLM(
+            model=f"openrouter/{OPENROUTER_MODEL_ID}",
+            base_url="https://openrouter.ai/api/v1",
+            api_key=OPENROUTER_API_KEY,
+            # Add other LLM parameters like temperature if needed:
+            temperature=0.7
+        )
+        logger.info(f"LLM configured for model: openrouter/{OPENROUTER_MODEL_ID}")
+        return instrument_llm(llm)
+    except Exception as e:
+        logger.exception("Failed to initialize the LLM object!")
+        raise RuntimeError(f"LLM initialization failed: {e}") from e
+
+
+def create_llm(temperature: float) -> LLM:
+    """Create an LLM with the primary OpenRouter configuration but its own temperature."""
+    from crewai.llm import LLM
+    return instrument_llm(LLM(
         model=f"openrouter/{OPENROUTER_MODEL_ID}",
         base_url="https://openrouter.ai/api/v1",
         api_key=OPENROUTER_API_KEY,
-        # Add other LLM parameters like temperature if needed:
-        temperature=0.7
-    )
-    logger.info(f"LLM configured for model: openrouter/{OPENROUTER_MODEL_ID}")
-except Exception as e:
-    logger.exception("Failed to initialize the LLM object!")
-    raise RuntimeError(f"LLM initialization failed: {e}") from e
+        temperature=temperature
+    ))
 
 
 # === AGENTS Definition ===
 # Define all agents, some will only be added to the crew in Full mode
 
 # Wrap agent creation in a function to handle possible LLM failures
-def create_agent(role, goal, backstory):
+def create_agent(role, goal, backstory, agent_llm=None, tools=None):
+    from crewai import Agent
     try:
         return Agent(
             role=role,
@@ -173,7 +261,8 @@ def create_agent(role, goal, backstory):
             backstory=backstory,
             allow_delegation=False,
             verbose=CREWAI_VERBOSE,  # Use the environment variable here
-            llm=llm
+            llm=agent_llm or get_llm(),
+            tools=list(tools or [])
         )
     except Exception as e:
         logger.error(f"Failed to create agent {role}: {e}")
@@ -184,226 +273,763 @@ def create_agent(role, goal, backstory):
             backstory=backstory,
             allow_delegation=False,
             verbose=CREWAI_VERBOSE,  # Use the environment variable here
+            tools=list(tools or [])
             # If we get here, llm initialization failed, so we won't pass it
         )
 
-try:
-    requirements_analyst = create_agent(
-        role="Prompt Requirements Analyst",
-        goal="Understand the user's request, clarify intent, audience, format, and constraints.",
-        backstory="You specialize in breaking down vague or complex requests into clear, actionable specifications for prompt engineering."
-    )
+# Build the research stage from local retrieval instead of the knowledge researcher LLM call
+RETRIEVAL_ONLY_RESEARCH = os.getenv("RETRIEVAL_ONLY_RESEARCH", "false").lower() == "true"
+
+
+def build_retrieval_research(instruction: str, analysis: str) -> str:
+    """Deterministic research report (see tools/research_report.py)."""
+    try:
+        from .tools.research_report import build_research_report
+    except ImportError:
+        from tools.research_report import build_research_report
+    return build_research_report(instruction, analysis)
+
+# Add a planning flag to the Crew configuration
+PLANNING_ENABLED = os.getenv("PLANNING_ENABLED", "false").lower() == "true"
+PLANNING_LLM = os.getenv("PLANNING_LLM", "gpt-3.5-turbo")
+
+
+# === Crew Assembly (deferred to first use) ===
+# Agents, tasks and crews are built once, on first access, by
+# get_crew_components(). Module attributes such as prompt_engineering_crew
+# keep working through __getattr__ below.
+_crew_components: Optional[Dict[str, Any]] = None
+_crew_components_lock = threading.Lock()
+_warmup_thread: Optional[threading.Thread] = None
+
 
-    knowledge_researcher = create_agent(
-        role="Prompt Engineering Knowledge Specialist",
-        goal="Leverage the internal knowledge base to identify best frameworks, techniques, and examples, citing sources used.",
-        backstory=(
-            "You are trained on all internal prompt engineering references including blueprints, cheatsheets, "
-            "and logic guides. You meticulously search for relevant patterns and always cite the source files you use (e.g., from Blueprint.md)."
+def _build_crew_components() -> Dict[str, Any]:
+    from crewai import Task, Crew, Process
+
+    instrument_crewai_tasks()  # a tracing span per executed task
+    llm = get_llm()
+    knowledge_source_config = get_knowledge_source() if KNOWLEDGE_BACKEND == "docling" else None
+    knowledge_tools = get_knowledge_tools() if KNOWLEDGE_BACKEND == "index" else ()
+
+    try:
+        requirements_analyst = create_agent(
+            role="Prompt Requirements Analyst",
+            goal="Understand the user's request, clarify intent, audience, format, and constraints.",
+            backstory="You specialize in breaking down vague or complex requests into clear, actionable specifications for prompt engineering."
         )
-        # Tools are implicitly handled via crew's knowledge_sources
-    )
 
-    prompt_drafter = create_agent(
-        role="Creative Prompt Strategist",
-        goal="Generate a structured, LLM-optimized draft prompt using best-fit frameworks and research insights.",
-        backstory=(
-            "You're a highly creative prompt architect with deep expertise in crafting effective prompts using frameworks like PECRA, SCQA, RISEN. "
-            "You translate requirements and research into prompts with clarity, logical structure, and reusability focus."
+        knowledge_researcher = create_agent(
+            role="Prompt Engineering Knowledge Specialist",
+            goal="Leverage the internal knowledge base to identify best frameworks, techniques, and examples, citing sources used.",
+            backstory=(
+                "You are trained on all internal prompt engineering references including blueprints, cheatsheets, "
+                "and logic guides. You meticulously search for relevant patterns and always cite the source files you use (e.g., from Blueprint.md)."
+            ),
+            # Index backend: search tool over the prebuilt index; docling backend: crew knowledge_sources
+            tools=knowledge_tools
         )
-    )
 
-    prompt_architect = create_agent(
-        role="LLM Prompt Architect & Finisher",
-        goal="Polish and finalize the prompt into a clean, structured, and executable artifact, removing all meta-commentary.",
-        backstory=(
-            "You specialize in the final editorial pass for prompts, ensuring outputs are immaculate: clean structure, precise language, "
-            "perfect markdown formatting, and ready to be consumed directly by LLM APIs or chat UIs without further processing."
+        prompt_drafter = create_agent(
+            role="Creative Prompt Strategist",
+            goal="Generate a structured, LLM-optimized draft prompt using best-fit frameworks and research insights.",
+            backstory=(
+                "You're a highly creative prompt architect with deep expertise in crafting effective prompts using frameworks like PECRA, SCQA, RISEN. "
+                "You translate requirements and research into prompts with clarity, logical structure, and reusability focus."
+            )
         )
-    )
 
-    # --- Agents used ONLY in Full Mode ---
-    prompt_critic = create_agent(
-        role="Prompt Critic",
-        goal="Critically evaluate the draft prompt for structure, tone, clarity, and potential ambiguities. Offer actionable improvements.",
-        backstory="You identify flaws, logical gaps, unclear language, or framework misalignments in prompt drafts and provide constructive, specific feedback for refinement."
-    )
+        prompt_architect = create_agent(
+            role="LLM Prompt Architect & Finisher",
+            goal="Polish and finalize the prompt into a clean, structured, and executable artifact, removing all meta-commentary.",
+            backstory=(
+                "You specialize in the final editorial pass for prompts, ensuring outputs are immaculate: clean structure, precise language, "
+                "perfect markdown formatting, and ready to be consumed directly by LLM APIs or chat UIs without further processing."
+            )
+        )
 
-    structure_enforcer = create_agent(
-        role="Prompt Structure Validator",
-        goal="Check the draft prompt for strict adherence to formatting rules, section naming, and markdown cleanliness.",
-        backstory="You are the guardian of prompt structure. You ensure that all prompts strictly match the required markdown formatting, section headers, and contain no forbidden phrases or meta-text."
-    )
-    logger.info("All agent configurations defined.")
+        # --- Agents used ONLY in Full Mode ---
+        prompt_critic = create_agent(
+            role="Prompt Critic",
+            goal="Critically evaluate the draft prompt for structure, tone, clarity, and potential ambiguities. Offer actionable improvements.",
+            backstory="You identify flaws, logical gaps, unclear language, or framework misalignments in prompt drafts and provide constructive, specific feedback for refinement."
+        )
 
-except Exception as e:
-    logger.exception("Failed to define one or more agents!")
-    raise RuntimeError(f"Agent definition failed: {e}") from e
+        structure_enforcer = create_agent(
+            role="Prompt Structure Validator",
+            goal="Check the draft prompt for strict adherence to formatting rules, section naming, and markdown cleanliness.",
+            backstory="You are the guardian of prompt structure. You ensure that all prompts strictly match the required markdown formatting, section headers, and contain no forbidden phrases or meta-text."
+        )
+        logger.info("All agent configurations defined.")
 
-# === TASKS Definition ===
-# Define all tasks, some will only be added to the crew in Full mode
+    except Exception as e:
+        logger.exception("Failed to define one or more agents!")
+        raise RuntimeError(f"Agent definition failed: {e}") from e
 
-try:
-    task_analyze = Task(
-        description="Analyze the user's instruction: '{instruction}'. Identify the core objective, target audience/LLM, desired output format, key entities/context, and any implicit constraints or edge cases. Break down complex requests.",
-        expected_output=(
-
-            "A structured analysis document clearly outlining:\n"
-            "- Core Objective: The primary goal of the prompt.\n"
-            "- Target Audience/LLM: Who or what will use the prompt.\n"
-            "- Desired Output Format & Style: Key elements required.\n"
-            "- Key Information/Background Context: Necessary data points.\n"
-            "- Constraints & Edge Cases: Limitations or specific scenarios."
-        ),
-        agent=requirements_analyst,
-        # Human input is provided via crew.kickoff(inputs={'instruction': ...})
-    )
+    # === TASKS Definition ===
+    # Define all tasks, some will only be added to the crew in Full mode
 
-    task_research = Task(
-        description="Based on the analyzed requirements, research the internal knowledge base to find the most relevant prompt engineering frameworks (e.g., PECRA, SCQA, RISEN), techniques, model-specific advice, and examples. Synthesize these findings and explicitly cite the source documents consulted.",
-        expected_output=(
-
-            "A concise summary of relevant knowledge:\n"
-            "- Recommended Framework(s): Justification for suitability.\n"
-            "- Key Techniques: Applicable methods (e.g., few-shot, chain-of-thought).\n"
-            "- Model-Specific Notes: Relevant points from cheatsheets if applicable.\n"
-            "- Relevant Constraints/Best Practices: Warnings or guidelines from knowledge base.\n"
-            "- Source Files Cited: Explicit list (e.g., 'Consulted: Blueprint.md, Deepseek_Cheatsheet.md')."
-        ),
-        agent=knowledge_researcher,
-        context=[task_analyze] # Depends on the analysis output
-    )
+    try:
+        task_analyze = Task(
+            description="Analyze the user's instruction: '{instruction}'. Identify the core objective, target audience/LLM, desired output format, key entities/context, and any implicit constraints or edge cases. Break down complex requests.",
+            expected_output=(
+
+                "A structured analysis document clearly outlining:\n"
+                "- Core Objective: The primary goal of the prompt.\n"
+                "- Target Audience/LLM: Who or what will use the prompt.\n"
+                "- Desired Output Format & Style: Key elements required.\n"
+                "- Key Information/Background Context: Necessary data points.\n"
+                "- Constraints & Edge Cases: Limitations or specific scenarios."
+            ),
+            agent=requirements_analyst,
+            # Human input is provided via crew.kickoff(inputs={'instruction': ...})
+        )
 
-    task_draft = Task(
-        description="Draft the initial structured prompt using the analysis specification and the research findings (frameworks, techniques). Apply the recommended framework(s). Focus on clarity, logical structure, incorporating requirements, and reusability. Use Markdown formatting.",
-        expected_output=(
-
-            "A well-structured draft prompt in Markdown format, including preliminary sections based on requirements and research:\n"
-            "- Title (Clear, Title Case)\n"
-            "- ## Objective\n"
-            "- ## Context / Persona (if applicable)\n"
-            "- ## Workflow Steps / Instructions\n"
-            "- ## Constraints / Rules\n"
-            "- ## Validation Criteria (if applicable)\n"
-            "- ## Examples (if applicable)"
-        ),
-        agent=prompt_drafter,
-        context=[task_analyze, task_research] # Depends on analysis and research
-    )
+        task_research = Task(
+            description="Based on the analyzed requirements, research the internal knowledge base to find the most relevant prompt engineering frameworks (e.g., PECRA, SCQA, RISEN), techniques, model-specific advice, and examples. Synthesize these findings and explicitly cite the source documents consulted.",
+            expected_output=(
+
+                "A concise summary of relevant knowledge:\n"
+                "- Recommended Framework(s): Justification for suitability.\n"
+                "- Key Techniques: Applicable methods (e.g., few-shot, chain-of-thought).\n"
+                "- Model-Specific Notes: Relevant points from cheatsheets if applicable.\n"
+                "- Relevant Constraints/Best Practices: Warnings or guidelines from knowledge base.\n"
+                "- Source Files Cited: Explicit list (e.g., 'Consulted: Blueprint.md, Deepseek_Cheatsheet.md')."
+            ),
+            agent=knowledge_researcher,
+            context=[task_analyze] # Depends on the analysis output
+        )
 
-    # --- Tasks used ONLY in Full Mode ---
-    task_critique = Task(
-        description="Critically review the draft prompt provided by the drafter. Compare it against the original requirements and knowledge base best practices. Identify areas for improvement regarding logic, clarity, completeness, effectiveness, framework fidelity, and tone. Provide specific, actionable suggestions.",
-        expected_output=(
-
-            "A bullet-point critique listing specific weaknesses found in the draft and concrete suggestions for improvement.\n"
-            "Example Format:\n"
-            "- Issue: Workflow step 3 is ambiguous.\n  Suggestion: Reword to specify the exact input expected.\n"
-            "- Issue: Persona definition lacks detail.\n  Suggestion: Add 2-3 more sentences describing motivations based on Context section."
-        ),
-        agent=prompt_critic,
-        context=[task_draft, task_analyze, task_research] # Needs draft and original requirements/research for comparison
-    )
+        task_draft = Task(
+            description="Draft the initial structured prompt using the analysis specification and the research findings (frameworks, techniques). Apply the recommended framework(s). Focus on clarity, logical structure, incorporating requirements, and reusability. Use Markdown formatting.",
+            expected_output=(
+
+                "A well-structured draft prompt in Markdown format, including preliminary sections based on requirements and research:\n"
+                "- Title (Clear, Title Case)\n"
+                "- ## Objective\n"
+                "- ## Context / Persona (if applicable)\n"
+                "- ## Workflow Steps / Instructions\n"
+                "- ## Constraints / Rules\n"
+                "- ## Validation Criteria (if applicable)\n"
+                "- ## Examples (if applicable)"
+            ),
+            agent=prompt_drafter,
+            context=[task_analyze, task_research] # Depends on analysis and research
+        )
 
-    task_validate = Task(
-        description="Validate the structure and formatting of the draft prompt against predefined rules. Check for required sections (Objective, Context, etc. if applicable), correct Markdown usage (headers, lists, code blocks), adherence to naming conventions, and absence of forbidden meta-text (like 'Feedback:', 'Notes:').",
-        expected_output=(
-
-            "A concise structure validation report:\n"
-            "- Overall Status: Pass / Fail\n"
-            "- Missing Sections: [List of missing required sections, or 'None']\n"
-            "- Formatting Issues: [Description of any Markdown errors, or 'None']\n"
-            "- Meta-Text Found: [Details of forbidden text, or 'None']"
-        ),
-        agent=structure_enforcer,
-        context=[task_draft] # Primarily checks the draft's structure
-    )
+        # --- Tasks used ONLY in Full Mode ---
+        task_critique = Task(
+            description="Critically review the draft prompt provided by the drafter. Compare it against the original requirements and knowledge base best practices. Identify areas for improvement regarding logic, clarity, completeness, effectiveness, framework fidelity, and tone. Provide specific, actionable suggestions.",
+            expected_output=(
+
+                "A bullet-point critique listing specific weaknesses found in the draft and concrete suggestions for improvement.\n"
+                "Example Format:\n"
+                "- Issue: Workflow step 3 is ambiguous.\n  Suggestion: Reword to specify the exact input expected.\n"
+                "- Issue: Persona definition lacks detail.\n  Suggestion: Add 2-3 more sentences describing motivations based on Context section."
+            ),
+            agent=prompt_critic,
+            context=[task_draft, task_analyze, task_research] # Needs draft and original requirements/research for comparison
+        )
+
+        task_validate = Task(
+            description="Validate the structure and formatting of the draft prompt against predefined rules. Check for required sections (Objective, Context, etc. if applicable), correct Markdown usage (headers, lists, code blocks), adherence to naming conventions, and absence of forbidden meta-text (like 'Feedback:', 'Notes:').",
+            expected_output=(
+
+                "A concise structure validation report:\n"
+                "- Overall Status: Pass / Fail\n"
+                "- Missing Sections: [List of missing required sections, or 'None']\n"
+                "- Formatting Issues: [Description of any Markdown errors, or 'None']\n"
+                "- Meta-Text Found: [Details of forbidden text, or 'None']"
+            ),
+            agent=structure_enforcer,
+            context=[task_draft] # Primarily checks the draft's structure
+        )
+
+        # --- Final Task Definition (Context depends on mode) ---
+        # Define the context list dynamically based on the operating mode
+        finalize_context_tasks = [task_draft] + (
+            [task_critique, task_validate] if not USE_LEAN_MODE else []
+        )
+
+        # Define the optional final note string
+        final_llm_instruction_note = (
+            "\n\n**Instruction to LLM: Execute this prompt directly. No clarification needed.**"
+            if INCLUDE_LLM_EXEC_NOTE else ""
+        )
+
+        task_finalize = Task(
+            description=(
+                "Synthesize the draft prompt and incorporate feedback/validation results (from critique and structure validation tasks, if available) to create the final, polished, execution-ready prompt. "
+                "Ensure perfect Markdown formatting, logical structure, absolute clarity, and adherence to all requirements. "
+                "Crucially, remove ALL meta-commentary, critique summaries, validation reports, scores, or any text not part of the final prompt itself. "
+                f"Append the following directive ONLY if configured: '{final_llm_instruction_note.strip()}'"
+            ),
+            expected_output=(
+
+                 "The final, clean, professional, execution-ready prompt in Markdown format. It must contain ONLY the prompt content, perfectly structured and free of any internal notes, commentary, or artifacts from the generation process."
+            ),
+            agent=prompt_architect,
+            context=finalize_context_tasks # Use the dynamically defined context list
+        )
+        logger.info("All task configurations defined.")
+
+    except Exception as e:
+        logger.exception("Failed to define one or more tasks!")
+        raise RuntimeError(f"Task definition failed: {e}") from e
+
+
+    # === Assemble Crew based on Mode ===
+    # Initialize lists
+    agents_list = [requirements_analyst, knowledge_researcher, prompt_drafter, prompt_architect]
+    tasks_list = [task_analyze, task_research, task_draft] # Core sequence
+    # Stage name for each entry of tasks_list (used to cache per-stage outputs)
+    stage_names = ["analysis", "research", "draft"]
+
+    # Add full mode agents and tasks if not in lean mode
+    if not USE_LEAN_MODE:
+        # Insert agents in the logical processing order
+        agents_list.insert(3, prompt_critic)      # Critic reviews draft
+        agents_list.insert(4, structure_enforcer) # Validator checks draft structure
+        # Append tasks in the logical processing order
+        tasks_list.append(task_critique)          # Critique happens after draft
+        tasks_list.append(task_validate)          # Validation happens after draft (or critique)
+        stage_names += ["critique", "validation"]
+        logger.info("Added Critic and Validator agents/tasks for Full Mode.")
+
+    # Add the final task which depends on the mode's context
+    tasks_list.append(task_finalize)
+    stage_names.append("final")
+
+    # Update the Crew instance to include the planning flag if enabled
+    try:
+        prompt_engineering_crew = Crew(
+            agents=agents_list,
+            tasks=tasks_list,
+            knowledge_sources=[knowledge_source_config] if knowledge_source_config else [],
+            process=Process.sequential,  # Ensures tasks run in the defined list order
+            verbose=CREWAI_VERBOSE,  # Use the environment variable here
+            planning=True,  # Add planning flag
+            # planning_llm=PLANNING_LLM if PLANNING_ENABLED else None  # Specify the planning LLM if planning is enabled
+            # memory=True # Uncomment if long-term memory across tasks is needed
+        )
+        logger.info(f"Prompt Engineering Crew assembled successfully for {OPERATING_MODE} Mode (Verbose: {CREWAI_VERBOSE}, Planning: {PLANNING_ENABLED}).")
+        if CREWAI_VERBOSE and logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Agents in crew: {[agent.role for agent in agents_list]}")
+            logger.debug(f"Tasks in crew: {[task.description[:50]+'...' for task in tasks_list]}")
+
+    except Exception as e:
+        logger.exception("CRITICAL: Failed to assemble the CrewAI crew object!")
+        raise RuntimeError(f"Crew object assembly failed: {e}") from e
+
+    # Upstream template: analysis + research only. Never kicked off directly;
+    # every run works on a copy so concurrent requests don't share task state.
+    try:
+        upstream_crew = Crew(
+            agents=[requirements_analyst, knowledge_researcher],
+            tasks=[task_analyze, task_research],
+            knowledge_sources=[knowledge_source_config] if knowledge_source_config else [],
+            process=Process.sequential,
+            verbose=CREWAI_VERBOSE,
+        )
+    except Exception as e:
+        logger.exception("CRITICAL: Failed to assemble the upstream (analysis/research) crew!")
+        raise RuntimeError(f"Upstream crew assembly failed: {e}") from e
+
+    # Analysis only: used when RETRIEVAL_ONLY_RESEARCH replaces the research task
+    try:
+        analysis_crew = Crew(
+            agents=[requirements_analyst],
+            tasks=[task_analyze],
+            process=Process.sequential,
+            verbose=CREWAI_VERBOSE,
+        )
+    except Exception as e:
+        logger.exception("CRITICAL: Failed to assemble the analysis crew!")
+        raise RuntimeError(f"Analysis crew assembly failed: {e}") from e
+
+    return {
+        "llm": llm,
+        "knowledge_source_config": knowledge_source_config,
+        "requirements_analyst": requirements_analyst,
+        "knowledge_researcher": knowledge_researcher,
+        "prompt_drafter": prompt_drafter,
+        "prompt_architect": prompt_architect,
+        "prompt_critic": prompt_critic,
+        "structure_enforcer": structure_enforcer,
+        "task_analyze": task_analyze,
+        "task_research": task_research,
+        "task_draft": task_draft,
+        "task_critique": task_critique,
+        "task_validate": task_validate,
+        "task_finalize": task_finalize,
+        "finalize_context_tasks": finalize_context_tasks,
+        "final_llm_instruction_note": final_llm_instruction_note,
+        "agents_list": agents_list,
+        "tasks_list": tasks_list,
+        "stage_names": stage_names,
+        "prompt_engineering_crew": prompt_engineering_crew,
+        "upstream_crew": upstream_crew,
+        "analysis_crew": analysis_crew,
+    }
+
+
+def get_crew_components() -> Dict[str, Any]:
+    """
+    Return the assembled agents, tasks and crews, building them on first call.
+
+    Thread-safe: concurrent first callers (e.g. a background warmup and the
+    first request) wait for a single build.
+    """
+    global _crew_components
+    if _crew_components is None:
+        with _crew_components_lock:
+            if _crew_components is None:
+                started = time.perf_counter()
+                _crew_components = _build_crew_components()
+                logger.info(f"Crew components built in {time.perf_counter() - started:.2f}s.")
+    return _crew_components
+
+
+_LAZY_ATTRIBUTES = {
+    "llm", "knowledge_source_config",
+    "requirements_analyst", "knowledge_researcher", "prompt_drafter", "prompt_architect",
+    "prompt_critic", "structure_enforcer",
+    "task_analyze", "task_research", "task_draft", "task_critique", "task_validate", "task_finalize",
+    "finalize_context_tasks", "final_llm_instruction_note",
+    "agents_list", "tasks_list", "stage_names", "prompt_engineering_crew", "upstream_crew",
+    "analysis_crew",
+}
+
+
+def __getattr__(name: str) -> Any:
+    # PEP 562: build the crew lazily when a caller asks for one of its components
+    if name in _LAZY_ATTRIBUTES:
+        return get_crew_components()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# --- Startup warmup (readiness flips once it has finished, see the A2A /readyz) ---
+# Open the primary LLM client's HTTP connection during warmup
+WARMUP_CONNECTIONS = os.getenv("WARMUP_CONNECTIONS", "true").lower() == "true"
+# Generate prompts for the UI presets during warmup (full crew runs: slow and billed)
+WARMUP_PRESETS = os.getenv("WARMUP_PRESETS", "false").lower() == "true"
+WARMUP_PRESET_CONCURRENCY = int(os.getenv("WARMUP_PRESET_CONCURRENCY", "2"))
+# How long a precomputed preset prompt is served; a warmup re-run regenerates expired ones
+WARMUP_PRESET_TTL_S = float(os.getenv("WARMUP_PRESET_TTL_S", "3600"))
+
+_warmup_status: Dict[str, Any] = {"state": "pending", "ready": False, "steps": {}}
+# Preset instruction -> (prompt, stage outputs, expiry time), served by run_prompt_weaver_crew
+_precomputed: Dict[str, Tuple[str, Dict[str, str], float]] = {}
+
+
+def _precomputed_prompt(instruction: str) -> Optional[Tuple[str, Dict[str, str]]]:
+    """The unexpired precomputed (prompt, stage outputs) for an instruction, else None."""
+    entry = _precomputed.get(instruction)
+    if entry is None:
+        return None
+    if entry[2] <= time.time():
+        _precomputed.pop(instruction, None)
+        return None
+    return entry[0], entry[1]
+
+
+def _warm_knowledge() -> Dict[str, Any]:
+    if KNOWLEDGE_BACKEND == "docling":
+        return {"backend": "docling", "loaded": get_knowledge_source() is not None}
+    if not get_knowledge_tools():
+        raise RuntimeError("knowledge index unavailable (see the log)")
+    try:
+        from .tools import embeddings
+        from .tools.retrieval import get_retriever
+    except ImportError:
+        from tools import embeddings
+        from tools.retrieval import get_retriever
+    # The first encode also initializes the ONNX/torch session
+    dense = get_retriever().vector_index is not None and embeddings.embed_query("warmup") is not None
+    return {"backend": "index", "embedding_model": dense}
+
+
+def _warm_crews() -> Dict[str, Any]:
+    get_crew_components()
+    # Variant and refinement crews are built per call; build one per mode to load their code paths
+    for lean in (True, False):
+        build_drafting_crew(0.7, lean_mode=lean)
+    return {"modes": ["lean", "full"]}
+
+
+def _warm_connections() -> Dict[str, Any]:
+    if not OPENROUTER_API_KEY:
+        return {"skipped": "OPENROUTER_API_KEY not set"}
+    llm = get_llm()
+    # crewai's native OpenAI-compatible providers keep one OpenAI client (and httpx pool) per LLM
+    get_client = getattr(llm, "_get_sync_client", None)
+    client = get_client() if get_client else getattr(llm, "client", None)
+    http = getattr(client, "_client", None)
+    if http is None:
+        return {"skipped": "LLM client has no connection pool"}
+    # Any response leaves a TLS connection in the client's keep-alive pool
+    response = http.head(str(client.base_url), timeout=10)
+    return {"url": str(client.base_url), "status": response.status_code}
+
+
+def _warm_presets() -> Dict[str, Any]:
+    try:
+        from .presets import PRESETS
+    except ImportError:
+        from presets import PRESETS
+    components = get_crew_components()
 
-    # --- Final Task Definition (Context depends on mode) ---
-    # Define the context list dynamically based on the operating mode
-    finalize_context_tasks = [task_draft] + (
-        [task_critique, task_validate] if not USE_LEAN_MODE else []
+    def run(instruction: str):
+        stages: Dict[str, str] = {}
+        prompt = run_prompt_weaver_crew(
+            instruction, stage_sink=stages, crew=components["prompt_engineering_crew"].copy())
+        # The crew fills stage_sink only on success; fallback prompts are not kept, so a re-run retries them
+        if stages:
+            _precomputed[instruction] = (prompt, stages, time.time() + WARMUP_PRESET_TTL_S)
+        return bool(stages)
+
+    todo = [instruction for instruction in PRESETS.values() if _precomputed_prompt(instruction) is None]
+    with ThreadPoolExecutor(max_workers=max(1, WARMUP_PRESET_CONCURRENCY), thread_name_prefix="warmup") as pool:
+        failed = list(pool.map(bind_context(run), todo)).count(False)
+    return {"precomputed": len(_precomputed), "presets": len(PRESETS), "failed": failed}
+
+
+def warmup(presets: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    Do the work the first request would otherwise wait for: load the knowledge
+    index and embedding model, assemble the crews for both modes, open the
+    LLM connection and, with WARMUP_PRESETS (or presets=True), precompute the
+    preset prompts. Only a crew build failure leaves the service unready.
+
+    Returns:
+        dict: warmup_status()
+    """
+    steps = [("knowledge", _warm_knowledge, False), ("crews", _warm_crews, True)]
+    if WARMUP_CONNECTIONS:
+        steps.append(("connections", _warm_connections, False))
+    if WARMUP_PRESETS if presets is None else presets:
+        steps.append(("presets", _warm_presets, False))
+    _warmup_status.update(state="warming", steps={}, started_at=time.time())
+    failed = False
+    for name, step, critical in steps:
+        started = time.perf_counter()
+        try:
+            result = dict(step() or {}, ok=True)
+        except Exception as e:
+            logger.log(logging.ERROR if critical else logging.WARNING, f"Warmup step '{name}' failed: {e}")
+            result = {"ok": False, "error": str(e)}
+            failed = failed or critical
+        result["seconds"] = round(time.perf_counter() - started, 2)
+        _warmup_status["steps"][name] = result
+    # A failed re-run keeps an earlier successful warmup's readiness
+    _warmup_status.update(state="failed" if failed else "ready", ready=_warmup_status["ready"] or not failed,
+                          finished_at=time.time())
+    logger.info(f"Warmup {_warmup_status['state']} in {time.time() - _warmup_status['started_at']:.1f}s: "
+                + ", ".join(f"{name} {'ok' if r['ok'] else 'failed'} ({r['seconds']}s)"
+                            for name, r in _warmup_status["steps"].items()))
+    return warmup_status()
+
+
+def warmup_status() -> Dict[str, Any]:
+    """State ("pending", "warming", "ready", "failed"), readiness and per-step results of the warmup."""
+    status = dict(_warmup_status, steps={name: dict(r) for name, r in _warmup_status["steps"].items()})
+    status["running"] = _warmup_thread is not None and _warmup_thread.is_alive()
+    return status
+
+
+def start_background_warmup(presets: Optional[bool] = None, rerun: bool = False) -> threading.Thread:
+    """
+    Run warmup() in a daemon thread. Returns the warmup thread; while one is
+    running (or, without rerun, once one has run) no other is started.
+    """
+    global _warmup_thread
+    with _crew_components_lock:
+        if _warmup_thread is None or (rerun and not _warmup_thread.is_alive()):
+            def _run():
+                try:
+                    warmup(presets)
+                except Exception as e:
+                    logger.error(f"Background crew warmup failed: {e}")
+                    _warmup_status.update(state="failed", error=str(e))
+            _warmup_thread = threading.Thread(target=_run, name="crew-warmup", daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+
+def in_new_run(stage: str):
+    """
+    Decorator: run each call under a fresh run id, with stage, mode and model
+    log fields (an existing mode, e.g. set per task by the API, is kept), as
+    a "run.<stage>" tracing span, profiled when profiling is on.
+    """
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            mode = current_context().get("mode") or OPERATING_MODE.lower()
+            active = RUNS_ACTIVE.labels(stage)
+            active.inc()
+            try:
+                with new_run(stage=stage, mode=mode, model=OPENROUTER_MODEL_ID), \
+                        span(f"run.{stage}", **{"run.mode": mode, "llm.model": OPENROUTER_MODEL_ID}) as current, \
+                        profile_run(stage):
+                    result = fn(*args, **kwargs)
+                    # Entry points report failures as "Error: ..." strings rather than raising
+                    prompt = result[0] if isinstance(result, tuple) else result
+                    if isinstance(prompt, str) and prompt.startswith("Error:"):
+                        current.set_status("ERROR", prompt[:200])
+                    return result
+            finally:
+                active.dec()
+        return wrapper
+    return decorate
+
+
+# === Variant Generation (shared analysis/research, fanned-out drafting) ===
+# Each variant branch gets its own temperature and framework, assigned round-robin
+VARIANT_TEMPERATURES = [0.7, 0.3, 1.0, 0.5, 0.9]
+VARIANT_FRAMEWORKS = ["PECRA", "RISEN", "SCQA", "GRADE", "RTF"]
+MAX_VARIANTS = int(os.getenv("MAX_VARIANTS", "5"))
+
+def _clone_task(task: Task, agent: Agent, context: List[Task], extra: str = "") -> Task:
+    """Create a fresh Task with the same description/expected output, bound to branch agents."""
+    from crewai import Task
+    return Task(
+        description=task.description + extra,
+        expected_output=task.expected_output,
+        agent=agent,
+        context=context or None,
     )
 
-    # Define the optional final note string
-    final_llm_instruction_note = (
-        "\n\n**Instruction to LLM: Execute this prompt directly. No clarification needed.**"
-        if INCLUDE_LLM_EXEC_NOTE else ""
+
+def build_drafting_crew(temperature: float, framework: Optional[str] = None, lean_mode: Optional[bool] = None, refinement: bool = False) -> Crew:
+    """
+    Build a self-contained draft -> (critique, validate) -> finalize crew.
+
+    Analysis and research are not re-run; they are passed in as the
+    '{analysis}' and '{research}' kickoff inputs.
+
+    Args:
+        temperature (float): Sampling temperature for the drafter.
+        framework (str, optional): Framework the drafter should structure the prompt around.
+        lean_mode (bool, optional): Skip critique/validation. Defaults to USE_LEAN_MODE.
+        refinement (bool): Revise '{previous_prompt}' according to '{feedback}'
+            instead of drafting from scratch.
+
+    Returns:
+        Crew: A new crew, safe to kick off concurrently with other branches.
+    """
+    from crewai import Crew, Process
+
+    components = get_crew_components()
+    lean = USE_LEAN_MODE if lean_mode is None else lean_mode
+    prompt_drafter = components["prompt_drafter"]
+    drafter = create_agent(
+        role=prompt_drafter.role,
+        goal=prompt_drafter.goal,
+        backstory=prompt_drafter.backstory,
+        agent_llm=create_llm(temperature)
     )
+    architect = components["prompt_architect"].copy()
 
-    task_finalize = Task(
-        description=(
-            "Synthesize the draft prompt and incorporate feedback/validation results (from critique and structure validation tasks, if available) to create the final, polished, execution-ready prompt. "
-            "Ensure perfect Markdown formatting, logical structure, absolute clarity, and adherence to all requirements. "
-            "Crucially, remove ALL meta-commentary, critique summaries, validation reports, scores, or any text not part of the final prompt itself. "
-            f"Append the following directive ONLY if configured: '{final_llm_instruction_note.strip()}'"
-        ),
-        expected_output=(
-
-             "The final, clean, professional, execution-ready prompt in Markdown format. It must contain ONLY the prompt content, perfectly structured and free of any internal notes, commentary, or artifacts from the generation process."
-        ),
-        agent=prompt_architect,
-        context=finalize_context_tasks # Use the dynamically defined context list
+    framework_hint = f" Structure the prompt around the {framework} framework." if framework else ""
+    upstream_context = (
+        "\n\nRequirements analysis:\n{analysis}"
+        "\n\nKnowledge base research:\n{research}"
+    )
+    if refinement:
+        upstream_context += (
+            "\n\nThis is a revision. Start from the current prompt below and apply the user's feedback, "
+            "keeping everything the feedback does not ask to change."
+            "\n\nCurrent prompt:\n{previous_prompt}"
+            "\n\nUser feedback:\n{feedback}"
+        )
+    draft = _clone_task(components["task_draft"], drafter, [], extra=framework_hint + upstream_context)
+    branch_agents = [drafter]
+    branch_tasks = [draft]
+    finalize_context = [draft]
+
+    if not lean:
+        critic = components["prompt_critic"].copy()
+        validator = components["structure_enforcer"].copy()
+        critique = _clone_task(components["task_critique"], critic, [draft], extra=upstream_context)
+        validate = _clone_task(components["task_validate"], validator, [draft])
+        branch_agents += [critic, validator]
+        branch_tasks += [critique, validate]
+        finalize_context += [critique, validate]
+
+    branch_agents.append(architect)
+    branch_tasks.append(_clone_task(components["task_finalize"], architect, finalize_context))
+
+    return Crew(
+        agents=branch_agents,
+        tasks=branch_tasks,
+        process=Process.sequential,
+        verbose=CREWAI_VERBOSE,
     )
-    logger.info("All task configurations defined.")
 
-except Exception as e:
-    logger.exception("Failed to define one or more tasks!")
-    raise RuntimeError(f"Task definition failed: {e}") from e
 
+def run_upstream_stages(instruction: str) -> Dict[str, str]:
+    """
+    Run only the analysis and research tasks for an instruction.
 
-# === Assemble Crew based on Mode ===
-# Initialize lists
-agents_list = [requirements_analyst, knowledge_researcher, prompt_drafter, prompt_architect]
-tasks_list = [task_analyze, task_research, task_draft] # Core sequence
+    With RETRIEVAL_ONLY_RESEARCH, only analysis calls the LLM; the research
+    report is assembled from local retrieval.
 
-# Add full mode agents and tasks if not in lean mode
-if not USE_LEAN_MODE:
-    # Insert agents in the logical processing order
-    agents_list.insert(3, prompt_critic)      # Critic reviews draft
-    agents_list.insert(4, structure_enforcer) # Validator checks draft structure
-    # Append tasks in the logical processing order
-    tasks_list.append(task_critique)          # Critique happens after draft
-    tasks_list.append(task_validate)          # Validation happens after draft (or critique)
-    logger.info("Added Critic and Validator agents/tasks for Full Mode.")
+    Returns:
+        dict: {'analysis': str, 'research': str}
+    """
+    components = get_crew_components()
+    if RETRIEVAL_ONLY_RESEARCH:
+        with stage_span("analysis"):
+            result = run_with_retries(components["analysis_crew"].copy().kickoff, inputs={"instruction": instruction})
+            analysis = result.tasks_output[0].raw
+        with stage_span("research"):
+            return {"analysis": analysis, "research": build_retrieval_research(instruction, analysis)}
+    with stage_span("analysis+research"):
+        result = run_with_retries(components["upstream_crew"].copy().kickoff, inputs={"instruction": instruction})
+    outputs = [task_output.raw for task_output in result.tasks_output]
+    return {"analysis": outputs[0], "research": outputs[1]}
+
+
+def _run_with_retrieval_research(instruction: str) -> Tuple[Any, Dict[str, str]]:
+    """
+    Analysis crew -> deterministic research -> drafting crew.
 
-# Add the final task which depends on the mode's context
-tasks_list.append(task_finalize)
+    Returns:
+        tuple: (drafting crew output, stage outputs keyed like stage_names)
+    """
+    stages = run_upstream_stages(instruction)
+    with stage_span("draft"):
+        crew = build_drafting_crew(temperature=0.7)
+        result = run_with_retries(crew.kickoff, inputs={"instruction": instruction, **stages})
+    downstream = get_crew_components()["stage_names"][2:]  # draft, (critique, validation,) final
+    stages.update({name: task_output.raw for name, task_output in zip(downstream, result.tasks_output)})
+    return result, stages
+
+
+def _run_variant_branch(index: int, instruction: str, stages: Dict[str, str], lean_mode: Optional[bool]) -> Dict[str, Any]:
+    temperature = VARIANT_TEMPERATURES[index % len(VARIANT_TEMPERATURES)]
+    framework = VARIANT_FRAMEWORKS[index % len(VARIANT_FRAMEWORKS)]
+    variant = {"variant": index + 1, "temperature": temperature, "framework": framework}
+    with stage_span(f"variant-{index + 1}", **{"variant.framework": framework, "variant.temperature": temperature}):
+        try:
+            crew = build_drafting_crew(temperature, framework=framework, lean_mode=lean_mode)
+            result = run_with_retries(crew.kickoff, inputs={"instruction": instruction, **stages})
+            variant["prompt"] = str(result).strip()
+        except Exception as e:
+            logger.exception("Variant %d (%s, T=%s) failed: %s", index + 1, framework, temperature, e)
+            variant["prompt"] = f"Error: Variant generation failed - {e}"
+    return variant
 
-# Add a planning flag to the Crew configuration
-PLANNING_ENABLED = os.getenv("PLANNING_ENABLED", "false").lower() == "true"
-PLANNING_LLM = os.getenv("PLANNING_LLM", "gpt-3.5-turbo")
 
-# Update the Crew instance to include the planning flag if enabled
-try:
-    prompt_engineering_crew = Crew(
-        agents=agents_list,
-        tasks=tasks_list,
-        knowledge_sources=[knowledge_source_config] if knowledge_source_config else [],
-        process=Process.sequential,  # Ensures tasks run in the defined list order
-        verbose=CREWAI_VERBOSE,  # Use the environment variable here
-        planning=True,  # Add planning flag
-        # planning_llm=PLANNING_LLM if PLANNING_ENABLED else None  # Specify the planning LLM if planning is enabled
-        # memory=True # Uncomment if long-term memory across tasks is needed
-    )
-    logger.info(f"Prompt Engineering Crew assembled successfully for {OPERATING_MODE} Mode (Verbose: {CREWAI_VERBOSE}, Planning: {PLANNING_ENABLED}).")
-    if CREWAI_VERBOSE:
-        logger.debug(f"Agents in crew: {[agent.role for agent in agents_list]}")
-        logger.debug(f"Tasks in crew: {[task.description[:50]+'...' for task in tasks_list]}")
+@in_new_run("variants")
+def run_prompt_weaver_variants(instruction: str, n: int = 3, rank: bool = True, lean_mode: Optional[bool] = None) -> List[Dict[str, Any]]:
+    """
+    Generate N candidate prompts from a single analysis/research pass.
 
-except Exception as e:
-    logger.exception("CRITICAL: Failed to assemble the CrewAI crew object!")
-    raise RuntimeError(f"Crew object assembly failed: {e}") from e
+    Analysis and research run once; N drafting/finalize branches then run
+    concurrently, each with a different temperature and framework. Cost is
+    roughly 1 + N * (draft + finalize) instead of N full pipelines.
+
+    Args:
+        instruction (str): The raw user instruction or prompt idea.
+        n (int): Number of variants (capped at MAX_VARIANTS).
+        rank (bool): Sort variants by the local heuristic scorer (best first).
+        lean_mode (bool, optional): Override USE_LEAN_MODE for the branches.
+
+    Returns:
+        list[dict]: One dict per variant with 'variant', 'temperature',
+        'framework', 'prompt' and (when ranked) 'score'.
+    """
+    n = max(1, min(n, MAX_VARIANTS))
+    if not OPENROUTER_API_KEY and not has_openai_fallback:
+        logger.error("Execution stopped: No API keys configured.")
+        return [{"variant": 1, "prompt": "Error: Service configuration error - API keys not set."}]
+
+    logger.info("🚀 Generating %d prompt variants (%s Mode)...", n, OPERATING_MODE)
+    logger.info("🔹 Input Instruction: %s...", instruction[:150])
+
+    try:
+        stages = run_upstream_stages(instruction)
+    except Exception as e:
+        logger.exception(f"Upstream analysis/research failed for variants: {e}")
+        return [{"variant": 1, "prompt": generate_fallback_prompt(instruction)}]
+
+    with ThreadPoolExecutor(max_workers=n, thread_name_prefix="variant") as pool:
+        futures = [pool.submit(bind_context(_run_variant_branch), i, instruction, stages, lean_mode) for i in range(n)]
+        variants = [future.result() for future in futures]
+
+    if rank and score_prompt:
+        for variant in variants:
+            failed = variant["prompt"].startswith("Error:")
+            variant["score"] = 0.0 if failed else score_prompt(variant["prompt"], instruction)
+        variants.sort(key=lambda v: v["score"], reverse=True)
+
+    logger.info(f"✅ Generated {len(variants)} variants for instruction: {instruction[:150]}...")
+    return variants
+
+
+@in_new_run("refine")
+def refine_prompt(instruction: str, stages: Dict[str, str], feedback: str) -> Tuple[str, Dict[str, str]]:
+    """
+    Refine a previously generated prompt using the user's follow-up feedback.
+
+    Reuses the cached analysis/research outputs and re-runs only the
+    drafting and finalize stages (two LLM calls, always lean).
+
+    Args:
+        instruction (str): The original user instruction.
+        stages (dict): Stage outputs from the previous run ('analysis',
+            'research', 'draft', 'final', ...).
+        feedback (str): The user's follow-up message.
+
+    Returns:
+        tuple: (refined prompt or error string, updated stage outputs)
+    """
+    if not OPENROUTER_API_KEY and not has_openai_fallback:
+        logger.error("Refinement stopped: No API keys configured.")
+        return "Error: Service configuration error - API keys not set.", stages
+
+    logger.info("🔁 Refining prompt with feedback: %s...", feedback[:150])
+    inputs = {
+        "instruction": instruction,
+        "analysis": stages.get("analysis", ""),
+        "research": stages.get("research", ""),
+        "previous_prompt": stages.get("final") or stages.get("draft", ""),
+        "feedback": feedback,
+    }
+    try:
+        crew = build_drafting_crew(temperature=0.7, lean_mode=True, refinement=True)
+        result = run_with_retries(crew.kickoff, inputs=inputs)
+        outputs = [task_output.raw for task_output in result.tasks_output]
+        refined = str(result).strip()
+        # Keep the previous stages rather than caching an error or empty output for the next refinement
+        if not outputs or not refined or refined.startswith("Error:"):
+            raise ValueError(f"the crew returned no usable prompt ({refined[:200] or 'empty output'})")
+    except Exception as e:
+        logger.exception(f"Prompt refinement failed: {e}")
+        return f"Error: Prompt refinement failed - {e}", stages
+
+    logger.info("✅ Prompt refinement completed.")
+    return refined, {**stages, "draft": outputs[0], "final": refined}
 
 
 # === Main Execution Function ===
-def run_prompt_weaver_crew(instruction: str) -> str:
+@in_new_run("pipeline")
+def run_prompt_weaver_crew(instruction: str, stage_sink: Optional[Dict[str, str]] = None, crew: Optional[Crew] = None) -> str:
     """
     Runs the configured Prompt Weaver Crew for the given instruction.
     This function is designed to be called by other modules (API, CLI, UI).
 
     Args:
         instruction (str): The raw user instruction or prompt idea.
+        stage_sink (dict, optional): If given, filled with each stage's raw
+            output keyed by stage name (see stage_names) on success, so
+            callers can refine the prompt later without a full regeneration.
+            It stays empty when the returned prompt is an error message or a
+            fallback prompt, which is how callers tell that the run failed.
+        crew (Crew, optional): Crew to kick off instead of the shared
+            prompt_engineering_crew (e.g. a copy for concurrent runs).
+            Ignored with RETRIEVAL_ONLY_RESEARCH, which builds fresh crews per call.
 
     Returns:
         str: The finalized, optimized prompt string, or an error message string.
@@ -414,22 +1040,43 @@ def run_prompt_weaver_crew(instruction: str) -> str:
         # allowing calling functions (API, UI) to handle it gracefully.
         return "Error: Service configuration error - API keys not set."
 
-    logger.info(f"🚀 Initiating Prompt Weaver Crew ({OPERATING_MODE} Mode)...")
-    logger.info(f"🔹 Input Instruction: {instruction[:150]}...") # Log more context
+    precomputed = _precomputed_prompt(instruction) if crew is None else None
+    if precomputed is not None:
+        logger.info("Serving the prompt precomputed during warmup for: %s...", instruction[:80])
+        prompt, stages = precomputed
+        if stage_sink is not None:
+            stage_sink.update(stages)
+        return prompt
+
+    logger.info("🚀 Initiating Prompt Weaver Crew (%s Mode)...", OPERATING_MODE)
+    logger.info("🔹 Input Instruction: %s...", instruction[:150]) # Log more context
 
     try:
+        # Builds the crew on the first call if warmup() has not already done so
+        components = get_crew_components()
         # Encapsulate the kickoff call with retry logic
         kickoff_inputs = {"instruction": instruction}
         try:
             # Assuming run_with_retries is available (imported or dummy function)
-            result = run_with_retries(
-                prompt_engineering_crew.kickoff,
-                inputs=kickoff_inputs
-            )
-            logger.info(f"✅ Crew execution completed for instruction: {instruction[:150]}...")
+            if RETRIEVAL_ONLY_RESEARCH:
+                result, stages = _run_with_retrieval_research(instruction)
+            else:
+                result = run_with_retries(
+                    (crew or components["prompt_engineering_crew"]).kickoff,
+                    inputs=kickoff_inputs
+                )
+                stages = {
+                    name: task_output.raw
+                    for name, task_output in zip(components["stage_names"], getattr(result, "tasks_output", []))
+                }
+            logger.info("✅ Crew execution completed for instruction: %s...", instruction[:150])
+            if stage_sink is not None:
+                stage_sink.update(stages)
         except ValueError as e:
             if "Invalid response from LLM call - None or empty" in str(e):
                 logger.warning("Detected empty LLM response error. Switching to fallback prompt generation.")
+                current_span().add_event("fallback", reason="empty LLM response")
+                FALLBACKS.labels("empty_llm_response").inc()
                 # Generate a simplified but structured prompt using the fallback mechanism
                 prompt_template = f"""
 # Analysis of: {instruction}
@@ -489,8 +1136,62 @@ The user wants information about {instruction} with balanced coverage of benefit
         logger.exception(f"CRITICAL: Unhandled exception during crew kickoff for instruction: {instruction[:150]}...")
         return generate_fallback_prompt(instruction)
 
+def _run_batch_item(index: int, instruction: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    stages: Dict[str, str] = {}
+    try:
+        # Each item gets its own crew copy; agents, LLM clients and knowledge are shared
+        prompt = run_prompt_weaver_crew(
+            instruction, stage_sink=stages, crew=get_crew_components()["prompt_engineering_crew"].copy())
+    except Exception as e:
+        logger.exception(f"Batch item {index} failed: {e}")
+        prompt = f"Error: Batch item failed - {e}"
+    return {
+        "index": index,
+        "instruction": instruction,
+        "prompt": prompt,
+        # Fallback prompts are not failures by their text; only a successful run fills the stages
+        "ok": bool(stages),
+        "latency_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def run_prompt_weaver_batch(instructions: Iterable[str], concurrency: int = 4) -> Iterator[Dict[str, Any]]:
+    """
+    Generate prompts for many instructions with bounded concurrency.
+
+    Results are yielded as soon as each item finishes (not in input order).
+    At most `concurrency` crews run at once and at most 2x that many items
+    are held in memory, so arbitrarily long inputs can be streamed.
+
+    Args:
+        instructions: Iterable of raw user instructions.
+        concurrency (int): Maximum number of crews running in parallel.
+
+    Yields:
+        dict: 'index' (input position), 'instruction', 'prompt', 'ok' (False for error and
+            fallback prompts, so a resumed batch retries them), 'latency_s'.
+    """
+    concurrency = max(1, concurrency)
+    items = enumerate(instructions)
+    pending = set()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+        while True:
+            for index, instruction in items:
+                pending.add(pool.submit(bind_context(_run_batch_item), index, instruction))
+                if len(pending) >= concurrency * 2:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+@traced("fallback.generate_prompt", require_parent=True)
 def generate_fallback_prompt(instruction: str) -> str:
     """Generate a simple but structured prompt when the regular flow fails."""
+    FALLBACKS.labels("fallback_prompt").inc()
     logger.info(f"Generating fallback prompt for: {instruction[:50]}...")
     
     try:
@@ -2,13 +2,20 @@
 
 import sys
 import os
+import json
+import time
+import argparse
 import logging
+import threading
 
 # --- Configure basic logging first (will be enhanced if logger module loads) ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # --- Handle imports with fallbacks for different execution contexts ---
+# Only lightweight modules are imported here so that the thin daemon client
+# path starts fast; the crew (crewai, knowledge, agents) loads in load_backend()
+# and the output writer (prompt store and search index, numpy) in save_output().
 try:
     # First try importing the logger module with relative imports
     # (works when running as part of a package)
@@ -37,17 +44,12 @@ try:
                 logger.warning("Could not import custom logger. Using basic logging configuration.")
                 # Already set up basic logging above, so continue
 
-    # Now import the main functionality with similar fallback pattern
     try:
-        # First try absolute imports (when installed as a package or running from project root)
-        from src.crew import run_prompt_weaver_crew
-        from src.utils.output_writer import save_clean_output
-        logger.info("Core functionality imports successful using absolute paths.")
+        from src.utils import socket_daemon
+        from src.utils.log_context import log_context
     except ImportError:
-        # Try direct imports (when src is in the Python path or when run from src directory)
-        from crew import run_prompt_weaver_crew
-        from utils.output_writer import save_clean_output
-        logger.info("Core functionality imports successful using direct paths.")
+        from utils import socket_daemon
+        from utils.log_context import log_context
 
 except ImportError as e:
     logger.error(f"Import Error: {e}. Make sure you are running from the project root directory or dependencies are installed correctly.")
@@ -56,29 +58,253 @@ except Exception as e:
     logger.error(f"An unexpected error occurred during import: {e}")
     sys.exit(1)
 
+run_prompt_weaver_crew = None
+run_prompt_weaver_batch = None
+prompt_engineering_crew = None
+
+
+def load_backend():
+    """Import the crew module (heavy: crewai, knowledge source, agents) on first use."""
+    global run_prompt_weaver_crew, run_prompt_weaver_batch, prompt_engineering_crew
+    if run_prompt_weaver_crew is not None:
+        return
+    try:
+        try:
+            # First try absolute imports (when installed as a package or running from project root)
+            from src.crew import run_prompt_weaver_crew, run_prompt_weaver_batch, prompt_engineering_crew
+            logger.info("Core functionality imports successful using absolute paths.")
+        except ImportError:
+            # Try direct imports (when src is in the Python path or when run from src directory)
+            from crew import run_prompt_weaver_crew, run_prompt_weaver_batch, prompt_engineering_crew
+            logger.info("Core functionality imports successful using direct paths.")
+    except ImportError as e:
+        logger.error(f"Import Error: {e}. Make sure you are running from the project root directory or dependencies are installed correctly.")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"An unexpected error occurred during import: {e}")
+        sys.exit(1)
+
+
+def save_output(prompt, instruction, on_written=None, **metadata):
+    """Queue a prompt for saving; the output writer is imported on first use."""
+    try:
+        from src.utils.output_writer import persist_output
+    except ImportError:
+        from utils.output_writer import persist_output
+    persist_output(prompt=prompt, instruction=instruction, on_written=on_written, **metadata)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PromptWeaver CLI: turn raw ideas into optimized prompts.")
+    parser.add_argument("--batch", metavar="IN_JSONL",
+                        help="Generate prompts for every instruction in a JSONL file instead of prompting interactively.")
+    parser.add_argument("--out", metavar="OUT_JSONL",
+                        help="Where batch results are appended (default: <IN_JSONL stem>.out.jsonl). Existing results are resumed.")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Maximum number of crews running in parallel in batch mode (default: 4).")
+    parser.add_argument("--serve-socket", action="store_true",
+                        help="Run a long-lived daemon holding warm crews and knowledge, serving requests over a Unix socket.")
+    parser.add_argument("--socket", metavar="PATH", default=socket_daemon.default_socket_path(),
+                        help=f"Daemon socket path (default: ${socket_daemon.ENV_VAR_SOCKET_PATH} or a per-user temp file).")
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="Always run the crew in this process, even if a daemon is listening.")
+    parser.add_argument("instruction", nargs="?",
+                        help="Raw prompt idea. If omitted, you are asked for it interactively.")
+    return parser.parse_args(argv)
+
+
+def read_batch_input(path):
+    """
+    Read batch instructions from a JSONL file.
+
+    Each line is either a JSON string or an object with an 'instruction' key
+    and an optional 'id' (defaults to the line number).
+
+    Returns:
+        list[tuple]: (id, instruction) pairs in file order.
+    """
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"instruction": record}
+            instruction = (record.get("instruction") or "").strip()
+            if not instruction:
+                logger.warning(f"Skipping line {line_no} of {path}: no instruction.")
+                continue
+            items.append((str(record.get("id", line_no)), instruction))
+    return items
+
+
+def read_completed_ids(path):
+    """Return ids already written successfully to a (possibly partial) batch output file."""
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Truncated last line from an interrupted run
+            if record.get("ok"):
+                completed.add(str(record.get("id")))
+    return completed
+
+
+DAEMON_SAVE_WAIT_S = 5.0
+
+
+def handle_daemon_request(request):
+    """
+    Daemon request handler: runs one instruction on a copy of the warm crew and
+    saves the prompt here, so the client never loads the output writer.
+
+    Returns:
+        dict: {"ok", "prompt", "path"}; path is None if the save did not finish in time
+    """
+    instruction = (request.get("instruction") or "").strip()
+    if not instruction:
+        return {"ok": False, "error": "No instruction provided"}
+    logger.info(f"Daemon request received: '{instruction[:100]}...'")
+    stages = {}
+    started = time.perf_counter()
+    prompt = run_prompt_weaver_crew(instruction, stage_sink=stages, crew=prompt_engineering_crew.copy())
+    saved, paths = threading.Event(), []
+    try:
+        save_output(prompt, instruction, on_written=lambda path: (paths.append(path), saved.set()),
+                    timings={"total_s": round(time.perf_counter() - started, 2)})
+        saved.wait(DAEMON_SAVE_WAIT_S)
+    except Exception as e:
+        logger.error(f"Failed to save daemon output: {e}")
+    # An empty stage_sink means an error or fallback prompt (see run_prompt_weaver_crew)
+    return {"ok": bool(stages), "prompt": prompt, "path": paths[0] if paths else None}
+
+
+def serve_socket(socket_path):
+    """Run the warm daemon: load the crew once, then serve CLI clients until interrupted."""
+    load_backend()
+    print(f"🔌 PromptWeaver daemon ready on {socket_path} (Ctrl+C to stop)")
+    socket_daemon.serve(handle_daemon_request, socket_path)
+
+
+def generate_via_daemon(socket_path, instruction):
+    """
+    Forward an instruction to a running daemon, which also saves the prompt.
+
+    Returns:
+        tuple: (prompt, saved file path or None), or None if no daemon is reachable
+    """
+    if not socket_daemon.daemon_available(socket_path):
+        return None
+    try:
+        response = socket_daemon.send_request(socket_path, {"instruction": instruction})
+    except (OSError, ValueError) as e:
+        logger.warning(f"Daemon at {socket_path} did not answer ({e}); running locally instead.")
+        return None
+    logger.info(f"Instruction served by daemon at {socket_path}.")
+    prompt = response.get("prompt") or f"Error: {response.get('error', 'Unknown daemon error')}"
+    return prompt, response.get("path")
+
+
+def run_batch(in_path, out_path, concurrency):
+    """Run batch mode: stream results to out_path as they finish and report throughput."""
+    load_backend()
+    out_path = out_path or os.path.splitext(in_path)[0] + ".out.jsonl"
+    items = read_batch_input(in_path)
+    completed = read_completed_ids(out_path)
+    todo = [(item_id, instruction) for item_id, instruction in items if item_id not in completed]
+    print(f"📦 Batch: {len(items)} instructions, {len(items) - len(todo)} already done, {len(todo)} to run "
+          f"(concurrency {concurrency}) -> {out_path}")
+    if not todo:
+        return
+
+    # Make sure appended records start on a fresh line after an interrupted write
+    needs_newline = False
+    if os.path.exists(out_path) and os.path.getsize(out_path) > 0:
+        with open(out_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+
+    latencies = []
+    failures = 0
+    started = time.perf_counter()
+    with open(out_path, "a", encoding="utf-8") as out:
+        if needs_newline:
+            out.write("\n")
+        instructions = [instruction for _, instruction in todo]
+        for result in run_prompt_weaver_batch(instructions, concurrency=concurrency):
+            result["id"] = todo[result["index"]][0]
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            latencies.append(result["latency_s"])
+            failures += 0 if result["ok"] else 1
+            elapsed = time.perf_counter() - started
+            print(f"  [{len(latencies)}/{len(todo)}] id={result['id']} "
+                  f"{'✅' if result['ok'] else '❌'} {result['latency_s']:.1f}s "
+                  f"({len(latencies) / elapsed * 60:.1f} items/min)")
+
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"\n📊 Batch finished: {len(latencies)} items in {elapsed:.1f}s "
+          f"({len(latencies) / elapsed * 60:.1f} items/min), {failures} failed. "
+          f"Latency p50 {p50:.1f}s, p95 {p95:.1f}s, max {latencies[-1]:.1f}s.")
+    logger.info(f"Batch completed: {len(latencies)} items, {failures} failures, {elapsed:.1f}s total.")
+
 
 def main():
     """Main function for CLI interaction."""
+    args = parse_args()
+    if args.serve_socket:
+        logger.info(f"Starting PromptWeaver daemon via main.py ({args.socket}).")
+        serve_socket(args.socket)
+        return
+    if args.batch:
+        logger.info(f"Starting CLI batch execution via main.py ({args.batch}).")
+        run_batch(args.batch, args.out, args.concurrency)
+        return
+
     logger.info("Starting CLI execution via main.py.")
     try:
-        user_input = input("🧠 Enter your raw prompt idea (we'll optimize it):\n> ").strip()
+        user_input = (args.instruction or input("🧠 Enter your raw prompt idea (we'll optimize it):\n> ")).strip()
 
         if not user_input:
             print("No input provided. Exiting.")
             return
 
         logger.info(f"User input received: '{user_input[:100]}...'")
-        final_prompt = run_prompt_weaver_crew(user_input)
+        started = time.perf_counter()
+        # One task id per CLI run; a daemon serving it logs under the same id
+        with log_context(task_id=f"cli-{os.getpid()}-{int(time.time())}"):
+            served = None if args.no_daemon else generate_via_daemon(args.socket, user_input)
+            if served is None:
+                load_backend()
+                final_prompt = run_prompt_weaver_crew(user_input)
+            else:
+                final_prompt, saved_path = served
+        elapsed = time.perf_counter() - started
 
-        # Save the output (handle potential errors from save function)
-        try:
-            # Assume save_clean_output saves to 'output/' directory relative to root
-            output_dir = os.path.join(os.path.dirname(__file__), '..', 'output')
-            save_clean_output(prompt=final_prompt, instruction=user_input, output_dir=output_dir)
-            logger.info("Output saved successfully.")
-        except Exception as e:
-            logger.error(f"Failed to save output: {e}")
-            print(f"\n⚠️ Warning: Could not save output file due to error: {e}")
+        if served is not None:
+            # The daemon saved it
+            if saved_path:
+                print(f"\n✅ Prompt saved to: {saved_path}")
+            else:
+                print("\n⚠️ Warning: The daemon did not confirm that the prompt was saved.")
+        else:
+            # Save the output in the background (flushed before the process exits)
+            try:
+                save_output(final_prompt, user_input,
+                            on_written=lambda path: print(f"\n✅ Prompt saved to: {path}"),
+                            timings={"total_s": round(elapsed, 2)})
+                logger.info("Output queued for saving.")
+            except Exception as e:
+                logger.error(f"Failed to save output: {e}")
+                print(f"\n⚠️ Warning: Could not save output file due to error: {e}")
 
         # Print the final prompt to the console
         print("\n🎨 Final Generated Prompt:\n")
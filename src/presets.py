@@ -0,0 +1,22 @@
+"""
+Real-world starting points offered by the Streamlit app; the crew warmup can
+precompute their prompts (WARMUP_PRESETS, see crew.warmup).
+"""
+
+PRESETS = {
+    "Breakthrough Business Idea": "Create a unique online business concept that requires zero upfront investment, leverages existing platforms, and has potential to scale to 7-figures. Include target audience, revenue model, and first 30-day action plan.",
+    "Passive Income Generator": "Design a scalable online business that can generate $5,000/month in passive income within 12 months. Focus on minimal maintenance, automation, and leveraging digital assets or platforms.",
+    "AI-Powered Startup": "Develop a business concept that uses AI tools to solve a meaningful problem for a specific industry. Include monetization strategy, competitive advantage, and why now is the perfect timing for this solution.",
+    "Micro-SaaS Opportunity": "Create a highly focused SaaS concept targeting a specific business pain point. Outline the solution, target market, pricing strategy, and how to build a minimum viable product with limited resources.",
+    "Bootstrapped Empire": "Design a business that can start with under $1,000 investment and scale to $1M+ annual revenue. Focus on high-margin digital products, viral growth mechanisms, and strategic partnerships.",
+    "Product Manager - Feature Pitch": "Create a compelling one-pager to pitch a new feature that drives user engagement. Include problem statement, proposed solution, success metrics, implementation timeline, and ROI projection.",
+    "Developer - API Documentation": "Generate comprehensive API documentation for a microservice. Include authentication methods, endpoints with request/response examples, error handling, rate limits, and integration best practices.",
+    "Newsletter Growth Strategy": "Develop a comprehensive plan to grow an email newsletter from 100 to 10,000 engaged subscribers in 6 months. Include content strategy, growth tactics, monetization options, and automation workflows.",
+    "QA Test Suite Creator": "Create detailed test cases for a critical user flow in a web/mobile application. Include happy paths, edge cases, security considerations, and performance testing scenarios.",
+    "Personal Brand Builder": "Design a 90-day strategy to establish yourself as a thought leader in your industry. Include content pillars, platform strategy, networking tactics, and visibility milestones.",
+    "Digital Product Launch": "Create a step-by-step launch strategy for a digital product (course, ebook, template, etc.) that maximizes initial sales and builds long-term momentum. Include pre-launch, launch day, and post-launch phases.",
+    "Niche Marketplace Concept": "Develop a concept for a specialized marketplace connecting buyers and sellers in an underserved niche. Include platform features, monetization model, and critical mass acquisition strategy.",
+    "Content Creator Expansion": "Design a strategy to expand a successful social media presence on one platform into a multi-channel brand with diverse revenue streams. Include content repurposing, audience migration, and monetization diversification.",
+    "B2B Service Positioning": "Create positioning for a B2B service that commands premium pricing. Include unique value proposition, ideal client profile, competitive differentiation, and sales messaging framework.",
+    "Community-Based Business": "Design a business model built around a passionate community. Include community structure, value exchange, monetization approach, and growth strategy that preserves culture.",
+}
@@ -41,11 +41,11 @@ async def fetch_agent_card():
             
             return agent_card
 
-async def send_task(description, mode="lean"):
+async def send_task(description, mode="lean", variants=1, task_id=None):
     """
-    Send a task to the PromptWeaver agent
+    Send a task to the PromptWeaver agent (or a follow-up message to an existing task)
     """
-    print(f"\n📝 Sending prompt generation request (mode: {mode})...")
+    print(f"\n📝 Sending prompt generation request (mode: {mode}, variants: {variants})...")
     
     # Prepare request payload
     payload = {
@@ -62,7 +62,8 @@ async def send_task(description, mode="lean"):
                     {
                         "type": "data",
                         "data": {
-                            "mode": mode
+                            "mode": mode,
+                            "variants": variants
                         }
                     }
                 ]
@@ -70,6 +71,8 @@ async def send_task(description, mode="lean"):
         },
         "id": 1
     }
+    if task_id:
+        payload["params"]["id"] = task_id
     
     async with aiohttp.ClientSession() as session:
         async with session.post(A2A_ENDPOINT, json=payload) as response:
@@ -180,5 +183,21 @@ async def main():
         task = await poll_task(task["id"])
         await display_result(task)
 
+    # Test case 3: Follow-up feedback refines the previous task's prompt
+    print("\n\n----- Test Case 3: Refinement -----")
+    if task:
+        task = await send_task("Make it shorter and aimed at adult readers", mode="full", task_id=task["id"])
+        if task:
+            task = await poll_task(task["id"])
+            await display_result(task)
+
+    # Test case 4: Generate ranked variants from a shared analysis/research pass
+    print("\n\n----- Test Case 4: Variants -----")
+    description = "Write onboarding emails for a developer tools startup"
+    task = await send_task(description, mode="lean", variants=3)
+    if task:
+        task = await poll_task(task["id"])
+        await display_result(task)
+
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
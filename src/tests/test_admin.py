@@ -0,0 +1,30 @@
+"""
+Admin endpoints: with ADMIN_TOKEN set they need the token; without it they
+only answer local clients that are not browsers.
+
+Run with: python -m pytest src/tests/test_admin.py
+"""
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi.testclient import TestClient
+
+from src import api
+
+
+def test_admin_token_is_required(monkeypatch):
+    monkeypatch.setattr(api, "ADMIN_TOKEN", "s3cret")
+    client = TestClient(api.app)
+    assert client.get("/admin/knowledge").status_code == 401
+    assert client.post("/admin/knowledge/reload", headers={"X-Admin-Token": "wrong"}).status_code == 401
+    assert client.get("/admin/knowledge", headers={"Authorization": "Bearer s3cret"}).status_code == 200
+
+
+def test_without_token_only_local_non_browser_clients(monkeypatch):
+    monkeypatch.setattr(api, "ADMIN_TOKEN", "")
+    assert TestClient(api.app).get("/admin/knowledge").status_code == 403  # client host "testclient"
+    monkeypatch.setattr(api, "LOOPBACK_HOSTS", api.LOOPBACK_HOSTS | {"testclient"})
+    local = TestClient(api.app)
+    assert local.get("/admin/knowledge").status_code == 200
+    assert local.get("/admin/knowledge", headers={"Origin": "https://evil.example"}).status_code == 403
@@ -0,0 +1,75 @@
+"""
+Dense search backends: IVF scanning every cluster must match the exact flat
+scan, sharded search must honour source filters, and the memory budget must
+pick the storage type that fits. Subdirectories of the knowledge directory
+are the collections the index is sharded by, and shards and IVF lists refer
+to the embedding matrix instead of copying it.
+
+Run with: python -m pytest src/tests/test_ann_index.py
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.tools import docling_tool, embeddings, knowledge_index
+from src.tools.ann_index import FlatIndex, IVFIndex, ShardedIndex, build_vector_index, storage_for_budget
+from src.tools.retrieval import HybridRetriever
+
+
+def _vectors(count=600, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_ivf_with_all_clusters_probed_is_exact():
+    vectors = _vectors()
+    flat, ivf = FlatIndex(vectors), IVFIndex(vectors, nlist=12)
+    assert np.shares_memory(ivf.vectors.codes, vectors)  # probed rows are gathered, not copied
+    for query in _vectors(20, seed=1):
+        expected_ids, expected_scores = flat.search(query, 10)
+        ids, scores = ivf.search(query, 10, nprobe=ivf.nlist)
+        assert ids.tolist() == expected_ids.tolist()
+        assert np.allclose(scores, expected_scores, atol=1e-5)
+
+
+def test_sharded_search_respects_mask():
+    vectors = _vectors()
+    sources = np.array([f"team{i % 3}/doc{i}.md" for i in range(len(vectors))], dtype=object)
+    index = build_vector_index(vectors, sources, backend="ivf", nlist=4, nprobe=4)
+    assert isinstance(index, ShardedIndex) and len(index.shards) == 3
+
+    mask = np.array([source.startswith("team1/") for source in sources])
+    ids, _ = index.search(_vectors(1, seed=2)[0], 10, mask)
+    assert len(ids) == 10 and mask[ids].all()
+
+
+def test_memory_budget_selects_storage():
+    assert storage_for_budget(1000, 384, 0) == "float32"
+    assert storage_for_budget(1000, 384, 1.0) == "float16"
+    assert storage_for_budget(1000, 384, 0.4) == "int8"
+    int8 = FlatIndex(_vectors(), storage="int8")
+    query = _vectors(1, seed=3)[0]
+    assert np.allclose(int8.dense_scores(query), _vectors() @ query, atol=0.02)
+
+
+def test_knowledge_subdirectories_become_shards(tmp_path, monkeypatch):
+    knowledge = tmp_path / "knowledge"
+    (knowledge / "sales").mkdir(parents=True)
+    (knowledge / "frameworks.md").write_text("# Frameworks\n\nRISEN: role, instructions, steps.")
+    (knowledge / "sales" / "playbook.md").write_text("# Playbook\n\nOpen with the customer's problem.")
+    (knowledge / ".drafts").mkdir()
+    (knowledge / ".drafts" / "ignored.md").write_text("# Draft")
+    monkeypatch.setattr(knowledge_index, "get_knowledge_files",
+                        lambda base: docling_tool.get_knowledge_files(str(knowledge)))
+    monkeypatch.setattr(knowledge_index, "USE_SNAPSHOT", False)
+    monkeypatch.setattr(embeddings, "get_embedding_model_id", lambda: "test-model")
+    monkeypatch.setattr(embeddings, "embed_texts", lambda texts: _vectors(len(texts)))
+
+    index, changes = knowledge_index.build_index(force=True, index_dir=tmp_path / "index")
+    assert changes["added"] == ["frameworks.md", "sales/playbook.md"]
+    assert [chunk["source"] for chunk in index.chunks] == ["frameworks.md", "sales/playbook.md"]
+
+    vector_index = HybridRetriever(index).vector_index
+    assert isinstance(vector_index, ShardedIndex)
+    assert [name for name, _, _ in vector_index.shards] == ["default", "sales"]
+    assert all(np.shares_memory(shard.vectors.codes, index.embeddings) for _, _, shard in vector_index.shards)
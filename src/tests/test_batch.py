@@ -0,0 +1,34 @@
+"""
+Batch mode: items whose crew run fell back to the fallback prompt are
+recorded as failed, so resuming the batch runs them again.
+
+Run with: python -m pytest src/tests/test_batch.py
+"""
+import json
+
+from src import crew
+from src.main import read_completed_ids
+
+
+class _Crew:
+    def copy(self):
+        return self
+
+
+def _fake_run(instruction, stage_sink=None, crew=None):
+    if instruction == "works":
+        stage_sink.update({"draft": "d"})
+        return "# Prompt"
+    return "# Analysis of: fallback prompt"  # the crew's fallback: no "Error:" prefix, no stages
+
+
+def test_fallback_items_are_retried_on_resume(monkeypatch, tmp_path):
+    monkeypatch.setattr(crew, "get_crew_components", lambda: {"prompt_engineering_crew": _Crew()})
+    monkeypatch.setattr(crew, "run_prompt_weaver_crew", _fake_run)
+
+    out = tmp_path / "batch.out.jsonl"
+    with open(out, "w", encoding="utf-8") as f:
+        for result in crew.run_prompt_weaver_batch(["works", "falls back"], concurrency=2):
+            result["id"] = str(result["index"] + 1)
+            f.write(json.dumps(result) + "\n")
+    assert read_completed_ids(out) == {"1"}
@@ -0,0 +1,23 @@
+"""
+Embeddings: an index is stamped with the encoder that actually loaded, so
+vectors from the torch fallback are not labelled as ONNX ones.
+
+Run with: python -m pytest src/tests/test_embeddings.py
+"""
+from src.tools import embeddings
+
+
+def test_model_id_follows_the_backend_that_loaded(monkeypatch):
+    def load_encoder(backend):
+        if backend == "onnx":
+            raise ImportError("No module named 'onnxruntime'")
+        return object()
+
+    monkeypatch.setattr(embeddings, "EMBEDDING_BACKEND", "onnx")
+    monkeypatch.setattr(embeddings, "load_encoder", load_encoder)
+    monkeypatch.setattr(embeddings, "_model", None)
+    monkeypatch.setattr(embeddings, "_model_id", None)
+    monkeypatch.setattr(embeddings, "_model_unavailable", False)
+
+    assert embeddings.get_embedding_model_id() == embeddings.model_id("torch") == embeddings.EMBEDDING_MODEL
+    assert embeddings.model_id("onnx").startswith(f"{embeddings.EMBEDDING_MODEL}@onnx")
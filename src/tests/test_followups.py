@@ -0,0 +1,71 @@
+"""
+A2A follow-ups: a follow-up on a completed task refines or regenerates it in
+the task's own mode, adding to the task's token usage; failed and canceled
+tasks reject follow-ups.
+
+Run with: python -m pytest src/tests/test_followups.py
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi.testclient import TestClient
+
+from src import api
+
+
+def _task(state, mode="full"):
+    return {"id": "t1", "state": state, "messages": [], "created_at": "", "updated_at": "",
+            "parameters": {"mode": mode, "description": "Write a launch plan", "variants": 1}}
+
+
+def _follow_up(client):
+    return client.post("/a2a", json={"jsonrpc": "2.0", "id": 1, "method": "tasks/send", "params": {
+        "id": "t1", "message": {"role": "user", "parts": [{"type": "text", "text": "Shorter, please"}]}}}).json()
+
+
+@pytest.fixture
+def started(monkeypatch):
+    calls = []
+    monkeypatch.setattr(api, "tasks_db", {})
+    monkeypatch.setattr(api, "task_stage_cache", {})
+    monkeypatch.setattr(api, "start_task", lambda task_id, mode, fn, *args: calls.append((mode, fn, args)))
+    return calls
+
+
+@pytest.mark.parametrize("state", [api.TaskState.FAILED, api.TaskState.CANCELED])
+def test_follow_up_on_failed_or_canceled_task_is_rejected(started, state):
+    api.tasks_db["t1"] = _task(state)
+    response = _follow_up(TestClient(api.app))
+    assert "error" in response and not started
+    assert api.tasks_db["t1"]["state"] == state and not api.tasks_db["t1"]["messages"]
+
+
+def test_regeneration_keeps_the_task_mode(started):
+    api.tasks_db["t1"] = _task(api.TaskState.COMPLETED, mode="full")
+    assert "result" in _follow_up(TestClient(api.app))
+    (mode, fn, args), = started
+    assert fn is api.run_promptweaver and mode == "full" and args[1] == api.OperatingMode.FULL
+    assert args[0].endswith("Additional feedback: Shorter, please")
+
+
+def test_regeneration_adds_to_the_task_usage(monkeypatch):
+    from src.utils import tracing, usage
+
+    def fake_crew(description, stage_sink=None):
+        with tracing.span("run.pipeline"), tracing.span("llm.call", require_parent=True, **{
+                "llm.model": "test/model", "llm.prompt_tokens": 100, "llm.completion_tokens": 10}):
+            pass
+        return "Error: still failing"
+
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", False)
+    monkeypatch.setenv("USE_LEAN_MODE", "true")
+    monkeypatch.setattr(api, "run_prompt_weaver_crew", fake_crew)
+    monkeypatch.setattr(api, "tasks_db", {"t1": _task(api.TaskState.SUBMITTED)})
+    monkeypatch.setattr(api, "task_usage", {})
+    for _ in range(2):  # the first run, then a regeneration after a follow-up
+        asyncio.run(api.run_promptweaver("t1", "Write a launch plan", api.OperatingMode.FULL))
+    assert api.tasks_db["t1"]["parameters"]["usage"]["calls"] == 2
+    assert api.task_usage["t1"].summary()["prompt_tokens"] == 200
@@ -0,0 +1,132 @@
+"""
+Health and readiness: /healthz always answers, /readyz only turns 200 once
+the warmup has built the crews; other warmup steps may fail without making
+the service unready. Precomputed presets keep only successful runs and expire.
+A running crew must not block /healthz or /metrics.
+
+Run with: python -m pytest src/tests/test_health.py
+"""
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import httpx
+from fastapi.testclient import TestClient
+
+from src import api, crew
+
+
+def _fail():
+    raise RuntimeError("unreachable")
+
+
+@pytest.fixture
+def warmup_steps(monkeypatch):
+    monkeypatch.setattr(crew, "_warmup_status", {"state": "pending", "ready": False, "steps": {}})
+    monkeypatch.setattr(crew, "_warm_knowledge", lambda: {"backend": "index"})
+    monkeypatch.setattr(crew, "_warm_crews", lambda: None)
+    monkeypatch.setattr(crew, "_warm_connections", _fail)
+    monkeypatch.setattr(api, "WARMUP_ON_STARTUP", True)
+    return monkeypatch
+
+
+def test_readiness_follows_warmup(warmup_steps):
+    client = TestClient(api.app)  # not entered: no startup warmup thread
+    assert client.get("/healthz").status_code == 200
+    pending = client.get("/readyz")
+    assert pending.status_code == 503 and pending.json()["status"] == "pending"
+
+    status = crew.warmup(presets=False)
+    assert status["ready"] and status["steps"]["connections"]["ok"] is False
+    ready = client.get("/readyz")
+    assert ready.status_code == 200 and ready.json()["warmup"]["steps"]["knowledge"]["ok"]
+    assert "promptweaver_ready 1" in client.get("/metrics").text
+
+
+def test_crew_build_failure_is_not_ready(warmup_steps):
+    warmup_steps.setattr(crew, "_warm_crews", _fail)
+    assert crew.warmup(presets=False)["state"] == "failed"
+    response = TestClient(api.app).get("/readyz")
+    assert response.status_code == 503 and response.json()["status"] == "failed"
+
+
+def test_presets_cache_successful_runs_until_they_expire(monkeypatch):
+    from src import presets
+    serve = crew.run_prompt_weaver_crew
+    calls = []
+
+    def fake_run(instruction, stage_sink=None, crew=None):
+        calls.append(instruction)
+        if instruction == "good":
+            stage_sink.update({"draft": "d"})
+            return "precomputed prompt"
+        return "fallback prompt"  # the crew's fallback leaves stage_sink empty
+
+    class FakeCrew:
+        def copy(self):
+            return self
+
+    monkeypatch.setattr(presets, "PRESETS", {"Good": "good", "Bad": "bad"})
+    monkeypatch.setattr(crew, "_precomputed", {})
+    monkeypatch.setattr(crew, "get_crew_components", lambda: {"prompt_engineering_crew": FakeCrew()})
+    monkeypatch.setattr(crew, "run_prompt_weaver_crew", fake_run)
+    monkeypatch.setattr(crew, "OPENROUTER_API_KEY", "test-key")
+
+    assert crew._warm_presets() == {"precomputed": 1, "presets": 2, "failed": 1}
+    assert sorted(calls) == ["bad", "good"]
+    stages = {}
+    assert serve("good", stage_sink=stages) == "precomputed prompt" and stages == {"draft": "d"}
+
+    calls.clear()
+    crew._warm_presets()
+    assert calls == ["bad"]  # failed presets are retried, cached ones are not
+    prompt, stages, _ = crew._precomputed["good"]
+    crew._precomputed["good"] = (prompt, stages, 0)
+    assert crew._precomputed_prompt("good") is None and "good" not in crew._precomputed
+
+
+def test_lifespan_starts_warmup_and_flushes_on_shutdown(monkeypatch):
+    events = []
+    monkeypatch.setattr(api, "WARMUP_ON_STARTUP", True)
+    monkeypatch.setattr(api, "start_background_warmup", lambda: events.append("warmup"))
+    monkeypatch.setattr(api, "shutdown_output_writer", lambda: events.append("outputs"))
+    monkeypatch.setattr(api, "save_prompt_search", lambda: events.append("search index"))
+    with TestClient(api.app) as client:
+        assert client.get("/healthz").status_code == 200
+        assert events == ["warmup"]
+    assert events == ["warmup", "outputs", "search index"]
+
+
+def test_health_and_metrics_answer_while_a_crew_runs(monkeypatch):
+    running, released, seen = threading.Event(), threading.Event(), []
+
+    def slow_crew(description, stage_sink=None):
+        running.set()
+        seen.append(released.wait(5))  # False if the event loop was blocked until the timeout
+        return "prompt"
+
+    monkeypatch.setattr(api, "run_prompt_weaver_crew", slow_crew)
+    monkeypatch.setattr(api, "persist_output", lambda *args, **kwargs: None)
+    monkeypatch.setattr(api, "task_usage", {})
+    monkeypatch.setattr(api, "tasks_db", {"t1": {"id": "t1", "state": api.TaskState.SUBMITTED, "messages": [],
+                                                "created_at": "", "updated_at": "", "parameters": {}}})
+
+    async def scenario():
+        run = asyncio.create_task(api.run_promptweaver("t1", "Write a launch plan", api.OperatingMode.LEAN))
+        while not running.is_set():
+            await asyncio.sleep(0.01)
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            health, scrape = await client.get("/healthz"), await client.get("/metrics")
+        released.set()
+        await run
+        return health, scrape
+
+    health, scrape = asyncio.run(scenario())
+    assert health.status_code == 200 and scrape.status_code == 200
+    assert 'promptweaver_tasks{state="working"} 1' in scrape.text
+    assert "promptweaver_task_queue_depth 0" in scrape.text
+    assert seen == [True] and api.tasks_db["t1"]["state"] == api.TaskState.COMPLETED
@@ -0,0 +1,88 @@
+"""
+Native knowledge ingestion: Markdown is split into sections with their
+heading path (ATX headings, bold pseudo-headings, nothing inside code fences),
+and each section is packed into chunks that never exceed the chunk size,
+overlap their neighbours, and split a paragraph longer than the chunk size.
+
+Run with: python -m pytest src/tests/test_ingest.py
+"""
+from src.tools.ingest import HEADING_SEPARATOR, chunk_markdown, ingest_file, pack_paragraphs, split_sections
+
+CHEATSHEET = """Intro before any heading.
+
+# DeepSeek Cheatsheet
+
+## Prompts
+
+**Business owners**
+Ask for a SWOT analysis.
+
+### Coding
+
+```python
+# not a heading
+print("hi")
+```
+
+## Settings
+Use temperature 0.3.
+"""
+
+
+def test_sections_capture_the_heading_path():
+    sections = split_sections(CHEATSHEET)
+    assert [headings for headings, _ in sections] == [
+        [],
+        ["DeepSeek Cheatsheet", "Prompts", "Business owners"],
+        ["DeepSeek Cheatsheet", "Prompts", "Coding"],
+        ["DeepSeek Cheatsheet", "Settings"],
+    ]
+    assert "# not a heading" in sections[2][1]  # fenced code stays in the body
+
+    chunks = chunk_markdown(CHEATSHEET, "deepseek.md")
+    assert {chunk["source"] for chunk in chunks} == {"deepseek.md"}
+    assert chunks[1]["heading"] == HEADING_SEPARATOR.join(["DeepSeek Cheatsheet", "Prompts", "Business owners"])
+    assert chunks[1]["text"] == "Ask for a SWOT analysis."
+
+
+def test_chunks_stay_within_the_chunk_size():
+    paragraphs = [f"Paragraph {i} " + "word " * 15 for i in range(20)]
+    chunks = pack_paragraphs("\n\n".join(paragraphs), chunk_size=200, overlap=0)
+    assert len(chunks) > 1 and all(len(chunk) <= 200 for chunk in chunks)
+    # Without overlap every paragraph lands in exactly one chunk, in order
+    assert "\n\n".join(chunks).split("\n\n") == [p.strip() for p in paragraphs]
+
+
+def test_neighbouring_chunks_overlap():
+    paragraphs = ["Short lead-in."] + [f"Step {i}: " + "x" * 80 for i in range(6)] + ["Done."]
+    chunks = pack_paragraphs("\n\n".join(paragraphs), chunk_size=200, overlap=100)
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        tail = previous.split("\n\n")[-1]
+        assert chunk.startswith(tail + "\n\n")  # the boundary paragraph appears in both
+    assert chunks[-1].endswith("Done.")
+
+    long_paragraphs = ["y" * 150, "z" * 150]  # longer than the overlap, so not repeated
+    assert pack_paragraphs("\n\n".join(long_paragraphs), chunk_size=200, overlap=100) == long_paragraphs
+
+
+def test_paragraph_longer_than_the_chunk_size_is_split_into_overlapping_windows():
+    paragraph = "".join(chr(ord("a") + i % 26) for i in range(500))
+    chunks = pack_paragraphs(f"Before.\n\n{paragraph}\n\nAfter.", chunk_size=200, overlap=50)
+    assert chunks[0] == "Before." and chunks[-1] == "After."
+    windows = chunks[1:-1]
+    assert all(len(chunk) <= 200 for chunk in windows)
+    for previous, window in zip(windows, windows[1:]):
+        assert window.startswith(previous[-50:])
+    # Stitching the windows back together restores the paragraph exactly
+    stitched = windows[0] + "".join(window[50:] for window in windows[1:])
+    assert stitched == paragraph
+
+    assert pack_paragraphs(paragraph, chunk_size=200, overlap=0) == [paragraph[i:i + 200] for i in range(0, 500, 200)]
+
+
+def test_ingest_file_uses_the_given_source(tmp_path):
+    path = tmp_path / "notes.md"
+    path.write_text("# Notes\n\nKeep prompts short.", encoding="utf-8")
+    assert ingest_file(path, source="team/notes.md") == [
+        {"source": "team/notes.md", "heading": "Notes", "text": "Keep prompts short."}]
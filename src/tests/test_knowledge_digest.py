@@ -0,0 +1,50 @@
+"""
+Knowledge digests: framework and model cards are built extractively at index
+time, point at the exact chunks they summarise, and are rebuilt only when one
+of their source files changes.
+
+Run with: python -m pytest src/tests/test_knowledge_digest.py
+"""
+from src.tools import knowledge_digest
+from src.tools.knowledge_digest import format_card, load_digests, resolve_pointer, update_digests
+from src.tools.knowledge_index import KnowledgeIndex
+
+CHUNKS = [
+    {"source": "Deepseek_cheatsheet.md", "heading": "DeepSeek > Coding", "text": "Ask DeepSeek to explain code step by step."},
+    {"source": "frameworks.md", "heading": "Frameworks > Overview", "text": "Pick a framework that fits the task."},
+    {"source": "frameworks.md", "heading": "Frameworks > RISEN",
+     "text": "RISEN suits complex multi-step tasks. Always state the end goal. RISEN prompts end with narrowing."},
+]
+
+
+def _index(frameworks_hash="v1"):
+    files = {"Deepseek_cheatsheet.md": {"sha256": "d1", "size": 1, "chunks": 1},
+             "frameworks.md": {"sha256": frameworks_hash, "size": 1, "chunks": 2}}
+    return KnowledgeIndex(files, CHUNKS, None, None)
+
+
+def test_cards_point_at_their_passages_and_rebuild_on_change(tmp_path, monkeypatch):
+    index = _index()
+    cards = {card["id"]: card for card in update_digests(index, tmp_path)["cards"]}
+    assert set(cards) == {"framework:RISEN", "model:DeepSeek"}  # subjects without passages get no card
+
+    risen = cards["framework:RISEN"]
+    assert risen["summary"].startswith("RISEN (Role, Instructions, Steps, End Goal, Narrowing)")
+    assert "- RISEN suits complex multi-step tasks." in risen["summary"]
+    assert "Always state the end goal" not in risen["summary"]  # only sentences naming the framework
+    assert risen["pointers"] == [{"id": "frameworks.md#1", "citation": "frameworks.md > Frameworks > RISEN"}]
+    assert resolve_pointer("frameworks.md#1", index) is CHUNKS[2]
+    assert resolve_pointer("frameworks.md#7", index) is None
+    assert resolve_pointer(" Deepseek_cheatsheet.md#0 ", index) is CHUNKS[0]
+    assert resolve_pointer("frameworks.md", index) is None and resolve_pointer("#1", index) is None
+    assert "  - frameworks.md#1: frameworks.md > Frameworks > RISEN" in format_card(risen)
+
+    built = []
+    build_card = knowledge_digest._card
+    monkeypatch.setattr(knowledge_digest, "_card",
+                        lambda card_id, *args, **kwargs: built.append(card_id) or build_card(card_id, *args, **kwargs))
+    rebuilt = {card["id"]: card for card in update_digests(_index(frameworks_hash="v2"), tmp_path)["cards"]}
+    assert "framework:RISEN" in built and "model:DeepSeek" not in built  # reused from disk
+    assert rebuilt["model:DeepSeek"] == cards["model:DeepSeek"]
+    assert rebuilt["framework:RISEN"]["source_hashes"] == {"frameworks.md": "v2"}
+    assert load_digests(tmp_path)["index_version"] == _index(frameworks_hash="v2").version
@@ -0,0 +1,105 @@
+"""
+Knowledge index builds: unchanged files are reused without re-ingesting or
+re-embedding them, files that fail to ingest are recorded and only retried
+once they change, and concurrent builds (one per worker at startup) are
+serialised, so the corpus is embedded once and no half-written file is
+published.
+
+Run with: python -m pytest src/tests/test_knowledge_index.py
+"""
+import threading
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.tools import docling_tool, embeddings, knowledge_index
+from src.tools.knowledge_snapshot import open_snapshot
+
+
+@pytest.fixture
+def knowledge(tmp_path, monkeypatch):
+    directory = tmp_path / "knowledge"
+    directory.mkdir()
+    (directory / "frameworks.md").write_text("# Frameworks\n\nRISEN: role, instructions, steps.")
+    (directory / "grok.md").write_text("# Grok\n\nAsk for careful reasoning before answering.")
+    embedded = []
+
+    def embed_texts(texts):
+        embedded.append(len(texts))
+        time.sleep(0.1)  # long enough for a concurrent build to overlap
+        return np.eye(len(texts), 8, dtype=np.float32)
+
+    monkeypatch.setattr(knowledge_index, "get_knowledge_files",
+                        lambda base: docling_tool.get_knowledge_files(str(directory)))
+    monkeypatch.setattr(embeddings, "get_embedding_model_id", lambda: "test-model")
+    monkeypatch.setattr(embeddings, "embed_texts", embed_texts)
+    return directory, embedded
+
+
+def test_unchanged_files_are_reused(knowledge, tmp_path, monkeypatch):
+    directory, embedded = knowledge
+    index_dir = tmp_path / "index"
+    first, _ = knowledge_index.build_index(index_dir=index_dir)
+
+    ingested = []
+    ingest_file = knowledge_index.ingest_file
+    monkeypatch.setattr(knowledge_index, "ingest_file",
+                        lambda path, **kwargs: ingested.append(path.name) or ingest_file(path, **kwargs))
+    second, changes = knowledge_index.build_index(index_dir=index_dir)
+    assert changes["unchanged"] == ["frameworks.md", "grok.md"] and not ingested and embedded == [2]
+    assert second.version == first.version and np.array_equal(second.embeddings, first.embeddings)
+
+    (directory / "grok.md").write_text("# Grok\n\nThink mode.")
+    _, changes = knowledge_index.build_index(index_dir=index_dir)
+    assert changes["changed"] == ["grok.md"] and ingested == ["grok.md"] and embedded == [2, 1]
+
+
+def test_failed_files_are_recorded_and_not_retried(knowledge, tmp_path, monkeypatch):
+    directory, _ = knowledge
+    index_dir = tmp_path / "index"
+    (directory / "broken.md").write_text("# Broken")
+    attempts = []
+    ingest_file = knowledge_index.ingest_file
+
+    def flaky_ingest(path, **kwargs):
+        if path.name == "broken.md":
+            attempts.append(path.read_text())
+            if "Broken" in attempts[-1]:
+                raise ValueError("cannot parse")
+        return ingest_file(path, **kwargs)
+
+    monkeypatch.setattr(knowledge_index, "ingest_file", flaky_ingest)
+    index, changes = knowledge_index.build_index(index_dir=index_dir)
+    assert "broken.md" in changes["added"]
+    assert index.files["broken.md"]["error"] == "cannot parse" and index.files["broken.md"]["chunks"] == 0
+    assert {chunk["source"] for chunk in index.chunks} == {"frameworks.md", "grok.md"}
+    assert open_snapshot(index_dir).files.keys() == index.files.keys()  # the snapshot stays current
+
+    _, changes = knowledge_index.build_index(index_dir=index_dir)
+    assert "broken.md" in changes["unchanged"] and len(attempts) == 1
+
+    (directory / "broken.md").write_text("# Fixed\n\nNow it parses.")
+    index, changes = knowledge_index.build_index(index_dir=index_dir)
+    assert changes["changed"] == ["broken.md"] and "error" not in index.files["broken.md"]
+    assert index.files["broken.md"]["chunks"] == 1
+
+
+@pytest.mark.skipif(knowledge_index.fcntl is None, reason="build lock needs fcntl")
+def test_concurrent_builds_embed_once(knowledge, tmp_path):
+    _, embedded = knowledge
+    index_dir = tmp_path / "index"
+    results = []
+    builders = [threading.Thread(target=lambda: results.append(knowledge_index.build_index(index_dir=index_dir)))
+                for _ in range(3)]
+    for builder in builders:
+        builder.start()
+    for builder in builders:
+        builder.join()
+
+    assert embedded == [2]  # the builds that waited found the index current
+    assert sum(bool(changes["added"]) for _, changes in results) == 1
+    assert len({index.version for index, _ in results}) == 1
+    assert not list(index_dir.glob("*.tmp"))
+    assert open_snapshot(index_dir).version == results[0][0].version
@@ -0,0 +1,74 @@
+"""
+Knowledge snapshot round-trip: the memory-mapped snapshot must rank exactly
+like the in-memory index it was written from, and IVF clustering trained at
+write time must be reused rather than recomputed.
+
+Run with: python -m pytest src/tests/test_knowledge_snapshot.py
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.tools import ann_index
+from src.tools.knowledge_index import KnowledgeIndex
+from src.tools.knowledge_snapshot import KnowledgeSnapshot, write_snapshot
+from src.tools.retrieval import HybridRetriever
+
+CHUNKS = [
+    {"source": "Deepseek_cheatsheet.md", "heading": "DeepSeek > Prompts for developers", "text": "Ask DeepSeek to explain code step by step."},
+    {"source": "Grok_cheeatsheet.md", "heading": "Grok 3 > Standout features", "text": "Grok supports real-time search and a think mode."},
+    {"source": "frameworks.md", "heading": "Frameworks > RISEN", "text": "RISEN: role, instructions, steps, end goal, narrowing. Unicode → ok."},
+]
+FILES = {name: {"sha256": name, "size": 1, "chunks": 1} for name in {c["source"] for c in CHUNKS}}
+
+
+def test_snapshot_matches_in_memory_index(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.random((len(CHUNKS), 4), dtype=np.float32)
+    index = KnowledgeIndex(FILES, CHUNKS, vectors, "test-model", built_at=1.0)
+    snapshot = KnowledgeSnapshot(write_snapshot(index, tmp_path / "knowledge.snap"))
+
+    assert snapshot.version == index.version
+    assert list(snapshot.chunks) == CHUNKS
+    assert np.array_equal(snapshot.embeddings, vectors)
+    assert snapshot.pointers == index.pointers
+    assert snapshot.pointer_row("frameworks.md#0") == index.pointer_row("frameworks.md#0") == 2
+
+    expected = HybridRetriever(index, dense_weight=0.0)
+    actual = HybridRetriever(snapshot, dense_weight=0.0)
+    assert actual.pointers is snapshot.pointers  # built once, shared with the digest lookups
+    for query, sources in [("RISEN steps", None), ("think mode search", None), ("code", ["deepseek"])]:
+        assert actual.search(query, sources=sources) == expected.search(query, sources=sources)
+
+
+def test_source_ids_beyond_uint16(tmp_path):
+    names = [f"notes/{i:05d}.md" for i in range(70_000)]
+    chunks = [{"source": name, "heading": "", "text": "note"} for name in names[-2:]]
+    files = {name: {"sha256": name, "size": 1, "chunks": 0} for name in names}
+    snapshot = KnowledgeSnapshot(write_snapshot(KnowledgeIndex(files, chunks, None, None), tmp_path / "knowledge.snap"))
+    assert [chunk["source"] for chunk in snapshot.chunks] == names[-2:]
+
+
+def test_ivf_clustering_is_stored_and_reused(tmp_path, monkeypatch):
+    monkeypatch.setattr(ann_index, "ANN_IVF_THRESHOLD", 0)  # "auto" picks IVF for every shard
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((400, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    chunks = [{"source": f"team{i % 2}/doc{i}.md", "heading": "", "text": f"chunk {i}"} for i in range(400)]
+    files = {c["source"]: {"sha256": c["source"], "size": 1, "chunks": 1} for c in chunks}
+    snapshot = KnowledgeSnapshot(write_snapshot(KnowledgeIndex(files, chunks, vectors, "m"), tmp_path / "knowledge.snap"))
+    centroids, assignment = snapshot.ivf
+    assert sorted(centroids) == ["team0", "team1"] and (assignment >= 0).all()
+
+    def no_kmeans(*args, **kwargs):
+        raise AssertionError("k-means ran although the snapshot has centroids")
+
+    trained = ann_index.build_vector_index(vectors, np.array([c["source"] for c in chunks]), nlist=0)
+    monkeypatch.setattr(ann_index, "_kmeans", no_kmeans)
+    reused = HybridRetriever(snapshot, dense_weight=1.0).vector_index
+    query = vectors[7]
+    assert reused.search(query, 10)[0].tolist() == trained.search(query, 10)[0].tolist()
+
+    # A different ANN_NLIST no longer matches the stored clustering
+    with pytest.raises(AssertionError, match="k-means ran"):
+        ann_index.build_vector_index(snapshot.embeddings, snapshot.sources, nlist=5, ivf=snapshot.ivf)
@@ -0,0 +1,25 @@
+"""
+Knowledge watcher: a burst of file events fires one reload, once no event
+has arrived for the debounce interval.
+
+Run with: python -m pytest src/tests/test_knowledge_watcher.py
+"""
+from src.tools import knowledge_watcher
+
+
+def test_reload_waits_for_the_burst_to_go_quiet(monkeypatch, tmp_path):
+    now = [100.0]
+    monkeypatch.setattr(knowledge_watcher.time, "monotonic", lambda: now[0])
+    fired = []
+    watcher = knowledge_watcher.KnowledgeWatcher(str(tmp_path), lambda: fired.append(now[0]), debounce=1.0)
+
+    for _ in range(5):  # an event every 0.6s: the burst lasts longer than the debounce
+        watcher._mark_changed()
+        now[0] += 0.6
+        watcher._maybe_fire()
+    assert not fired
+
+    now[0] += 0.4
+    watcher._maybe_fire()
+    watcher._maybe_fire()
+    assert fired == [now[0]]
@@ -0,0 +1,79 @@
+"""
+Log correlation fields: task/run ids set with log_context must reach records
+logged from thread pool workers (through bind_context) and appear in the JSON
+log format, and log levels must be changeable at runtime.
+
+Run with: python -m pytest src/tests/test_log_context.py
+"""
+import io
+import json
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.log_context import ContextFilter, bind_context, log_context, new_run
+from src.utils.logger import (
+    APP_LOGGER_NAME, BatchedStreamHandler, BatchingQueueListener, ConsoleFormatter, FileFormatter, JsonFormatter,
+    LazyQueueHandler, Logger,
+)
+
+
+def test_context_reaches_pool_workers_in_json_logs():
+    stream = io.StringIO()
+    handler = BatchedStreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    logger = logging.getLogger("log_context_test")
+    logger.handlers, logger.propagate = [queue_handler], False
+    logger.setLevel(logging.INFO)
+    listener = BatchingQueueListener(log_queue, handler)
+    listener.start()
+
+    def work(i):
+        with log_context(stage=f"variant-{i}"):
+            logger.info("variant %d done", i)
+
+    with log_context(task_id="t-1", mode="lean"), new_run() as fields:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(bind_context(work), range(2)))
+    logger.info("outside")
+    listener.stop()
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    workers = [line for line in lines if line["message"].startswith("variant")]
+    assert len(workers) == 2
+    assert all(line["task_id"] == "t-1" and line["run_id"] == fields["run_id"] for line in workers)
+    assert {line["stage"] for line in workers} == {"variant-0", "variant-1"}
+    assert "task_id" not in lines[-1]
+
+
+def test_formatters_leave_lazy_records_intact():
+    # Records queued with their arguments reach the console and the file formatter in turn
+    record = logging.LogRecord(f"{APP_LOGGER_NAME}.crew", logging.INFO, __file__, 1, "served %s", ("preset",), None)
+    for formatter in (ConsoleFormatter(), FileFormatter(), ConsoleFormatter()):
+        assert "served preset" in formatter.format(record)
+    assert (record.msg, record.args) == ("served %s", ("preset",))
+
+
+def test_set_levels_at_runtime():
+    try:
+        levels = Logger.set_levels(library="DEBUG", loggers={"log_context_test.child": "ERROR"})
+        assert levels["crewai"] == "DEBUG"
+        assert logging.getLogger("log_context_test.child").level == logging.ERROR
+    finally:
+        Logger.set_levels(library="WARNING")
+
+
+def test_app_level_leaves_root_logger_alone(monkeypatch):
+    monkeypatch.setenv(Logger.ENV_VAR_LOG_LEVEL, "INFO")  # set_levels updates it
+    root, app = logging.getLogger(), logging.getLogger(APP_LOGGER_NAME)
+    saved = root.level, app.level
+    try:
+        root.setLevel(logging.WARNING)
+        assert Logger.set_levels(app="DEBUG")["app"] == "DEBUG"
+        assert app.level == logging.DEBUG and root.level == logging.WARNING
+    finally:
+        root.setLevel(saved[0])
+        app.setLevel(saved[1])
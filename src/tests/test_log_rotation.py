@@ -0,0 +1,95 @@
+"""
+Log file rotation: the active log rolls over by size into gzipped,
+timestamped files, and old rotated files are pruned to the backup count.
+Processes sharing one log file rotate it without losing records, and each
+record is formatted once.
+
+Run with: python -m pytest src/tests/test_log_rotation.py
+"""
+import gzip
+import logging
+import queue
+import threading
+
+from src.utils import logger
+from src.utils.logger import BatchingQueueListener, CompressingRotatingFileHandler, FileFormatter
+
+
+def _record(message):
+    return logging.LogRecord("promptweaver.test", logging.INFO, __file__, 1, message, None, None)
+
+
+def test_rotates_compresses_and_prunes(tmp_path, monkeypatch):
+    monkeypatch.setattr(logger, "LOG_COMPRESS_AFTER_S", 0.0)  # no other writer could still append
+    path = tmp_path / "app.log"
+    handler = CompressingRotatingFileHandler(str(path), max_bytes=500, rotate_hours=0, backup_count=3,
+                                             retention_days=0, compress=True)
+    handler.setFormatter(FileFormatter())
+    log_queue = queue.SimpleQueue()
+    listener = BatchingQueueListener(log_queue, handler, file_handler=handler)
+    listener.start()
+    for i in range(200):
+        log_queue.put(_record(f"line {i:03d} " + "x" * 40))
+    log_queue.put("captured print output\n")
+    listener.stop()
+    handler.close()
+
+    rotated = sorted(tmp_path.glob("app.log.*"))
+    assert len(rotated) == 3 and all(p.suffix == ".gz" for p in rotated)
+    assert path.stat().st_size < 500 + 100  # the size check runs before a record is written
+    assert "captured print output" in path.read_text(encoding="utf-8")
+    newest = gzip.open(rotated[-1], "rt", encoding="utf-8").read()
+    assert "line" in newest and newest.endswith("\n")
+
+
+def test_writers_sharing_a_log_file_rotate_without_losing_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(logger, "LOG_REOPEN_CHECK_S", 0.0)
+    path = tmp_path / "app.log"
+    # One handler per writer, as each worker process opens the file itself
+    handlers = [CompressingRotatingFileHandler(str(path), max_bytes=2000, rotate_hours=0, backup_count=1000,
+                                               retention_days=0, compress=True) for _ in range(3)]
+    start = threading.Barrier(len(handlers))
+
+    def write(worker, handler):
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        start.wait()
+        for i in range(300):
+            handler.handle(_record(f"worker {worker} record {i}"))
+        handler.close()
+
+    writers = [threading.Thread(target=write, args=item) for item in enumerate(handlers)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    # Rotated files stay uncompressed while another writer may still append to them
+    assert list(tmp_path.glob("app.log.*")) and not list(tmp_path.glob("app.log.*.gz"))
+    monkeypatch.setattr(logger, "LOG_COMPRESS_AFTER_S", 0.0)
+    CompressingRotatingFileHandler(str(path), rotate_hours=0, backup_count=1000, retention_days=0,
+                                   compress=True).close()  # compresses them at the next start
+    rotated = list(tmp_path.glob("app.log.*"))
+    assert rotated and all(archive.suffix == ".gz" for archive in rotated)
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    for archive in rotated:
+        lines += gzip.decompress(archive.read_bytes()).decode("utf-8").splitlines()
+    assert sorted(lines) == sorted(f"worker {w} record {i}" for w in range(3) for i in range(300))
+
+
+def test_records_are_formatted_once(tmp_path):
+    formatted = []
+
+    class CountingFormatter(logging.Formatter):
+        def format(self, record):
+            formatted.append(record.msg)
+            return super().format(record)
+
+    handler = CompressingRotatingFileHandler(str(tmp_path / "app.log"), max_bytes=100, rotate_hours=0,
+                                             compress=False)
+    handler.setFormatter(CountingFormatter("%(message)s"))
+    for i in range(20):
+        handler.handle(_record(f"record {i:02d} " + "x" * 20))
+    handler.close()
+    assert formatted == [f"record {i:02d} " + "x" * 20 for i in range(20)]
+    assert len(list(tmp_path.glob("app.log.*"))) > 1
@@ -0,0 +1,33 @@
+"""
+Metrics: finished tracing spans feed the latency and LLM metrics, and the
+registry renders valid Prometheus text with cumulative histogram buckets.
+
+Run with: python -m pytest src/tests/test_metrics.py
+"""
+from src.utils import metrics, tracing
+
+
+def _sample(text, prefix):
+    return [float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(prefix)]
+
+
+def test_spans_feed_metrics_and_render(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", False)  # listeners only, no export
+    before = _sample(metrics.render(), 'promptweaver_llm_calls_total{provider="test",model="m",status="error"}')
+
+    with tracing.span("run.test"):
+        with tracing.stage_span("draft"):
+            try:
+                with tracing.span("llm.call", **{"llm.model": "test/m", "llm.completion_tokens": 7}):
+                    raise TimeoutError("slow provider")
+            except TimeoutError:
+                pass
+
+    text = metrics.render()
+    assert _sample(text, 'promptweaver_llm_calls_total{provider="test",model="m",status="error"}') == [
+        (before[0] if before else 0) + 1]
+    assert _sample(text, 'promptweaver_llm_tokens_total{provider="test",model="m",type="completion"}')[0] >= 7
+    buckets = _sample(text, 'promptweaver_stage_duration_seconds_bucket{stage="draft",')
+    assert buckets == sorted(buckets) and buckets[-1] >= 1
+    assert "# TYPE promptweaver_run_duration_seconds histogram" in text
+    assert len(_sample(text, "promptweaver_retries_total ")) == 1  # unlabelled metrics are exported from the start
@@ -0,0 +1,46 @@
+"""
+Write-behind output persistence: queued outputs must land in the prompt
+store with the same content as the synchronous path, and a full queue must
+fall back to writing inline rather than dropping outputs.
+
+Run with: python -m pytest src/tests/test_output_writer.py
+"""
+import time
+import threading
+
+from src.utils.output_writer import OutputWriter, render_document
+from src.utils.prompt_store import PromptStore
+
+PROMPT = "# Launch Plan\n\nWrite a launch plan.\n\nThis prompt combines RISEN and RTF."
+
+
+def test_writer_batches_and_flushes(tmp_path):
+    writer = OutputWriter(batch_size=8, batch_wait_ms=20, fsync="batch")
+    written = []
+    for i in range(20):
+        writer.submit(PROMPT.replace("Launch", f"Launch {i}"), "launch plan", str(tmp_path), written.append)
+    assert writer.close(timeout=5)
+
+    stats = writer.stats()
+    assert stats["written"] == 20 and stats["failed"] == 0
+    assert stats["batches"] < 20
+    assert len(PromptStore(str(tmp_path))) == 20
+    expected = render_document(PROMPT.replace("Launch", "Launch 0"), "")[1]
+    assert any(open(path, encoding="utf-8").read() == expected for path in written)
+
+
+def test_full_queue_writes_inline(tmp_path):
+    writer = OutputWriter(queue_size=1, batch_size=1, submit_timeout_s=0)
+    release = threading.Event()
+    writer.submit(PROMPT, "first", str(tmp_path), lambda path: release.wait(5))  # stalls the writer thread
+    for _ in range(50):
+        if writer.stats()["written"]:
+            break
+        time.sleep(0.01)
+    writer.submit(PROMPT.replace("Launch", "Second"), "second", str(tmp_path))  # fills the queue
+    writer.submit(PROMPT.replace("Launch", "Third"), "third", str(tmp_path))  # queue full: written inline
+    assert writer.stats()["sync_fallbacks"] == 1
+    assert [r["instruction"] for r in PromptStore(str(tmp_path)).list()] == ["third", "first"]
+    release.set()
+    assert writer.close(timeout=5)
+    assert len(PromptStore(str(tmp_path))) == 3
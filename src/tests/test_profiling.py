@@ -0,0 +1,74 @@
+"""
+Profiling: runs are only profiled when requested, samples and cProfile
+stats are tagged with the stage that was running (including stages entered
+in pool workers), and files land under profiles/<task id>/.
+
+Run with: python -m pytest src/tests/test_profiling.py
+"""
+import os
+import pstats
+import threading
+
+import pytest
+
+from src.utils import profiling, tracing
+from src.utils.log_context import bind_context, log_context, new_run
+
+
+def _busy_scoring(seconds=0.15):
+    import time
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(i * i for i in range(200))
+    return total
+
+
+def _worker():
+    with profiling.profile_stage("worker"):
+        _busy_scoring()
+
+
+def test_not_profiled_unless_requested(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_RUNS", False)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    with profiling.profile_run("pipeline") as session:
+        assert session is None
+    assert not os.listdir(tmp_path)
+
+
+def test_cprofile_falls_back_to_sampling_without_per_thread_profilers(monkeypatch, caplog):
+    monkeypatch.setattr(profiling, "PROFILER", "cprofile")
+    monkeypatch.setattr(profiling, "CPROFILE_PER_THREAD", False)
+    monkeypatch.setattr(profiling, "_sampling_fallback_warned", False)
+    with caplog.at_level("WARNING", logger=profiling.logger.name):
+        assert isinstance(profiling._new_session("pipeline"), profiling.SamplingSession)
+    assert "sampling runs instead" in caplog.text
+
+
+@pytest.mark.parametrize("profiler", ["sampling", "cprofile"])
+def test_profiles_are_tagged_by_stage(monkeypatch, tmp_path, profiler):
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", False)
+    monkeypatch.setattr(profiling, "PROFILER", profiler)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+
+    with log_context(task_id="task/1"), new_run(), profiling.request_profiling() as written:
+        with tracing.span("run.test"), profiling.profile_run("pipeline"):
+            with tracing.stage_span("draft"):
+                _busy_scoring()
+            with tracing.stage_span("analysis"):
+                worker = threading.Thread(target=bind_context(_worker))
+                worker.start()
+                worker.join()
+
+    assert written and all(os.path.dirname(path) == str(tmp_path / "task_1") for path in written)
+    if profiler == "sampling" or not profiling.CPROFILE_PER_THREAD:  # cprofile samples from 3.12
+        stacks = open(written[0], encoding="utf-8").read()
+        assert "[pipeline];[draft];" in stacks and "_busy_scoring" in stacks
+        assert "[pipeline];[analysis];[worker];" in stacks  # stage entered on another thread
+        assert "[pipeline];[draft]" in "\n".join(profiling.top_collapsed(written[0]))
+    else:
+        stages = {os.path.basename(path).split(".", 1)[1] for path in written}
+        assert {"pstats", "pipeline_draft.pstats", "pipeline_analysis_worker.pstats"} <= stages
+        functions = {name for _, _, name in pstats.Stats(written[0]).stats}
+        assert "_busy_scoring" in functions
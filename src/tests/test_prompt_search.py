@@ -0,0 +1,68 @@
+"""
+Prompt history search: BM25 ranking, prefix matching of the last word, and
+incremental indexing of records saved after the index was loaded, a saved
+index that loads without pickle, and validation of the API's limit.
+
+Run with: python -m pytest src/tests/test_prompt_search.py
+"""
+import pytest
+
+pytest.importorskip("numpy")
+
+from src.utils.prompt_search import PromptSearchIndex
+from src.utils.prompt_store import PromptStore
+
+
+def test_search_ranks_prefixes_and_syncs(tmp_path):
+    store = PromptStore(str(tmp_path))
+    launch = store.add("# Launch Plan\n\nPlan the product launch: launch checklist.\n", "product launch plan", title="Launch Plan")
+    store.add("# Newsletter\n\nGrow an email newsletter.\n", "newsletter growth", title="Newsletter")
+    store.add("# Planning Poker\n\nRun a sprint planning session.\n", "sprint planning", title="Planning Poker")
+
+    index = PromptSearchIndex(store)
+    assert index.search("launch")["results"][0]["id"] == launch["id"]
+    assert {r["title"] for r in index.search("plann")["results"]} == {"Planning Poker"}
+    assert {r["title"] for r in index.search("pla")["results"]} == {"Launch Plan", "Planning Poker"}
+    assert index.search("pla ")["total"] == 0  # trailing space: exact words only
+
+    later = store.add("# Podcast\n\nLaunch a podcast.\n", "podcast launch")
+    assert later["id"] in {r["id"] for r in index.search("podcast")["results"]}
+
+    index.save()
+    reloaded = PromptSearchIndex(store)
+    assert len(reloaded) == 4
+    assert reloaded.search("newsletter")["total"] == 1
+
+
+def test_index_round_trips_without_pickle(tmp_path):
+    import numpy as np
+
+    store = PromptStore(str(tmp_path))
+    for i in range(3):
+        store.add(f"# Prompt {i}\n\nLaunch checklist number {i}.\n", f"launch {i}")
+    index = PromptSearchIndex(store)
+    index.sync()
+    index.save()
+    with np.load(index.path, allow_pickle=False) as state:
+        assert state["doc_ids"].tolist() == index.doc_ids
+    reloaded = PromptSearchIndex(store)
+    assert reloaded.vocabulary == index.vocabulary and reloaded.total_length == index.total_length
+    assert reloaded.search("checklist")["results"] == index.search("checklist")["results"]
+
+
+def test_api_validates_limit(monkeypatch):
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    from src import api
+
+    calls = []
+    monkeypatch.setattr(api, "search_prompts", lambda query, limit, offset: calls.append((limit, offset)) or {})
+    client = TestClient(api.app)
+
+    def search(**params):
+        return client.post("/a2a", json={"jsonrpc": "2.0", "id": 1, "method": "prompts/search",
+                                         "params": {"query": "launch", **params}}).json()
+
+    assert search(limit="ten")["error"]["code"] == -32602
+    assert "result" in search(limit=0, offset=-5) and "result" in search(limit=500)
+    assert calls == [(1, 0), (100, 0)]
@@ -0,0 +1,45 @@
+"""
+Prompt store: identical prompts share one blob, every generation gets an
+index record, records written by another process are visible, and
+malformed index lines are skipped.
+
+Run with: python -m pytest src/tests/test_prompt_store.py
+"""
+import os
+
+from src.utils.prompt_store import PromptStore, content_hash
+
+PROMPT = "# Launch Plan\n\nWrite a launch plan.\n"
+
+
+def test_dedup_and_lookup(tmp_path):
+    store = PromptStore(str(tmp_path))
+    first = store.add(PROMPT, "launch plan", title="Launch Plan", mode="lean", timings={"total_s": 1.5})
+    second = store.add(PROMPT, "launch plan again", title="Launch Plan")
+    other = store.add("# Other\n", "other")
+
+    assert not first["duplicate"] and second["duplicate"]
+    assert first["hash"] == second["hash"] == content_hash(PROMPT)
+    assert len(os.listdir(tmp_path / "blobs" / first["hash"][:2])) == 1
+    assert store.get(first["id"])["timings"] == {"total_s": 1.5}
+    assert store.get(first["hash"])["id"] == second["id"]  # latest generation for that content
+    assert store.read(other["id"]) == "# Other\n"
+    assert [r["id"] for r in store.list(limit=2)] == [other["id"], second["id"]]
+
+    reopened = PromptStore(str(tmp_path))
+    assert len(reopened) == 3 and reopened.stats()["blobs"] == 2
+    store.add("# Later\n", "later")  # appended by "another process"
+    assert reopened.get(store.list(limit=1)[0]["id"]) is not None
+    assert len(reopened) == 4  # len() sees records appended elsewhere too
+
+
+def test_malformed_index_lines_are_skipped(tmp_path):
+    store = PromptStore(str(tmp_path))
+    kept = store.add(PROMPT, "launch plan")
+    with open(store.index_path, "ab") as f:
+        f.write(b'{"id": "broken"\n["not", "a", "record"]\n{"id": "nohash"}\n\xff\xfe\n')
+    store.add("# Other\n", "other")
+
+    reopened = PromptStore(str(tmp_path))
+    assert len(reopened) == len(store) == 2
+    assert reopened.get(kept["id"]) is not None and reopened.get("nohash") is None
@@ -0,0 +1,68 @@
+"""
+Retrieval-only research: with RETRIEVAL_ONLY_RESEARCH the research stage is
+assembled from local retrieval and the framework table, with the knowledge
+researcher's sections and exact file/section citations, and only the
+analysis stage calls the LLM.
+
+Run with: python -m pytest src/tests/test_research_report.py
+"""
+import pytest
+
+pytest.importorskip("numpy")
+
+from src import crew
+from src.tools import research_report
+from src.tools.knowledge_index import KnowledgeIndex
+from src.tools.retrieval import HybridRetriever
+
+CHUNKS = [
+    {"source": "frameworks.md", "heading": "Frameworks > RISEN",
+     "text": "RISEN framework: Role, Instructions, Steps, End Goal, Narrowing for multi-step processes."},
+    {"source": "techniques.md", "heading": "Techniques > Chain of thought",
+     "text": "Chain of thought: ask the model to reason step by step before answering."},
+    {"source": "Grok_cheeatsheet.md", "heading": "Grok 3 > Think mode",
+     "text": "Grok think mode works best for a workflow with explicit steps."},
+]
+
+
+def _retriever():
+    files = {name: {"sha256": name, "size": 1, "chunks": 1} for name in {c["source"] for c in CHUNKS}}
+    return HybridRetriever(KnowledgeIndex(files, CHUNKS, None, None), dense_weight=0.0)
+
+
+def test_report_sections_and_citations():
+    report = research_report.build_research_report(
+        "Write a step-by-step workflow guide for Grok", "Complex multi-step process", retriever=_retriever())
+
+    headings = [line for line in report.splitlines() if line.startswith("### ")]
+    assert headings == ["### Recommended Framework(s)", "### Key Techniques", "### Model-Specific Notes",
+                        "### Relevant Constraints/Best Practices", "### Source Files Cited"]
+    assert "- **RISEN** (Role, Instructions, Steps, End Goal, Narrowing)" in report
+    assert "[frameworks.md > Frameworks > RISEN]" in report
+    assert "- **Chain-of-thought**: Chain of thought: ask the model" in report
+    assert "- **Grok**: Grok think mode" in report and "[Grok_cheeatsheet.md > Grok 3 > Think mode]" in report
+    assert "Consulted: Grok_cheeatsheet.md, frameworks.md, techniques.md" in report
+
+
+def test_upstream_stages_call_the_llm_for_analysis_only(monkeypatch):
+    kicked_off = []
+
+    class Output:
+        raw = "Analysis: a multi-step workflow for Grok"
+
+    class AnalysisCrew:
+        def copy(self):
+            return self
+
+        def kickoff(self, inputs):
+            kicked_off.append(inputs)
+            return type("Result", (), {"tasks_output": [Output()]})()
+
+    monkeypatch.setattr(crew, "RETRIEVAL_ONLY_RESEARCH", True)
+    monkeypatch.setattr(crew, "get_crew_components", lambda: {"analysis_crew": AnalysisCrew()})
+    monkeypatch.setattr(research_report, "get_retriever", _retriever)
+
+    stages = crew.run_upstream_stages("Write a step-by-step workflow guide for Grok")
+    assert kicked_off == [{"instruction": "Write a step-by-step workflow guide for Grok"}]
+    assert stages["analysis"] == Output.raw
+    assert stages["research"].startswith("### Recommended Framework(s)") and "Grok_cheeatsheet.md" in stages["research"]
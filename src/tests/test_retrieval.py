@@ -0,0 +1,76 @@
+"""
+Hybrid retrieval: BM25 and dense scores are fused after max-normalisation,
+so a chunk that shares no words with the query can still be found through
+its embedding, and source filters apply to both. Cached results belong to
+the index version they were computed from, and cached filter masks are
+bounded.
+
+Run with: python -m pytest src/tests/test_retrieval.py
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.tools import embeddings, retrieval
+from src.tools.knowledge_index import KnowledgeIndex
+from src.tools.retrieval import HybridRetriever, RetrievalCache
+
+CHUNKS = [
+    {"source": "frameworks.md", "heading": "Frameworks > RISEN", "text": "RISEN: role, instructions, steps, end goal."},
+    {"source": "frameworks.md", "heading": "Frameworks > SCQA", "text": "Situation, complication, question, answer."},
+    {"source": "Grok_cheeatsheet.md", "heading": "Grok > Think mode", "text": "Ask for careful reasoning before answering."},
+]
+VECTORS = np.eye(3, 4, dtype=np.float32)  # one orthogonal direction per chunk
+
+
+def _index():
+    files = {name: {"sha256": name, "size": 1, "chunks": 1} for name in {c["source"] for c in CHUNKS}}
+    return KnowledgeIndex(files, CHUNKS, VECTORS, "test-model")
+
+
+def test_dense_scores_surface_chunks_without_shared_words(monkeypatch):
+    # The query embeds like the Grok chunk but only shares words with RISEN
+    monkeypatch.setattr(embeddings, "embed_query", lambda query: np.array([0.6, 0, 0.8, 0], dtype=np.float32))
+    lexical = HybridRetriever(_index(), dense_weight=0.0).search("role steps")
+    assert [r["heading"] for r in lexical] == ["Frameworks > RISEN"] and lexical[0]["dense"] is None
+
+    hybrid = HybridRetriever(_index(), dense_weight=0.5).search("role steps")
+    assert [r["heading"] for r in hybrid] == ["Frameworks > RISEN", "Grok > Think mode"]
+    assert hybrid[0]["score"] == pytest.approx(0.5 * 1 + 0.5 * 0.6 / 0.8)  # both max-normalised
+    assert hybrid[1]["bm25"] == 0 and hybrid[1]["score"] == pytest.approx(0.5)
+    assert hybrid[1]["pointer"] == "Grok_cheeatsheet.md#0"
+
+    filtered = HybridRetriever(_index(), dense_weight=0.5).search("role steps", sources=["grok"])
+    assert [r["source"] for r in filtered] == ["Grok_cheeatsheet.md"]
+
+
+def test_cache_keeps_old_and_new_snapshot_during_reload():
+    cache = RetrievalCache(maxsize=16, versions=2)
+    old, new = ("v1", "q", (), 5, 0.5), ("v2", "q", (), 5, 0.5)
+    cache.put(old, [{"pointer": "a#0"}])
+    cache.put(new, [{"pointer": "b#0"}])
+    # Interleaved lookups from retrievers on either snapshot do not evict each other
+    assert cache.get(old) == [{"pointer": "a#0"}] and cache.get(new) == [{"pointer": "b#0"}]
+    assert cache.get(old) is not None and cache.stats()["invalidations"] == 0
+
+    cache.put(("v3", "q", (), 5, 0.5), [{"pointer": "c#0"}])
+    assert cache.get(old) is None and cache.get(new) is not None
+    cache.put(old, [{"pointer": "a#0"}])  # late result from the retired snapshot
+    assert cache.get(old) is None
+    stats = cache.stats()
+    assert stats["invalidations"] == 1 and stats["index_version"] == "v3"
+
+    cache.register("v1")  # a reload reverted the knowledge base to the first snapshot
+    cache.put(old, [{"pointer": "a#0"}])
+    assert cache.get(old) is not None and cache.get(new) is None
+
+
+def test_filter_masks_are_kept_in_a_bounded_lru(monkeypatch):
+    monkeypatch.setattr(retrieval, "MASK_CACHE_SIZE", 2)
+    retriever = HybridRetriever(_index(), dense_weight=0.0)
+    grok = retriever.filter_mask(["Grok"])
+    assert grok.tolist() == [False, False, True] and retriever.filter_mask(["grok"]) is grok
+    retriever.filter_mask(["frameworks"])
+    assert retriever.filter_mask(["GROK"]) is grok  # refreshed, so the next filter evicts "frameworks"
+    retriever.filter_mask(["cheeatsheet"])
+    assert list(retriever._masks) == [("grok",), ("cheeatsheet",)]
@@ -0,0 +1,105 @@
+"""
+Socket daemon: requests round-trip with the caller's log context, ping only
+answers when a daemon is listening, a stale socket file is replaced, the
+socket is owner-only, and the thin CLI client does not load numpy.
+
+Run with: python -m pytest src/tests/test_socket_daemon.py
+"""
+import os
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+
+import pytest
+
+from src import main
+from src.utils import socket_daemon
+from src.utils.log_context import current_context, log_context
+
+pytestmark = pytest.mark.skipif(not socket_daemon.is_supported(), reason="needs Unix domain sockets")
+
+
+@pytest.fixture
+def socket_path():
+    # AF_UNIX paths are limited to ~100 bytes, so stay in a short temp directory
+    with tempfile.TemporaryDirectory(prefix="pw-") as directory:
+        yield os.path.join(directory, "daemon.sock")
+
+
+@pytest.fixture
+def running(socket_path):
+    servers = []
+
+    def start(handler):
+        server = socket_daemon.create_server(handler, socket_path)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_request_round_trip_carries_log_context(running, socket_path):
+    def handler(request):
+        if request["instruction"] == "boom":
+            raise ValueError("crew exploded")
+        return {"ok": True, "echo": request["instruction"], "task_id": current_context().get("task_id")}
+
+    running(handler)
+    with log_context(task_id="cli-1"):
+        response = socket_daemon.send_request(socket_path, {"instruction": "Write a haiku"})
+    assert response == {"ok": True, "echo": "Write a haiku", "task_id": "cli-1"}
+    assert socket_daemon.send_request(socket_path, {"instruction": "boom"}) == {"ok": False, "error": "crew exploded"}
+
+
+def test_daemon_saves_the_prompt_for_the_client(running, socket_path, monkeypatch):
+    class Crew:
+        def copy(self):
+            return self
+
+    def fake_run(instruction, stage_sink=None, crew=None):
+        stage_sink["draft"] = "d"
+        return "# Prompt"
+
+    saved = []
+    monkeypatch.setattr(main, "run_prompt_weaver_crew", fake_run)
+    monkeypatch.setattr(main, "prompt_engineering_crew", Crew())
+    monkeypatch.setattr(main, "save_output", lambda prompt, instruction, on_written=None, **metadata: (
+        saved.append(prompt), on_written("output/prompt.md")))
+    running(main.handle_daemon_request)
+    assert main.generate_via_daemon(socket_path, "Write a haiku") == ("# Prompt", "output/prompt.md")
+    assert saved == ["# Prompt"]
+
+
+def test_ping_and_socket_permissions(running, socket_path):
+    assert not socket_daemon.daemon_available(socket_path)
+    running(lambda request: {"ok": True})
+    assert socket_daemon.daemon_available(socket_path)
+    assert stat.S_IMODE(os.stat(socket_path).st_mode) & 0o077 == 0  # owner-only from the moment of bind
+    with pytest.raises(RuntimeError, match="already listening"):
+        socket_daemon.create_server(lambda request: {"ok": True}, socket_path)
+
+
+def test_stale_socket_is_replaced(running, socket_path):
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()  # the file stays behind, as after a crash
+    assert os.path.exists(socket_path) and not socket_daemon.daemon_available(socket_path)
+
+    running(lambda request: {"ok": True, "fresh": True})
+    assert socket_daemon.send_request(socket_path, {"instruction": "x"})["fresh"]
+
+
+def test_daemon_client_path_does_not_load_numpy():
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    probe = subprocess.run(
+        [sys.executable, "-c", "import sys, src.main; sys.exit(3 if 'numpy' in sys.modules else 0)"],
+        cwd=root, capture_output=True,
+    )
+    assert probe.returncode == 0, probe.stderr
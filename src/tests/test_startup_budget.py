@@ -0,0 +1,47 @@
+"""
+Startup-time regression tests.
+
+Importing the service modules must not load crewai or assemble crews; that
+work belongs to the first request or the background warmup. Budgets can be
+relaxed on slow CI machines via STARTUP_BUDGET_CREW_MS / STARTUP_BUDGET_API_MS.
+
+Run with: python -m pytest src/tests/test_startup_budget.py
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from src.utils.startup_profile import PROJECT_ROOT, measure_import
+
+CREW_BUDGET_MS = int(os.getenv("STARTUP_BUDGET_CREW_MS", "500"))
+API_BUDGET_MS = int(os.getenv("STARTUP_BUDGET_API_MS", "2500"))
+
+
+def _modules_loaded_after_import(module):
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT, LOG_FILE_ENABLE="false")
+    code = f"import sys, {module}; print(','.join(sorted(m.split('.')[0] for m in sys.modules)))"
+    proc = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+    return set(proc.stdout.strip().split(","))
+
+
+def test_crew_import_is_lazy():
+    pytest.importorskip("dotenv")
+    loaded = _modules_loaded_after_import("src.crew")
+    for heavy in ("crewai", "litellm", "openai", "docling", "chromadb"):
+        assert heavy not in loaded, f"importing src.crew eagerly loaded {heavy}"
+
+
+def test_crew_import_within_budget():
+    pytest.importorskip("dotenv")
+    elapsed, _ = measure_import("src.crew")
+    assert elapsed * 1000 < CREW_BUDGET_MS, f"src.crew import took {elapsed * 1000:.0f} ms (budget {CREW_BUDGET_MS} ms)"
+
+
+def test_api_import_within_budget():
+    pytest.importorskip("fastapi")
+    pytest.importorskip("dotenv")
+    elapsed, _ = measure_import("src.api")
+    assert elapsed * 1000 < API_BUDGET_MS, f"src.api import took {elapsed * 1000:.0f} ms (budget {API_BUDGET_MS} ms)"
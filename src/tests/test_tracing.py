@@ -0,0 +1,93 @@
+"""
+Tracing spans: nested spans (including pool workers through bind_context)
+share one trace with correct parents, leaf spans without a parent are not
+recorded, and the exported JSONL renders as a waterfall for a task id.
+Concurrent calls on a shared LLM instance book their own response's tokens.
+
+Run with: python -m pytest src/tests/test_tracing.py
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils import tracing
+from src.utils.usage import collect_usage
+from src.utils.log_context import bind_context, log_context, new_run
+
+
+def test_spans_export_and_render_waterfall(tmp_path, monkeypatch):
+    exporter = tracing.SpanExporter(str(tmp_path), otlp_endpoint="")
+    monkeypatch.setattr(tracing, "_exporter", exporter)
+
+    class FakeLLM:
+        model = "fake/model"
+
+        def call(self, messages):
+            return "ok"
+
+    llm = tracing.instrument_llm(FakeLLM())
+    llm.call([{"role": "user", "content": "hi"}])  # outside a run: not traced
+    fallback = tracing.traced("fallback.generate_prompt", require_parent=True)(lambda: "fallback")
+    fallback()  # outside a run: not traced
+
+    def branch(i):
+        with tracing.stage_span(f"variant-{i}"):
+            llm.call([{"role": "user", "content": "draft"}])
+
+    with log_context(task_id="task-1"), new_run():
+        with tracing.span("run.variants"):
+            with tracing.stage_span("analysis"):
+                fallback()
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                list(pool.map(bind_context(branch), range(2)))
+    exporter.flush()
+
+    spans = tracing.load_spans(str(tmp_path))
+    assert sorted(s["name"] for s in spans) == [
+        "fallback.generate_prompt", "llm.call", "llm.call", "run.variants", "stage.analysis",
+        "stage.variant-0", "stage.variant-1"]
+    assert len({s["trace_id"] for s in spans}) == 1
+    by_id = {s["span_id"]: s for s in spans}
+    for s in spans:
+        if s["name"] == "llm.call":
+            assert by_id[s["parent_span_id"]]["name"].startswith("stage.variant")
+        assert s["attributes"]["task.id"] == "task-1"
+
+    traces = tracing.find_traces(spans, "task-1")
+    lines = tracing.render_waterfall(next(iter(traces.values())))
+    assert lines[0].split()[2] == "run.variants" and len(lines) == 7
+    assert tracing.to_otlp(spans)["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["traceId"]
+
+
+def test_concurrent_calls_on_a_shared_llm_book_their_own_tokens(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", False)
+    overlap = threading.Barrier(2)
+
+    class SharedLLM:
+        model = "openai/gpt-4o-mini"
+
+        def __init__(self):
+            self._token_usage = {"prompt_tokens": 0, "completion_tokens": 0}
+
+        def _track_token_usage_internal(self, usage):
+            for key in self._token_usage:
+                self._token_usage[key] += usage[key]
+
+        def call(self, messages):
+            tokens = int(messages[0]["content"])
+            overlap.wait(5)  # both calls are in flight before either reports usage
+            self._track_token_usage_internal({"prompt_tokens": tokens, "completion_tokens": tokens // 10})
+            overlap.wait(5)
+            return "ok"
+
+    llm = tracing.instrument_llm(SharedLLM())
+
+    def task(tokens):
+        with log_context(task_id=f"task-{tokens}"), collect_usage() as ledger, tracing.span("run.pipeline"):
+            llm.call([{"role": "user", "content": str(tokens)}])
+        return ledger.summary()
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        small, large = pool.map(task, [100, 2000])
+    assert (small["prompt_tokens"], small["completion_tokens"]) == (100, 10)
+    assert (large["prompt_tokens"], large["completion_tokens"]) == (2000, 200)
+    assert llm._token_usage == {"prompt_tokens": 2100, "completion_tokens": 210}
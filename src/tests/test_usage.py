@@ -0,0 +1,45 @@
+"""
+Token usage: LLM call spans are booked per stage and model on the ledger of
+the enclosing collect_usage() block, priced from the price table, and reach
+ledgers in worker threads through bind_context().
+
+Run with: python -m pytest src/tests/test_usage.py
+"""
+import threading
+
+from src.utils import tracing, usage
+from src.utils.log_context import bind_context
+
+
+def _call(model, prompt_tokens, completion_tokens):
+    with tracing.span("llm.call", require_parent=True, **{
+        "llm.model": model, "llm.prompt_tokens": prompt_tokens, "llm.completion_tokens": completion_tokens,
+    }):
+        pass
+
+
+def test_usage_by_stage_and_model_with_cost(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", False)
+    monkeypatch.setattr(usage, "PRICES", usage.load_prices('{"test/priced": {"prompt": 1, "completion": 2}}'))
+
+    with usage.collect_usage() as outer:
+        with tracing.span("run.test"):
+            with tracing.stage_span("analysis"):
+                _call("test/priced", 1000, 500)
+            with tracing.stage_span("draft"), tracing.span("task Drafter", **{"crewai.agent": "Drafter"}):
+                worker = threading.Thread(target=bind_context(_call), args=("test/priced", 2000, 0))
+                worker.start()
+                worker.join()
+            with usage.collect_usage() as inner:
+                _call("other/unpriced", 10, 10)
+    _call("test/priced", 1, 1)  # outside any run or ledger: not booked
+
+    summary = outer.summary()
+    assert summary["calls"] == 3
+    assert summary["prompt_tokens"] == 3010 and summary["completion_tokens"] == 510
+    assert summary["cost_usd"] == (1000 * 1 + 500 * 2 + 2000 * 1) / 1e6
+    assert summary["stages"]["analysis"]["total_tokens"] == 1500
+    assert summary["stages"]["task:Drafter"]["prompt_tokens"] == 2000
+    assert summary["models"]["other/unpriced"]["cost_usd"] == 0
+    assert summary["unpriced_models"] == ["other/unpriced"]
+    assert inner.summary()["calls"] == 1
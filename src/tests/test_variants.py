@@ -0,0 +1,94 @@
+"""
+Prompt variants: analysis and research run once for all variants, each
+branch gets its own temperature and framework, and variants are ranked by the
+local scorer with failed branches last. The scorer rewards structure and
+instruction coverage and penalises leftover meta-commentary.
+
+Run with: python -m pytest src/tests/test_variants.py
+"""
+import threading
+
+from src import crew
+from src.utils.prompt_scorer import score_breakdown, score_prompt
+
+INSTRUCTION = "Write a launch plan for a budgeting mobile app"
+BODY = " ".join(["Explain each launch step for the budgeting mobile app clearly."] * 15)
+STRUCTURED = (f"# Launch Plan\n\n## Objective\n{BODY}\n\n## Context\nYou are a product marketer.\n\n"
+              "## Instructions\n1. Plan.\n\n## Constraints\nStay on budget.\n\n## Output Format\nA table.")
+
+
+def test_variants_share_upstream_stages_and_are_ranked(monkeypatch):
+    upstream_calls, branches = [], []
+    lock = threading.Lock()
+
+    def fake_upstream(instruction):
+        upstream_calls.append(instruction)
+        return {"analysis": "A", "research": "R"}
+
+    class DraftingCrew:
+        def __init__(self, temperature, framework):
+            self.temperature, self.framework = temperature, framework
+
+        def kickoff(self, inputs):
+            assert inputs == {"instruction": INSTRUCTION, "analysis": "A", "research": "R"}
+            if self.framework == "SCQA":
+                raise RuntimeError("model timed out")
+            # RISEN drafts the best-structured prompt, the rest only a title
+            return STRUCTURED if self.framework == "RISEN" else f"# {self.framework} plan\n\nShort."
+
+    def fake_drafting_crew(temperature, framework=None, lean_mode=None):
+        with lock:
+            branches.append((temperature, framework))
+        return DraftingCrew(temperature, framework)
+
+    monkeypatch.setattr(crew, "OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setattr(crew, "run_upstream_stages", fake_upstream)
+    monkeypatch.setattr(crew, "build_drafting_crew", fake_drafting_crew)
+    monkeypatch.setattr(crew, "run_with_retries", lambda fn, **kwargs: fn(**kwargs))
+
+    variants = crew.run_prompt_weaver_variants(INSTRUCTION, n=4)
+    assert upstream_calls == [INSTRUCTION]
+    assert sorted(branches) == sorted(zip(crew.VARIANT_TEMPERATURES[:4], crew.VARIANT_FRAMEWORKS[:4]))
+    assert {v["variant"]: (v["temperature"], v["framework"]) for v in variants} == {
+        1: (0.7, "PECRA"), 2: (0.3, "RISEN"), 3: (1.0, "SCQA"), 4: (0.5, "GRADE")}
+
+    assert variants[0]["framework"] == "RISEN" and variants[-1]["framework"] == "SCQA"
+    assert variants[-1]["score"] == 0.0 and variants[-1]["prompt"].startswith("Error:")
+    assert [v["score"] for v in variants] == sorted((v["score"] for v in variants), reverse=True)
+
+
+def test_variant_count_is_capped(monkeypatch):
+    monkeypatch.setattr(crew, "OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setattr(crew, "run_upstream_stages", lambda instruction: {"analysis": "A", "research": "R"})
+    monkeypatch.setattr(crew, "_run_variant_branch", lambda i, *args: {"variant": i + 1, "prompt": "# P"})
+    assert len(crew.run_prompt_weaver_variants(INSTRUCTION, n=50, rank=False)) == crew.MAX_VARIANTS
+
+
+def test_upstream_stages_run_analysis_and_research_in_one_kickoff(monkeypatch):
+    kickoffs = []
+
+    class UpstreamCrew:
+        def copy(self):
+            return self
+
+        def kickoff(self, inputs):
+            kickoffs.append(inputs)
+            outputs = [type("Output", (), {"raw": raw})() for raw in ("analysis text", "research text")]
+            return type("Result", (), {"tasks_output": outputs})()
+
+    monkeypatch.setattr(crew, "RETRIEVAL_ONLY_RESEARCH", False)
+    monkeypatch.setattr(crew, "get_crew_components", lambda: {"upstream_crew": UpstreamCrew()})
+    assert crew.run_upstream_stages(INSTRUCTION) == {"analysis": "analysis text", "research": "research text"}
+    assert kickoffs == [{"instruction": INSTRUCTION}]
+
+
+def test_scorer_rewards_structure_and_coverage():
+    structured = score_breakdown(STRUCTURED, INSTRUCTION)
+    assert structured["structure"] == 1.0 and structured["title"] == 1.0 and structured["coverage"] == 1.0
+    assert structured["length"] == 1.0 and structured["total"] == 1.0
+
+    unrelated = score_prompt("# Poem\n\n## Objective\nWrite a poem about the sea.", INSTRUCTION)
+    assert unrelated < structured["total"]
+
+    with_notes = score_breakdown(STRUCTURED + "\n\nCritique: too long. Notes: fix later.", INSTRUCTION)
+    assert with_notes["cleanliness"] == 0.5 and with_notes["total"] < structured["total"]
@@ -0,0 +1,401 @@
+"""
+Approximate nearest-neighbour search for the dense half of knowledge retrieval.
+
+A flat scan (one matrix-vector product over every chunk) is exact and is the
+right choice for small knowledge bases. For large corpora the retriever can
+use an IVF index instead: vectors are clustered with spherical k-means and a
+query only scans the `nprobe` clusters whose centroids are closest, which
+trades a little recall for far fewer vectors touched per query.
+
+Chunks are sharded by collection (the top-level directory of the source
+file), one sub-index per collection, so a source-filtered query only touches
+the shards that can match. Vectors are stored as float32, float16 or int8
+(per-vector scale), whichever is the most precise to fit ANN_MEMORY_BUDGET_MB.
+
+Clustering is the expensive part of building an IVF index, so train_ivf runs
+it once when the knowledge snapshot is written; the centroids and cluster
+assignments are stored in the snapshot and reused by every process.
+
+Settings (environment):
+    ANN_BACKEND            auto | flat | ivf (auto: IVF for shards above ANN_IVF_THRESHOLD chunks)
+    ANN_IVF_THRESHOLD      shard size from which auto switches to IVF (default 50000)
+    ANN_NLIST              IVF clusters per shard (default: sqrt(chunks))
+    ANN_NPROBE             clusters scanned per query; higher = better recall, slower (default 16)
+    ANN_CANDIDATES         dense candidates passed on to score fusion (default 200)
+    ANN_MEMORY_BUDGET_MB   vector storage budget (default 0 = unlimited)
+"""
+import os
+import abc
+import math
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ANN_BACKEND = os.getenv("ANN_BACKEND", "auto").lower()
+ANN_IVF_THRESHOLD = int(os.getenv("ANN_IVF_THRESHOLD", "50000"))
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+ANN_CANDIDATES = int(os.getenv("ANN_CANDIDATES", "200"))
+ANN_MEMORY_BUDGET_MB = float(os.getenv("ANN_MEMORY_BUDGET_MB", "0"))
+
+DEFAULT_COLLECTION = "default"
+STORAGE_TYPES = ("float32", "float16", "int8")
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLES_PER_CLUSTER = 64
+BATCH_ROWS = 16384
+
+# Trained IVF clustering: centroids per collection, and each row's cluster within its collection (-1 = flat shard)
+IVFLayout = Tuple[Dict[str, np.ndarray], np.ndarray]
+
+
+def collection_of(source: str) -> str:
+    """Collection a knowledge file belongs to: its top-level directory, or DEFAULT_COLLECTION."""
+    return source.split("/", 1)[0] if "/" in source else DEFAULT_COLLECTION
+
+
+def bytes_per_vector(dim: int, storage: str) -> int:
+    """Storage cost of one vector, including its int32 id (and int8 scale)."""
+    return {"float32": 4 * dim, "float16": 2 * dim, "int8": dim + 4}[storage] + 4
+
+
+def storage_for_budget(count: int, dim: int, budget_mb: float = ANN_MEMORY_BUDGET_MB) -> str:
+    """Most precise storage type whose vectors fit the budget (int8 if none does)."""
+    if budget_mb <= 0:
+        return "float32"
+    budget = budget_mb * 1024 * 1024
+    for storage in STORAGE_TYPES:
+        if count * bytes_per_vector(dim, storage) <= budget:
+            return storage
+    logger.warning(f"{count} x {dim} vectors do not fit ANN_MEMORY_BUDGET_MB={budget_mb:g} even as int8")
+    return "int8"
+
+
+class _Vectors:
+    """Vector matrix in float32, float16 or int8 (symmetric, one scale per vector)."""
+
+    def __init__(self, vectors: np.ndarray, storage: str = "float32"):
+        self.storage = storage
+        self.scale = None
+        if storage == "int8":
+            peak = np.abs(vectors).max(axis=1)
+            self.scale = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+            self.codes = np.rint(vectors / self.scale[:, None]).astype(np.int8)
+        elif storage == "float32" and vectors.dtype == np.float32:
+            self.codes = vectors  # no copy (may be a view onto the snapshot mapping)
+        else:
+            self.codes = np.ascontiguousarray(vectors, dtype=np.dtype(storage))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def dot(self, query: np.ndarray, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        return self.dot_rows(query, slice(start, stop))
+
+    def dot_rows(self, query: np.ndarray, rows) -> np.ndarray:
+        """Scores of the given rows (a slice, or an array of row numbers gathered on access)."""
+        codes = self.codes[rows]
+        if self.storage == "float32":
+            return codes @ query
+        scores = codes.astype(np.float32) @ query
+        return scores * self.scale[rows] if self.scale is not None else scores
+
+
+def _top_k(ids: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    if k < len(scores):
+        keep = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[keep], scores[keep]
+    order = np.argsort(-scores, kind="stable")
+    return ids[order], scores[order]
+
+
+class VectorIndex(abc.ABC):
+    """Inner-product search over a fixed set of vectors; ids are row numbers."""
+
+    backend = "base"
+    size: int
+
+    @property
+    @abc.abstractmethod
+    def nbytes(self) -> int:
+        """Memory held by the index."""
+
+    @abc.abstractmethod
+    def search(self, query: np.ndarray, k: int,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids and scores of the k best rows (restricted to mask, if given), best first."""
+
+    def dense_scores(self, query: np.ndarray, k: int = ANN_CANDIDATES,
+                     mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Score per row for fusion: the k candidates found, 0 for everything else."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        ids, values = self.search(query, k, mask)
+        scores[ids] = values
+        return scores
+
+    def describe(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "chunks": self.size, "memory_mb": round(self.nbytes / 2 ** 20, 2)}
+
+
+class FlatIndex(VectorIndex):
+    """Exact search: every query is scored against every vector."""
+
+    backend = "flat"
+
+    def __init__(self, vectors: np.ndarray, storage: str = "float32"):
+        self.vectors = _Vectors(vectors, storage)
+        self.size = len(vectors)
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes
+
+    def search(self, query, k, mask=None):
+        scores = np.asarray(self.vectors.dot(query), dtype=np.float32)
+        ids = np.arange(self.size, dtype=np.int64)
+        if mask is not None:
+            ids, scores = ids[mask], scores[mask]
+        return _top_k(ids, scores, min(k, len(ids)))
+
+    def dense_scores(self, query, k=ANN_CANDIDATES, mask=None):
+        # Exact scores for every row are as cheap as the candidates themselves
+        return np.asarray(self.vectors.dot(query), dtype=np.float32)
+
+    def describe(self):
+        return dict(super().describe(), storage=self.vectors.storage)
+
+
+def _kmeans(vectors: np.ndarray, nlist: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Spherical k-means (cosine) on a sample of the vectors; returns unit-norm centroids."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * KMEANS_SAMPLES_PER_CLUSTER)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _assign(sample, centroids)
+        counts = np.bincount(assignment, minlength=nlist)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(sample[np.argsort(assignment, kind="stable")], starts[~empty])
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]  # re-seed empty clusters
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), BATCH_ROWS):
+        batch = np.asarray(vectors[start:start + BATCH_ROWS], dtype=np.float32)
+        assignment[start:start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+    return assignment
+
+
+def _ivf_nlist(size: int, nlist: int) -> int:
+    return max(1, min(nlist or int(math.sqrt(size)), size))
+
+
+def _uses_ivf(size: int, backend: str) -> bool:
+    return backend == "ivf" or (backend == "auto" and size >= ANN_IVF_THRESHOLD)
+
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted-file index: row ids grouped by nearest k-means centroid; a query
+    scans the nprobe closest clusters. Float32 vectors are not copied: probed
+    rows are gathered from the given matrix (e.g. the shared snapshot mapping).
+
+    Pass centroids and assignment (from train_ivf) to skip clustering.
+    """
+
+    backend = "ivf"
+
+    def __init__(self, vectors: np.ndarray, nlist: int = ANN_NLIST, nprobe: int = ANN_NPROBE,
+                 storage: str = "float32", seed: int = 0, centroids: Optional[np.ndarray] = None,
+                 assignment: Optional[np.ndarray] = None):
+        self.size = len(vectors)
+        self.nprobe = nprobe
+        if centroids is None:
+            self.nlist = _ivf_nlist(self.size, nlist)
+            self.centroids = _kmeans(vectors, self.nlist, seed=seed)
+        else:
+            self.nlist = len(centroids)
+            self.centroids = centroids
+        if assignment is None:
+            assignment = _assign(vectors, self.centroids)
+        order = np.argsort(assignment, kind="stable")
+        self.ids = order.astype(np.int32)
+        self.offsets = np.searchsorted(assignment[order], np.arange(self.nlist + 1)).astype(np.int64)
+        self.vectors = _Vectors(vectors, storage)
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes + self.ids.nbytes + self.centroids.nbytes + self.offsets.nbytes
+
+    def search(self, query, k, mask=None, nprobe: Optional[int] = None):
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_scores = self.centroids @ query
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe] if nprobe < self.nlist else range(self.nlist)
+        ids, scores = [], []
+        for cluster in probes:
+            start, stop = self.offsets[cluster], self.offsets[cluster + 1]
+            if start == stop:
+                continue
+            ids.append(self.ids[start:stop])
+            scores.append(self.vectors.dot_rows(query, self.ids[start:stop]))
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids, scores = np.concatenate(ids), np.asarray(np.concatenate(scores), dtype=np.float32)
+        if mask is not None:
+            keep = mask[ids]
+            ids, scores = ids[keep], scores[keep]
+        return _top_k(ids.astype(np.int64), scores, min(k, len(ids)))
+
+    def describe(self):
+        return dict(super().describe(), storage=self.vectors.storage, nlist=self.nlist, nprobe=self.nprobe)
+
+
+class ShardedIndex(VectorIndex):
+    """One sub-index per collection; results are merged across the shards a query can match."""
+
+    backend = "sharded"
+
+    def __init__(self, shards: List[Tuple[str, np.ndarray, VectorIndex]], size: int):
+        self.shards = shards
+        self.size = size
+
+    @property
+    def nbytes(self) -> int:
+        return sum(index.nbytes + ids.nbytes for _, ids, index in self.shards)
+
+    def search(self, query, k, mask=None):
+        ids, scores = [], []
+        for _, shard_ids, index in self.shards:
+            shard_mask = mask[shard_ids] if mask is not None else None
+            if shard_mask is not None and not shard_mask.any():
+                continue
+            local_ids, local_scores = index.search(query, k, shard_mask)
+            ids.append(shard_ids[local_ids])
+            scores.append(local_scores)
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return _top_k(np.concatenate(ids).astype(np.int64), np.concatenate(scores), k)
+
+    def dense_scores(self, query, k=ANN_CANDIDATES, mask=None):
+        # Each shard fills in its own scores (exact for flat shards, k candidates for IVF shards)
+        scores = np.zeros(self.size, dtype=np.float32)
+        for _, shard_ids, index in self.shards:
+            shard_mask = mask[shard_ids] if mask is not None else None
+            if shard_mask is None or shard_mask.any():
+                scores[shard_ids] = index.dense_scores(query, k, shard_mask)
+        return scores
+
+    def describe(self):
+        return dict(super().describe(), shards={name: index.describe() for name, _, index in self.shards})
+
+
+def _shard_rows(sources: Optional[np.ndarray]) -> Dict[str, List[int]]:
+    collections: Dict[str, List[int]] = {}
+    for i, source in enumerate(sources if sources is not None else ()):
+        collections.setdefault(collection_of(source), []).append(i)
+    return collections
+
+
+def _build_shard(vectors: np.ndarray, backend: str, storage: str, nlist: int, nprobe: int,
+                 centroids: Optional[np.ndarray] = None, assignment: Optional[np.ndarray] = None) -> VectorIndex:
+    if not _uses_ivf(len(vectors), backend):
+        return FlatIndex(vectors, storage)
+    trained = (
+        centroids is not None and assignment is not None and len(assignment) == len(vectors)
+        and len(centroids) == _ivf_nlist(len(vectors), nlist) and centroids.shape[1] == vectors.shape[1]
+        and (assignment >= 0).all()
+    )
+    if centroids is not None and not trained:
+        logger.info("Stored IVF clustering does not match the current settings, re-clustering")
+    if not trained:
+        centroids = assignment = None
+    return IVFIndex(vectors, nlist=nlist, nprobe=nprobe, storage=storage, centroids=centroids, assignment=assignment)
+
+
+def train_ivf(vectors: np.ndarray, sources: Optional[np.ndarray] = None, backend: str = ANN_BACKEND,
+              nlist: int = ANN_NLIST, seed: int = 0) -> Optional[IVFLayout]:
+    """
+    Cluster every shard that build_vector_index would serve with IVF.
+
+    Args:
+        vectors: Normalised embeddings, one row per chunk
+        sources: Source file name per chunk (shards are per collection)
+        backend: "auto", "flat" or "ivf"
+        nlist: IVF clusters per shard (0 = sqrt of the shard size)
+        seed: k-means seed
+
+    Returns:
+        IVFLayout: Centroids per collection and the cluster of every row, or
+        None if no shard is large enough for IVF
+    """
+    collections = _shard_rows(sources)
+    shards = sorted(collections.items()) if len(collections) > 1 else [
+        (next(iter(collections), DEFAULT_COLLECTION), None)]
+    centroids: Dict[str, np.ndarray] = {}
+    assignment = np.full(len(vectors), -1, dtype=np.int32)
+    for name, rows in shards:
+        shard = vectors if rows is None else vectors[np.array(rows, dtype=np.int64)]
+        if not len(shard) or not _uses_ivf(len(shard), backend):
+            continue
+        centroids[name] = _kmeans(shard, _ivf_nlist(len(shard), nlist), seed=seed)
+        shard_assignment = _assign(shard, centroids[name])
+        if rows is None:
+            assignment[:] = shard_assignment
+        else:
+            assignment[rows] = shard_assignment
+    return (centroids, assignment) if centroids else None
+
+
+def build_vector_index(vectors: np.ndarray, sources: Optional[np.ndarray] = None, backend: str = ANN_BACKEND,
+                       memory_budget_mb: float = ANN_MEMORY_BUDGET_MB, nlist: int = ANN_NLIST,
+                       nprobe: int = ANN_NPROBE, ivf: Optional[IVFLayout] = None) -> VectorIndex:
+    """
+    Build the dense search index for an embedding matrix.
+
+    Args:
+        vectors: Normalised embeddings, one row per chunk
+        sources: Source file name per chunk (used to shard by collection)
+        backend: "auto", "flat" or "ivf"
+        memory_budget_mb: Budget for stored vectors (0 = unlimited)
+        nlist: IVF clusters per shard (0 = sqrt of the shard size)
+        nprobe: IVF clusters scanned per query
+        ivf: Clustering from train_ivf (e.g. stored in the knowledge snapshot);
+            shards it does not cover, or covers with a different nlist, are clustered here
+
+    Returns:
+        VectorIndex: A single index, or a ShardedIndex when there are several collections
+    """
+    if backend not in ("auto", "flat", "ivf"):
+        logger.warning(f"Unknown ANN_BACKEND '{backend}', using auto")
+        backend = "auto"
+    storage = storage_for_budget(len(vectors), vectors.shape[1], memory_budget_mb)
+    trained, assignment = ivf if ivf is not None and len(ivf[1]) == len(vectors) else ({}, None)
+    collections = _shard_rows(sources)
+    if len(collections) <= 1:
+        name = next(iter(collections), DEFAULT_COLLECTION)
+        index = _build_shard(vectors, backend, storage, nlist, nprobe, trained.get(name), assignment)
+    else:
+        shards = []
+        for name, rows in sorted(collections.items()):
+            ids = np.array(rows, dtype=np.int64)
+            # The index orders chunks by collection, so a shard is normally a view, not a copy
+            contiguous = ids[-1] - ids[0] + 1 == len(ids)
+            shard_vectors = vectors[ids[0]:ids[-1] + 1] if contiguous else vectors[ids]
+            shard_assignment = assignment[ids] if assignment is not None else None
+            shards.append((name, ids, _build_shard(shard_vectors, backend, storage, nlist, nprobe,
+                                                   trained.get(name), shard_assignment)))
+        index = ShardedIndex(shards, len(vectors))
+    logger.info(f"Dense index: {index.backend}, {len(vectors)} chunks in {max(1, len(collections))} collection(s), "
+                f"{storage} storage, {index.nbytes / 2 ** 20:.1f} MB")
+    return index
@@ -1,19 +1,19 @@
 import logging
 from pathlib import Path
-from crewai.knowledge.source.crew_docling_source import CrewDoclingSource
 
 # Configure logger for this module
 logger = logging.getLogger(__name__)
 
 def get_knowledge_files(base_directory="knowledge"):
     """
-    Get list of files from the knowledge directory.
+    Get list of files from the knowledge directory, including subdirectories.
     
     Args:
         base_directory: Base name or relative path to the knowledge directory
         
     Returns:
-        tuple: (list of file names, absolute path to knowledge directory)
+        tuple: (list of file paths relative to the knowledge directory, e.g.
+        "frameworks.md" or "team/notes.md", absolute path to knowledge directory)
     """
     # Try multiple potential locations for the knowledge directory
     project_root = Path(__file__).parent.parent.parent.absolute()
@@ -33,11 +33,12 @@ def get_knowledge_files(base_directory="knowledge"):
     for path in possible_paths:
         if path.is_dir():
             logger.info(f"Found knowledge directory: {path}")
-            # Get just the file names, not full paths
-            dir_files = [
-                f.name for f in path.iterdir() 
+            # Paths relative to the knowledge directory; a subdirectory is a collection (see ann_index)
+            dir_files = sorted(
+                f.relative_to(path).as_posix() for f in path.rglob("*")
                 if f.is_file() and f.suffix.lower() in valid_exts
-            ]
+                and not any(part.startswith(".") for part in f.relative_to(path).parts)
+            )
             
             if dir_files:
                 logger.info(f"Found {len(dir_files)} knowledge files in {path}")
@@ -58,6 +59,9 @@ def get_docling_tool():
         CrewDoclingSource or None: Knowledge source if files were found
     """
     try:
+        # Deferred: importing crewai's docling source pulls in crewai and docling
+        from crewai.knowledge.source.crew_docling_source import CrewDoclingSource
+
         # Get knowledge files and directory path
         files, knowledge_dir = get_knowledge_files("knowledge")
         
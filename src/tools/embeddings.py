@@ -0,0 +1,204 @@
+"""
+Embedding service for knowledge chunks and queries.
+
+The sentence-transformers encoder is loaded once per process, preferably with
+the ONNX Runtime backend (optionally int8-quantized), with intra-op threads
+pinned so concurrent crews do not oversubscribe the CPU. Chunks are encoded in
+batches; concurrent single-query calls are micro-batched into one encode, and
+query vectors are kept in an LRU cache.
+"""
+import os
+import logging
+import platform
+import threading
+from concurrent.futures import Future
+from functools import lru_cache
+from queue import Empty, Queue
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Sentence-transformers model used for knowledge chunks and queries
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# "onnx" (ONNX Runtime) or "torch"; onnx falls back to torch if it cannot be loaded
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "onnx").lower()
+# "int8" selects the dynamically quantized ONNX export shipped with the model
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "none").lower()
+# Explicit ONNX file inside the model repo (overrides EMBEDDING_QUANTIZE)
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE")
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", str(min(4, os.cpu_count() or 1))))
+QUERY_CACHE_SIZE = int(os.getenv("EMBEDDING_QUERY_CACHE_SIZE", "1024"))
+QUERY_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_QUERY_BATCH_WAIT_MS", "2"))
+
+_model = None
+_model_id: Optional[str] = None
+_model_lock = threading.Lock()
+_model_unavailable = False
+
+
+def model_id(backend: str = EMBEDDING_BACKEND) -> str:
+    """Identifies the vectors an encoder loaded with this backend produces; changing any part re-embeds the corpus."""
+    if backend == "torch":
+        return EMBEDDING_MODEL
+    return f"{EMBEDDING_MODEL}@onnx" + (f":{EMBEDDING_ONNX_FILE}" if EMBEDDING_ONNX_FILE
+                                        else ":int8" if EMBEDDING_QUANTIZE == "int8" else "")
+
+
+def _int8_onnx_file() -> str:
+    """Quantized export matching this CPU (file names as published in sentence-transformers model repos)."""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+    return "onnx/model_quint8_avx2.onnx"
+
+
+def load_encoder(backend: str = EMBEDDING_BACKEND, quantize: str = EMBEDDING_QUANTIZE,
+                 threads: int = EMBEDDING_THREADS, onnx_file: Optional[str] = EMBEDDING_ONNX_FILE):
+    """
+    Load a SentenceTransformer with the given backend and thread count.
+
+    Raises:
+        ImportError/OSError/ValueError: If the backend or model cannot be loaded
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        session_options.inter_op_num_threads = 1
+        model_kwargs = {"provider": "CPUExecutionProvider", "session_options": session_options}
+        file_name = onnx_file or (_int8_onnx_file() if quantize == "int8" else None)
+        if file_name:
+            model_kwargs["file_name"] = file_name
+        return SentenceTransformer(EMBEDDING_MODEL, backend="onnx", model_kwargs=model_kwargs)
+
+    import torch
+    torch.set_num_threads(threads)
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+
+def get_embedding_model():
+    """
+    Load the configured encoder once (lazily, thread-safe).
+
+    Returns:
+        SentenceTransformer or None: None if sentence-transformers is not installed
+        or the model cannot be loaded; callers fall back to lexical retrieval.
+    """
+    global _model, _model_id, _model_unavailable
+    if _model is not None or _model_unavailable:
+        return _model
+    with _model_lock:
+        if _model is None and not _model_unavailable:
+            backends = [EMBEDDING_BACKEND] + (["torch"] if EMBEDDING_BACKEND == "onnx" else [])
+            for backend in backends:
+                try:
+                    _model = load_encoder(backend)
+                    _model_id = model_id(backend)
+                    logger.info(f"Loaded embedding model: {EMBEDDING_MODEL} ({backend}, {EMBEDDING_THREADS} threads)")
+                    break
+                except Exception as e:
+                    logger.warning(f"Could not load embedding model with the {backend} backend: {e}")
+            if _model is None:
+                _model_unavailable = True
+                logger.warning("Embedding model unavailable. Knowledge retrieval will be lexical only.")
+    return _model
+
+
+def get_embedding_model_id() -> Optional[str]:
+    """
+    Identifier of the encoder that actually loaded (after an ONNX to torch
+    fallback, the torch one), loading it if needed.
+
+    Returns:
+        str or None: None if no embedding model is available.
+    """
+    get_embedding_model()
+    return _model_id
+
+
+def embed_texts(texts: List[str]):
+    """
+    Embed texts into L2-normalised float32 vectors, EMBEDDING_BATCH_SIZE at a time.
+
+    Returns:
+        numpy.ndarray or None: Matrix of shape (len(texts), dim), or None if no
+        embedding model is available.
+    """
+    model = get_embedding_model()
+    if model is None:
+        return None
+    import numpy as np
+    vectors = model.encode(
+        texts,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+    )
+    return np.asarray(vectors, dtype=np.float32)
+
+
+class _QueryBatcher:
+    """Collects queries arriving within QUERY_BATCH_WAIT_MS and encodes them in one call."""
+
+    def __init__(self, wait_ms: float = QUERY_BATCH_WAIT_MS, max_batch: int = EMBEDDING_BATCH_SIZE):
+        self.wait = wait_ms / 1000
+        self.max_batch = max_batch
+        self._queue: "Queue[Tuple[str, Future]]" = Queue()
+        self._thread = threading.Thread(target=self._run, name="query-embedder", daemon=True)
+        self._thread.start()
+
+    def submit(self, query: str) -> Future:
+        future: Future = Future()
+        self._queue.put((query, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get(timeout=self.wait))
+            except Empty:
+                pass
+            try:
+                vectors = embed_texts([query for query, _ in batch])
+                for i, (_, future) in enumerate(batch):
+                    future.set_result(None if vectors is None else vectors[i])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+
+_batcher: Optional[_QueryBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def _get_batcher() -> _QueryBatcher:
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = _QueryBatcher()
+    return _batcher
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _cached_query_vector(query: str):
+    vector = _get_batcher().submit(query).result()
+    if vector is not None:
+        vector.setflags(write=False)  # shared between callers via the cache
+    return vector
+
+
+def embed_query(query: str):
+    """Embed a single query string (LRU-cached, micro-batched). Returns a 1-D vector or None."""
+    if get_embedding_model() is None:
+        return None
+    return _cached_query_vector(" ".join(query.split()))
+
+
+def query_cache_info():
+    """functools cache statistics (hits, misses, maxsize, currsize) for query embeddings."""
+    return _cached_query_vector.cache_info()
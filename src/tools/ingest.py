@@ -0,0 +1,157 @@
+"""
+Knowledge file ingestion.
+
+Markdown and text files are parsed natively with header-aware chunking; docling
+is imported lazily and used only for PDFs (its Markdown export is then chunked
+the same way). Every chunk carries its source file name and heading path so
+the researcher can cite exactly where a passage came from.
+"""
+import os
+import re
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = int(os.getenv("KNOWLEDGE_CHUNK_SIZE", "1200"))  # characters
+CHUNK_OVERLAP = int(os.getenv("KNOWLEDGE_CHUNK_OVERLAP", "150"))  # characters
+HEADING_SEPARATOR = " > "
+NATIVE_EXTENSIONS = (".md", ".txt")
+
+ATX_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+# A line that is nothing but bold text, e.g. "**Core Application Architecture**"
+BOLD_HEADING = re.compile(r"^\*\*([^*]+?)\*\*:?\s*$")
+FENCE = re.compile(r"^\s*(```|~~~)")
+
+
+def split_sections(text: str) -> List[Tuple[List[str], str]]:
+    """
+    Split Markdown into (heading path, body) sections.
+
+    ATX headings (#, ##, ...) define the hierarchy; standalone bold lines act as
+    one level below the deepest ATX heading and end at the next ATX heading.
+    Headings inside code fences are ignored.
+    """
+    sections: List[Tuple[List[str], str]] = []
+    path: List[Tuple[float, str]] = []
+    body: List[str] = []
+    in_fence = False
+
+    def flush():
+        content = "\n".join(body).strip()
+        if content:
+            sections.append(([title for _, title in path], content))
+        body.clear()
+
+    for line in text.splitlines():
+        if FENCE.match(line):
+            in_fence = not in_fence
+            body.append(line)
+            continue
+        heading = None
+        if not in_fence:
+            match = ATX_HEADING.match(line)
+            if match:
+                heading = (len(match.group(1)), match.group(2).strip())
+            else:
+                match = BOLD_HEADING.match(line.strip())
+                if match:
+                    atx_depth = max((level for level, _ in path if level == int(level)), default=0)
+                    heading = (atx_depth + 0.5, match.group(1).strip())
+        if heading is None:
+            body.append(line)
+            continue
+        flush()
+        level, title = heading
+        # An ATX heading also closes any bold pseudo-heading above it
+        while path and (path[-1][0] >= level or (level == int(level) and path[-1][0] != int(path[-1][0]))):
+            path.pop()
+        path.append((level, title))
+    flush()
+    return sections
+
+
+def _joined_length(paragraphs: List[str]) -> int:
+    return sum(map(len, paragraphs)) + 2 * max(len(paragraphs) - 1, 0)
+
+
+def pack_paragraphs(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Pack consecutive paragraphs into chunks of at most chunk_size characters.
+
+    Neighbouring chunks share up to `overlap` characters, so a passage cut at a
+    chunk boundary is still whole in one of them: a chunk starts with the last
+    paragraph of the previous one when that paragraph is no longer than
+    `overlap`, and a paragraph longer than chunk_size is split into windows
+    that overlap by `overlap` characters.
+    """
+    overlap = max(0, min(overlap, chunk_size // 2))
+    chunks: List[str] = []
+    current: List[str] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) > chunk_size:
+            # Oversized paragraphs are split hard so no chunk grows unbounded
+            if current:
+                chunks.append("\n\n".join(current))
+            step = chunk_size - overlap
+            windows = [paragraph[start:start + chunk_size]
+                       for start in range(0, len(paragraph) - overlap, step)]
+            chunks.extend(windows[:-1])
+            current = [windows[-1]]
+            continue
+        if current and _joined_length(current + [paragraph]) > chunk_size:
+            chunks.append("\n\n".join(current))
+            tail = current[-1]
+            fits = len(tail) <= overlap and _joined_length([tail, paragraph]) <= chunk_size
+            current = [tail] if fits else []
+        current.append(paragraph)
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def chunk_markdown(text: str, source: str, chunk_size: int = CHUNK_SIZE,
+                   overlap: int = CHUNK_OVERLAP) -> List[Dict[str, Any]]:
+    """Header-aware chunks: no chunk spans two sections, and each keeps its heading path."""
+    chunks = []
+    for headings, body in split_sections(text):
+        heading = HEADING_SEPARATOR.join(headings)
+        for part in pack_paragraphs(body, chunk_size, overlap):
+            chunks.append({"source": source, "heading": heading, "text": part})
+    return chunks
+
+
+_converter = None
+
+
+def convert_with_docling(path: Path) -> str:
+    """Convert a document (PDF) to Markdown with docling, loading it on first use."""
+    global _converter
+    if _converter is None:
+        from docling.document_converter import DocumentConverter
+        _converter = DocumentConverter()
+    return _converter.convert(str(path)).document.export_to_markdown()
+
+
+def ingest_file(path: Path, chunk_size: int = CHUNK_SIZE, source: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Read and chunk one knowledge file.
+
+    Args:
+        path: File to read
+        chunk_size: Maximum chunk length in characters
+        source: Name recorded on each chunk (default: the file name); the index
+            passes the path relative to the knowledge directory
+
+    Returns:
+        list: {"source", "heading", "text"} chunk dicts
+    """
+    if path.suffix.lower() in NATIVE_EXTENSIONS:
+        text = path.read_text(encoding="utf-8", errors="replace")
+    else:
+        text = convert_with_docling(path)
+    return chunk_markdown(text, source or path.name, chunk_size)
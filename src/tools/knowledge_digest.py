@@ -0,0 +1,200 @@
+"""
+Offline knowledge digests.
+
+Compact summary cards, one per framework and one per target model, built
+extractively from the knowledge files when the index is built. Each card
+lists the exact chunks it was drawn from (pointers like
+"Deepseek_cheatsheet.md#3"), so the researcher can read the card first and
+expand only the passages it needs instead of pulling whole files into context.
+
+Cards are stored in .knowledge_index/digests.json together with the content
+hashes of the files they were built from; a card is rebuilt only when one of
+those files changes (or a new file starts mentioning its subject).
+
+Usage:
+    python -m src.tools.knowledge_digest build
+    python -m src.tools.knowledge_digest show [RISEN|DeepSeek|...]
+"""
+import os
+import re
+import json
+import logging
+import argparse
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .knowledge_index import INDEX_DIR, KnowledgeIndex, get_knowledge_index, temp_path
+from .research_report import FRAMEWORKS, MODELS, excerpt
+
+logger = logging.getLogger(__name__)
+
+DIGESTS_FILE = "digests.json"
+CARD_SENTENCES = int(os.getenv("DIGEST_CARD_SENTENCES", "4"))
+SENTENCE_CHARS = 200
+MAX_POINTERS = 6
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def _sentences(text: str) -> List[str]:
+    return [s for s in (excerpt(part, SENTENCE_CHARS) for part in SENTENCE_SPLIT.split(text)) if len(s) > 20]
+
+
+def _card(card_id: str, kind: str, title: str, keywords: List[str], lead: str,
+          matches: List[Dict[str, Any]], files: Dict[str, Dict[str, Any]], sentence_filter=None) -> Dict[str, Any]:
+    sentences: List[str] = []
+    for match in matches:
+        for sentence in _sentences(match["chunk"]["text"]):
+            if sentence_filter and not sentence_filter(sentence):
+                continue
+            if sentence not in sentences:
+                sentences.append(sentence)
+            if len(sentences) >= CARD_SENTENCES:
+                break
+        if len(sentences) >= CARD_SENTENCES:
+            break
+    sources = sorted({match["chunk"]["source"] for match in matches})
+    return {
+        "id": card_id,
+        "kind": kind,
+        "title": title,
+        "keywords": keywords,
+        "summary": " ".join(filter(None, [lead] + [f"- {s}" for s in sentences])),
+        "pointers": [
+            {"id": match["pointer"], "citation": f"{match['chunk']['source']} > {match['chunk'].get('heading', '')}".rstrip(" >")}
+            for match in matches[:MAX_POINTERS]
+        ],
+        "source_hashes": {name: files[name]["sha256"] for name in sources},
+    }
+
+
+def build_cards(index: KnowledgeIndex, previous: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Build framework and model cards, reusing cards from `previous` whose
+    source files (and their hashes) are unchanged.
+    """
+    previous_cards = {card["id"]: card for card in (previous or {}).get("cards", [])}
+    pointers = index.pointers
+    chunks = [{"chunk": index.chunks[i], "pointer": pointers[i]} for i in range(len(pointers))]
+    cards = []
+
+    def reuse_or_build(card_id: str, matches: List[Dict[str, Any]], build):
+        hashes = {name: index.files[name]["sha256"] for name in {m["chunk"]["source"] for m in matches}}
+        old = previous_cards.get(card_id)
+        if old is not None and old.get("source_hashes") == hashes:
+            cards.append(old)
+        else:
+            cards.append(build())
+
+    for name, spec in FRAMEWORKS.items():
+        pattern = re.compile(rf"\b{re.escape(name)}\b")
+        matches = [c for c in chunks if pattern.search(c["chunk"]["text"])]
+        lead = f"{name} ({spec['elements']}): best for {spec['use']}."
+        reuse_or_build(f"framework:{name}", matches, lambda: _card(
+            f"framework:{name}", "framework", name, [name.lower()], lead, matches, index.files,
+            sentence_filter=lambda s, p=pattern: bool(p.search(s))))
+
+    for name, (cues, source_filter) in MODELS.items():
+        matches = [c for c in chunks if source_filter in c["chunk"]["source"].lower()]
+        headings = []
+        for match in matches:
+            section = match["chunk"].get("heading", "").split(" > ")[-1]
+            if section and section not in headings:
+                headings.append(section)
+        lead = f"{name} guidance. Sections: {', '.join(headings[:8])}." if headings else f"{name} guidance."
+        reuse_or_build(f"model:{name}", matches, lambda: _card(
+            f"model:{name}", "model", name, cues, lead, matches, index.files))
+    return [card for card in cards if card["pointers"]]
+
+
+def load_digests(index_dir: Path = INDEX_DIR) -> Optional[Dict[str, Any]]:
+    path = index_dir / DIGESTS_FILE
+    if not path.exists():
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Could not read knowledge digests {path}: {e}")
+        return None
+
+
+def update_digests(index: KnowledgeIndex, index_dir: Path = INDEX_DIR) -> Dict[str, Any]:
+    """Bring digests.json in line with the index; a no-op when the index version is unchanged."""
+    previous = load_digests(index_dir)
+    if previous and previous.get("index_version") == index.version:
+        return previous
+    digests = {"index_version": index.version, "cards": build_cards(index, previous)}
+    index_dir.mkdir(parents=True, exist_ok=True)
+    tmp = temp_path(index_dir / DIGESTS_FILE)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(digests, f, indent=1)
+    os.replace(tmp, index_dir / DIGESTS_FILE)
+    reused = sum(1 for card in digests["cards"] if previous and card in previous.get("cards", []))
+    logger.info(f"Knowledge digests updated: {len(digests['cards'])} cards ({reused} unchanged)")
+    return digests
+
+
+_digests: Optional[Dict[str, Any]] = None
+_digests_lock = threading.Lock()
+
+
+def get_digest_cards() -> List[Dict[str, Any]]:
+    """Cards for the current knowledge index (reloaded when the index version changes)."""
+    global _digests
+    index = get_knowledge_index()
+    digests = _digests
+    if digests is None or digests.get("index_version") != index.version:
+        with _digests_lock:
+            digests = load_digests()
+            if digests is None or digests.get("index_version") != index.version:
+                digests = {"index_version": index.version, "cards": build_cards(index, digests)}
+            _digests = digests
+    return digests["cards"]
+
+
+def match_cards(query: str, sources: Optional[List[str]] = None, limit: int = 2) -> List[Dict[str, Any]]:
+    """Cards whose subject is named in the query (or whose model file matches a source filter)."""
+    text = query.lower()
+    filters = [s.lower() for s in sources or []]
+    matched = []
+    for card in get_digest_cards():
+        named = any(re.search(rf"\b{re.escape(keyword)}\b", text) for keyword in card["keywords"])
+        filtered = card["kind"] == "model" and any(f in name.lower() for f in filters for name in card["source_hashes"])
+        if named or filtered:
+            matched.append(card)
+    return matched[:limit]
+
+
+def resolve_pointer(pointer: str, index=None) -> Optional[Dict[str, Any]]:
+    """Chunk for a pointer like "Deepseek_cheatsheet.md#3", or None if it does not exist."""
+    index = index or get_knowledge_index()
+    row = index.pointer_row(pointer.strip())
+    return index.chunks[row] if row is not None else None
+
+
+def format_card(card: Dict[str, Any]) -> str:
+    pointers = "\n".join(f"  - {p['id']}: {p['citation']}" for p in card["pointers"])
+    return f"[Digest: {card['title']}]\n{card['summary']}\nFull passages:\n{pointers}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or show knowledge digest cards.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="Update digests.json for the current index.")
+    show = sub.add_parser("show", help="Print digest cards.")
+    show.add_argument("title", nargs="?", help="Only the card with this title (e.g. RISEN, DeepSeek).")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    if args.command == "build":
+        digests = update_digests(get_knowledge_index())
+        print(f"{len(digests['cards'])} digest cards for index {digests['index_version']}")
+        return
+    for card in get_digest_cards():
+        if not args.title or card["title"].lower() == args.title.lower():
+            print(format_card(card) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+"""
+Persistent knowledge index.
+
+Chunks, embeddings and metadata for the files in `knowledge/` are stored on
+disk, keyed by each file's sha256. Builds are incremental: unchanged files are
+reused as-is, and only added or changed files are ingested (see ingest.py)
+and embedded again. Loading a prebuilt index takes milliseconds.
+
+Several processes (API workers, each with a knowledge watcher) may build at
+once: builds are serialised with a lock file in the index directory, and
+every file is written under a unique temp name and renamed into place.
+
+Usage:
+    python -m src.tools.knowledge_index build            # incremental build
+    python -m src.tools.knowledge_index build --force    # rebuild everything
+    python -m src.tools.knowledge_index status
+"""
+import os
+import json
+import time
+import hashlib
+import uuid
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .docling_tool import get_knowledge_files
+from .ingest import ingest_file
+from . import embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not serialised across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent.absolute()
+INDEX_DIR = Path(os.getenv("KNOWLEDGE_INDEX_DIR", str(PROJECT_ROOT / ".knowledge_index")))
+INDEX_FORMAT_VERSION = 2
+# Rebuild changed files when the index is loaded (set false to load only)
+AUTO_BUILD = os.getenv("KNOWLEDGE_AUTO_BUILD", "true").lower() == "true"
+# Serve queries from the memory-mapped snapshot (shared across worker processes)
+USE_SNAPSHOT = os.getenv("KNOWLEDGE_SNAPSHOT", "true").lower() == "true"
+
+METADATA_FILE = "index.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+BUILD_LOCK_FILE = ".build.lock"
+
+
+def temp_path(path: Path) -> Path:
+    """Unique temp file next to path, for writing it atomically (write, then os.replace)."""
+    return path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+
+
+@contextmanager
+def build_lock(index_dir: Path = INDEX_DIR):
+    """Exclusive lock on the index directory, held across processes for the length of a build."""
+    index_dir.mkdir(parents=True, exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    with open(index_dir / BUILD_LOCK_FILE, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def file_sha256(path: Path) -> str:
+    """Content hash of a knowledge file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ChunkPointers:
+    """
+    Stable "<file>#<position within file>" pointer per chunk (see
+    knowledge_digest), built once per index together with the reverse lookup.
+    """
+
+    _pointers: Optional[List[str]] = None
+    _pointer_rows: Optional[Dict[str, int]] = None
+
+    def chunk_sources(self) -> Iterable[str]:
+        return (chunk["source"] for chunk in self.chunks)
+
+    @property
+    def pointers(self) -> List[str]:
+        if self._pointers is None:
+            positions: Dict[str, int] = {}
+            pointers = []
+            for name in self.chunk_sources():
+                position = positions.get(name, 0)
+                positions[name] = position + 1
+                pointers.append(f"{name}#{position}")
+            self._pointers = pointers
+        return self._pointers
+
+    def pointer_row(self, pointer: str) -> Optional[int]:
+        """Row of the chunk a pointer names, or None if there is no such chunk."""
+        if self._pointer_rows is None:
+            self._pointer_rows = {name: row for row, name in enumerate(self.pointers)}
+        return self._pointer_rows.get(pointer)
+
+
+class KnowledgeIndex(ChunkPointers):
+    """
+    In-memory view of the on-disk knowledge index.
+
+    Attributes:
+        files: file name -> {"sha256", "size", "chunks"} for every indexed file,
+            plus "error" for a file that failed to ingest (it has no chunks and
+            is only retried once its content changes)
+        chunks: list of {"source", "heading", "text"} dicts, grouped by file
+        embeddings: float32 matrix aligned with chunks, or None (lexical only)
+        embedding_model: name of the model that produced the embeddings
+    """
+
+    def __init__(self, files=None, chunks=None, embeddings=None, embedding_model=None, built_at=None):
+        self.files: Dict[str, Dict[str, Any]] = files or {}
+        self.chunks: List[Dict[str, Any]] = chunks or []
+        self.embeddings = embeddings
+        self.embedding_model: Optional[str] = embedding_model
+        self.built_at: Optional[float] = built_at
+        self._rows_by_source: Optional[Dict[str, List[int]]] = None
+
+    @property
+    def version(self) -> str:
+        """Short hash of the indexed content; changes whenever any file does."""
+        digest = hashlib.sha256()
+        for name in sorted(self.files):
+            digest.update(f"{name}:{self.files[name]['sha256']}\n".encode("utf-8"))
+        digest.update(str(self.embedding_model).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def chunks_for(self, name: str) -> Tuple[List[Dict[str, Any]], Optional[Any]]:
+        """Chunks (and their embedding rows, if any) belonging to one file."""
+        if self._rows_by_source is None:  # grouped once, not rescanned per file
+            self._rows_by_source = {}
+            for i, chunk in enumerate(self.chunks):
+                self._rows_by_source.setdefault(chunk["source"], []).append(i)
+        indices = self._rows_by_source.get(name, [])
+        rows = self.embeddings[indices] if self.embeddings is not None and indices else None
+        return [self.chunks[i] for i in indices], rows
+
+    def save(self, index_dir: Path = INDEX_DIR):
+        """Write the index atomically (temp files + rename)."""
+        index_dir.mkdir(parents=True, exist_ok=True)
+        metadata = {
+            "format": INDEX_FORMAT_VERSION,
+            "version": self.version,
+            "built_at": self.built_at,
+            "embedding_model": self.embedding_model,
+            "files": self.files,
+            "chunks": self.chunks,
+        }
+        embeddings_path = index_dir / EMBEDDINGS_FILE
+        if self.embeddings is not None:
+            import numpy as np
+            tmp = temp_path(embeddings_path)
+            with open(tmp, "wb") as f:
+                np.save(f, self.embeddings)
+            os.replace(tmp, embeddings_path)
+        elif embeddings_path.exists():
+            embeddings_path.unlink()
+        tmp = temp_path(index_dir / METADATA_FILE)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+        os.replace(tmp, index_dir / METADATA_FILE)
+
+    @classmethod
+    def load(cls, index_dir: Path = INDEX_DIR) -> Optional["KnowledgeIndex"]:
+        """Load a saved index, or return None if there is none (or it is unreadable)."""
+        metadata_path = index_dir / METADATA_FILE
+        if not metadata_path.exists():
+            return None
+        try:
+            with open(metadata_path, encoding="utf-8") as f:
+                metadata = json.load(f)
+            if metadata.get("format") != INDEX_FORMAT_VERSION:
+                logger.info("Knowledge index format changed; it will be rebuilt")
+                return None
+            vectors = None
+            embeddings_path = index_dir / EMBEDDINGS_FILE
+            if metadata.get("embedding_model") and embeddings_path.exists():
+                import numpy as np
+                vectors = np.load(embeddings_path)
+                if len(vectors) != len(metadata["chunks"]):
+                    logger.warning("Knowledge index embeddings are out of sync; ignoring them")
+                    vectors = None
+            return cls(
+                files=metadata["files"],
+                chunks=metadata["chunks"],
+                embeddings=vectors,
+                embedding_model=metadata.get("embedding_model") if vectors is not None else None,
+                built_at=metadata.get("built_at"),
+            )
+        except Exception as e:
+            logger.warning(f"Could not load knowledge index from {index_dir}: {e}")
+            return None
+
+
+def build_index(force: bool = False, index_dir: Path = INDEX_DIR) -> Tuple[KnowledgeIndex, Dict[str, List[str]]]:
+    """
+    Bring the on-disk index up to date with the knowledge directory.
+
+    Args:
+        force: Ignore the existing index and rebuild every file
+        index_dir: Directory the index is stored in
+
+    Returns:
+        tuple: (index, {"added", "changed", "removed", "unchanged"} file name lists)
+    """
+    # Under the lock, a worker that waited for another's build loads its result and finds nothing to do
+    with build_lock(index_dir):
+        return _build_index(force, index_dir)
+
+
+def _build_index(force: bool, index_dir: Path) -> Tuple[KnowledgeIndex, Dict[str, List[str]]]:
+    previous = None if force else KnowledgeIndex.load(index_dir)
+    files, knowledge_dir = get_knowledge_files("knowledge")
+    changes: Dict[str, List[str]] = {"added": [], "changed": [], "removed": [], "unchanged": []}
+
+    old_files = previous.files if previous else {}
+    changes["removed"] = sorted(set(old_files) - set(files))
+
+    new_files: Dict[str, Dict[str, Any]] = {}
+    new_chunks: List[Dict[str, Any]] = []
+    rows: List[Any] = []  # one embedding row (or None) per chunk
+    from .ann_index import collection_of
+    # Chunks of one collection (subdirectory) are kept together so dense index shards are views, not copies
+    for name in sorted(files, key=lambda name: (collection_of(name), name)):
+        path = Path(knowledge_dir) / name
+        sha = file_sha256(path)
+        error = None
+        if name in old_files and old_files[name]["sha256"] == sha:
+            chunks, vectors = previous.chunks_for(name)
+            error = old_files[name].get("error")  # a failed file is not retried until it changes
+            changes["unchanged"].append(name)
+            rows.extend(list(vectors) if vectors is not None else [None] * len(chunks))
+        else:
+            changes["changed" if name in old_files else "added"].append(name)
+            try:
+                chunks = ingest_file(path, source=name)
+            except Exception as e:
+                logger.error(f"Failed to index knowledge file {name}: {e}")
+                chunks, error = [], str(e)
+            rows.extend([None] * len(chunks))
+        # Failed files are recorded too, so the index (and snapshot) still match the directory
+        new_files[name] = {"sha256": sha, "size": path.stat().st_size, "chunks": len(chunks)}
+        if error:
+            new_files[name]["error"] = error
+        new_chunks.extend(chunks)
+
+    modified = force or previous is None or any(changes[k] for k in ("added", "changed", "removed"))
+
+    # Embed only chunks without a vector; if the model changed, re-embed everything
+    current_model = embeddings.get_embedding_model_id()
+    if previous and previous.embedding_model and current_model and previous.embedding_model != current_model:
+        rows = [None] * len(new_chunks)
+    matrix = None
+    embedding_model = None
+    missing = [i for i, row in enumerate(rows) if row is None]
+    if new_chunks and (missing or previous is None or previous.embeddings is None):
+        vectors = embeddings.embed_texts([new_chunks[i]["text"] for i in missing]) if missing else None
+        if vectors is not None:
+            for i, vector in zip(missing, vectors):
+                rows[i] = vector
+            modified = True
+    if new_chunks and all(row is not None for row in rows):
+        import numpy as np
+        matrix = np.vstack(rows).astype(np.float32)
+        # Without a model now, every vector came from the previous index
+        embedding_model = current_model or previous.embedding_model
+
+    index = KnowledgeIndex(new_files, new_chunks, matrix, embedding_model,
+                           built_at=time.time() if modified else previous.built_at)
+    if modified:
+        index.save(index_dir)
+        logger.info(
+            f"Knowledge index {index.version} saved: {len(new_files)} files, {len(new_chunks)} chunks "
+            f"({len(changes['added'])} added, {len(changes['changed'])} changed, {len(changes['removed'])} removed)"
+        )
+    if USE_SNAPSHOT:
+        from .knowledge_snapshot import snapshot_path, write_snapshot
+        if modified or not snapshot_path(index_dir).exists():
+            write_snapshot(index, snapshot_path(index_dir))
+    try:
+        from .knowledge_digest import DIGESTS_FILE, update_digests
+        if modified or not (index_dir / DIGESTS_FILE).exists():
+            update_digests(index, index_dir)
+    except Exception as e:
+        logger.error(f"Failed to update knowledge digests: {e}")
+    return index, changes
+
+
+def _snapshot_is_current(snapshot, knowledge_dir: Optional[str], files: List[str]) -> bool:
+    """True if the snapshot covers exactly the current knowledge files (by content hash)."""
+    if knowledge_dir is None or set(snapshot.files) != set(files):
+        return False
+    return all(snapshot.files[name]["sha256"] == file_sha256(Path(knowledge_dir) / name) for name in files)
+
+
+_index: Optional[KnowledgeIndex] = None
+_index_lock = threading.Lock()
+
+
+def _load_index(index_dir: Path = INDEX_DIR):
+    if not USE_SNAPSHOT:
+        if AUTO_BUILD:
+            return build_index(index_dir=index_dir)[0]
+        return KnowledgeIndex.load(index_dir) or KnowledgeIndex()
+
+    from .knowledge_snapshot import open_snapshot
+    snapshot = open_snapshot(index_dir)
+    if snapshot is not None and not AUTO_BUILD:
+        return snapshot
+    if snapshot is not None:
+        files, knowledge_dir = get_knowledge_files("knowledge")
+        if _snapshot_is_current(snapshot, knowledge_dir, files):
+            return snapshot
+    index, _ = build_index(index_dir=index_dir)
+    return open_snapshot(index_dir) or index
+
+
+def get_knowledge_index() -> KnowledgeIndex:
+    """
+    Process-wide knowledge index, loaded once.
+
+    With KNOWLEDGE_AUTO_BUILD (default) stale files are re-indexed first;
+    otherwise the prebuilt index is loaded as-is (empty if none exists).
+    With KNOWLEDGE_SNAPSHOT (default) the returned index is the memory-mapped
+    KnowledgeSnapshot; when it is current, index.json is never parsed.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                started = time.perf_counter()
+                _index = _load_index()
+                logger.info(f"Knowledge index ready: {len(_index.chunks)} chunks "
+                            f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return _index
+
+
+_reload_lock = threading.Lock()
+_reload_status: Dict[str, Any] = {
+    "reloads": 0,
+    "in_progress": False,
+    "last_reload": None,
+    "last_duration_ms": None,
+    "last_changes": None,
+    "last_error": None,
+}
+
+
+def reload_knowledge_index(force: bool = False) -> Dict[str, Any]:
+    """
+    Re-index added/changed/removed files and swap the new index in.
+
+    The swap is a single reference assignment: queries already running keep
+    the index they started with, and the next get_knowledge_index() call (and
+    so the next search tool call in any crew) sees the new one. Concurrent
+    reload requests are serialised.
+
+    Returns:
+        dict: Reload status (see get_reload_status)
+    """
+    global _index
+    with _reload_lock:
+        _reload_status["in_progress"] = True
+        started = time.perf_counter()
+        try:
+            index, changes = build_index(force=force)
+            if USE_SNAPSHOT:
+                from .knowledge_snapshot import open_snapshot
+                index = open_snapshot() or index
+            with _index_lock:
+                _index = index
+            _reload_status.update(
+                reloads=_reload_status["reloads"] + 1,
+                last_changes={key: value for key, value in changes.items() if key != "unchanged"},
+                last_error=None,
+            )
+            logger.info(f"Knowledge index reloaded: version {index.version}, {len(index.chunks)} chunks")
+        except Exception as e:
+            _reload_status["last_error"] = str(e)
+            logger.error(f"Knowledge index reload failed: {e}", exc_info=True)
+        finally:
+            _reload_status.update(
+                in_progress=False,
+                last_reload=time.time(),
+                last_duration_ms=round((time.perf_counter() - started) * 1000, 1),
+            )
+    return get_reload_status()
+
+
+def get_reload_status() -> Dict[str, Any]:
+    """Current index version plus the outcome of the most recent reload."""
+    status = dict(_reload_status)
+    index = _index
+    status["loaded"] = index is not None
+    if index is not None:
+        status.update(
+            version=index.version,
+            files=len(index.files),
+            failed_files=sorted(name for name, info in index.files.items() if info.get("error")),
+            chunks=len(index.chunks),
+            snapshot=str(index.path) if getattr(index, "path", None) else None,
+        )
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect the PromptWeaver knowledge index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Index new and changed knowledge files.")
+    build.add_argument("--force", action="store_true", help="Rebuild every file from scratch.")
+    sub.add_parser("status", help="Show what is indexed and what is stale.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    if args.command == "build":
+        started = time.perf_counter()
+        index, changes = build_index(force=args.force)
+        print(f"Index {index.version}: {len(index.files)} files, {len(index.chunks)} chunks, "
+              f"embeddings: {index.embedding_model or 'none (lexical only)'}")
+        for key in ("added", "changed", "removed"):
+            for name in changes[key]:
+                print(f"  {key:<8} {name}")
+        for name, info in sorted(index.files.items()):
+            if info.get("error"):
+                print(f"  failed   {name}: {info['error']}")
+        print(f"Done in {time.perf_counter() - started:.2f}s")
+        return
+
+    index = KnowledgeIndex.load()
+    if index is None:
+        print(f"No knowledge index at {INDEX_DIR}. Run: python -m src.tools.knowledge_index build")
+        return
+    files, knowledge_dir = get_knowledge_files("knowledge")
+    stale = [name for name in files
+             if name not in index.files or index.files[name]["sha256"] != file_sha256(Path(knowledge_dir) / name)]
+    removed = sorted(set(index.files) - set(files))
+    built = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(index.built_at)) if index.built_at else "unknown"
+    print(f"Index {index.version} at {INDEX_DIR} (built {built})")
+    print(f"  {len(index.files)} files, {len(index.chunks)} chunks, "
+          f"embeddings: {index.embedding_model or 'none (lexical only)'}")
+    print(f"  stale: {len(stale)} file(s), removed: {len(removed)} file(s)")
+    for name in stale:
+        print(f"    stale   {name}")
+    for name in removed:
+        print(f"    removed {name}")
+    for name, info in sorted(index.files.items()):
+        if info.get("error"):
+            print(f"    failed  {name}: {info['error']} (retried when the file changes, or with --force)")
+
+
+if __name__ == "__main__":
+    main()
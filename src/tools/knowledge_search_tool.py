@@ -0,0 +1,86 @@
+import os
+import logging
+from typing import Optional, Type
+
+from pydantic import BaseModel, Field
+from crewai.tools import BaseTool
+
+from .retrieval import get_retriever
+from .knowledge_digest import format_card, match_cards, resolve_pointer
+from .research_report import excerpt
+
+logger = logging.getLogger(__name__)
+
+# Answer with digest cards + passage pointers when a card matches, instead of full passages
+DIGEST_FIRST = os.getenv("KNOWLEDGE_DIGEST_FIRST", "true").lower() == "true"
+POINTER_EXCERPT_CHARS = 160
+
+
+class KnowledgeSearchInput(BaseModel):
+    query: str = Field(..., description="What to look up, e.g. 'RISEN framework' or 'few-shot examples'.")
+    source: Optional[str] = Field(
+        None,
+        description="Only search files whose name contains this text, e.g. 'deepseek' or 'grok' "
+                    "for a model-specific cheatsheet. Leave empty to search everything.",
+    )
+    expand: Optional[str] = Field(
+        None,
+        description="Comma-separated passage pointers from a digest (e.g. 'Deepseek_cheatsheet.md#3') "
+                    "to return in full instead of searching.",
+    )
+
+
+class KnowledgeSearchTool(BaseTool):
+    """CrewAI tool over the in-process hybrid (BM25 + dense) knowledge retriever."""
+
+    name: str = "search_knowledge_base"
+    description: str = (
+        "Search the prompt-engineering knowledge base (frameworks, model cheatsheets, best practices). "
+        "Returns compact digest cards when the query names a framework or model, with pointers to the "
+        "full passages (pass them as 'expand' to read them), otherwise the most relevant passages. "
+        "Every result carries its source file and section for citation."
+    )
+    args_schema: Type[BaseModel] = KnowledgeSearchInput
+    top_k: int = 5
+
+    def _run(self, query: str, source: Optional[str] = None, expand: Optional[str] = None) -> str:
+        try:
+            if expand:
+                return self._expand(expand)
+            sources = [source] if source else None
+            results = get_retriever().search(query, top_k=self.top_k, sources=sources)
+            cards = match_cards(query, sources) if DIGEST_FIRST else []
+        except Exception as e:
+            logger.error(f"Knowledge search failed: {e}")
+            return f"Knowledge search failed: {e}"
+        if cards:
+            return self._digest_answer(cards, results)
+        if not results:
+            return "No relevant passages found in the knowledge base."
+        return "\n\n".join(
+            f"[{rank}] Source: {chunk['source']}"
+            + (f" > {chunk['heading']}" if chunk.get("heading") else "")
+            + f" (score {chunk['score']:.2f})\n{chunk['text']}"
+            for rank, chunk in enumerate(results, 1)
+        )
+
+    @staticmethod
+    def _digest_answer(cards, results) -> str:
+        lines = [format_card(card) for card in cards]
+        if results:
+            lines.append("Other relevant passages:\n" + "\n".join(
+                f"  - {chunk['pointer']}: {excerpt(chunk['text'], POINTER_EXCERPT_CHARS)}" for chunk in results
+            ))
+        return "\n\n".join(lines)
+
+    @staticmethod
+    def _expand(expand: str) -> str:
+        passages = []
+        for pointer in filter(None, (p.strip() for p in expand.split(","))):
+            chunk = resolve_pointer(pointer)
+            if chunk is None:
+                passages.append(f"[{pointer}] not found")
+            else:
+                heading = f" > {chunk['heading']}" if chunk.get("heading") else ""
+                passages.append(f"[{pointer}] Source: {chunk['source']}{heading}\n{chunk['text']}")
+        return "\n\n".join(passages) or "No passage pointers given."
@@ -0,0 +1,257 @@
+"""
+Memory-mapped knowledge snapshot.
+
+The knowledge index (embeddings, chunk text, chunk metadata and BM25 postings)
+is serialised into a single file that every process opens with mmap. Arrays
+are NumPy views straight onto the mapping, so pages are shared through the OS
+page cache and a new worker is ready as soon as the file is opened.
+
+Layout (little-endian, sections 64-byte aligned):
+    header      magic "PWKSNAP1", u64 directory offset, u64 directory length
+    sections    embeddings      float32 [chunks, dim]      (optional)
+                text_offsets    uint64  [chunks + 1]  + text blob (UTF-8)
+                heading_offsets uint64  [chunks + 1]  + heading blob
+                source_ids      uint32  [chunks]  (uint16 in older snapshots)
+                term_offsets    uint64  [terms + 1]   + term blob (sorted)
+                posting_offsets uint64  [terms + 1]
+                posting_ids     int32   [postings]
+                posting_weights float32 [postings]
+                ivf_centroids   float32 [clusters, dim]    (optional, corpora large enough for IVF)
+                ivf_assignments int32   [chunks]  cluster within the chunk's collection, -1 if flat
+    directory   JSON: section offsets/dtypes/shapes, file table, source names,
+                embedding model, index version, IVF centroid rows per collection
+"""
+import os
+import json
+import mmap
+import struct
+import logging
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .ann_index import IVFLayout, train_ivf
+from .knowledge_index import INDEX_DIR, ChunkPointers, KnowledgeIndex, temp_path
+from .retrieval import BM25, document_tokens
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = "knowledge.snap"
+MAGIC = b"PWKSNAP1"
+HEADER = struct.Struct("<8sQQ")
+ALIGNMENT = 64
+
+
+def snapshot_path(index_dir: Path = INDEX_DIR) -> Path:
+    return index_dir / SNAPSHOT_FILE
+
+
+def _string_table(values: List[str]):
+    """Encode strings as (uint64 offsets, concatenated UTF-8 blob)."""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded], dtype=np.uint64)
+    return offsets, b"".join(encoded)
+
+
+def write_snapshot(index: KnowledgeIndex, path: Path) -> Path:
+    """Serialise an index (and its BM25 postings) into a snapshot file, atomically."""
+    sources = sorted(index.files)
+    source_ids = {name: i for i, name in enumerate(sources)}
+    bm25 = BM25([document_tokens(chunk) for chunk in index.chunks])
+    terms = sorted(bm25.postings)
+
+    sections: Dict[str, Any] = {}
+    if index.embeddings is not None:
+        sections["embeddings"] = np.ascontiguousarray(index.embeddings, dtype=np.float32)
+    sections["text_offsets"], sections["text"] = _string_table([c["text"] for c in index.chunks])
+    sections["heading_offsets"], sections["headings"] = _string_table([c.get("heading", "") for c in index.chunks])
+    sections["source_ids"] = np.array([source_ids[c["source"]] for c in index.chunks], dtype=np.uint32)
+    sections["term_offsets"], sections["terms"] = _string_table(terms)
+    counts = [len(bm25.postings[term][0]) for term in terms]
+    sections["posting_offsets"] = np.zeros(len(terms) + 1, dtype=np.uint64)
+    sections["posting_offsets"][1:] = np.cumsum(counts, dtype=np.uint64)
+    empty_ids, empty_weights = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    sections["posting_ids"] = np.concatenate([bm25.postings[t][0] for t in terms] or [empty_ids])
+    sections["posting_weights"] = np.concatenate([bm25.postings[t][1] for t in terms] or [empty_weights])
+    # Cluster once here instead of in every process that opens the snapshot
+    ivf = None
+    if index.embeddings is not None and len(index.chunks):
+        ivf = train_ivf(sections["embeddings"], np.array([c["source"] for c in index.chunks], dtype=object))
+    ivf_rows: Dict[str, List[int]] = {}
+    if ivf is not None:
+        centroids, assignment = ivf
+        start = 0
+        for name in sorted(centroids):
+            ivf_rows[name] = [start, start + len(centroids[name])]
+            start += len(centroids[name])
+        sections["ivf_centroids"] = np.vstack([centroids[name] for name in sorted(centroids)]).astype(np.float32)
+        sections["ivf_assignments"] = assignment.astype(np.int32)
+
+    directory: Dict[str, Any] = {
+        "version": index.version,
+        "built_at": index.built_at,
+        "embedding_model": index.embedding_model,
+        "files": index.files,
+        "sources": sources,
+        "chunks": len(index.chunks),
+        "ivf": ivf_rows,
+        "sections": {},
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = temp_path(path)
+    with open(tmp, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        for name, value in sections.items():
+            f.write(b"\0" * (-f.tell() % ALIGNMENT))
+            offset = f.tell()
+            if isinstance(value, bytes):
+                f.write(value)
+                directory["sections"][name] = {"offset": offset, "nbytes": len(value)}
+            else:
+                f.write(value.tobytes())
+                directory["sections"][name] = {"offset": offset, "dtype": value.dtype.str, "shape": list(value.shape)}
+        raw = json.dumps(directory).encode("utf-8")
+        directory_offset = f.tell()
+        f.write(raw)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, directory_offset, len(raw)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+class _StringTable:
+    """Read-only sequence of strings decoded on access from a mapped blob."""
+
+    def __init__(self, buffer, offsets: np.ndarray, base: int):
+        self._buffer = buffer
+        self._offsets = offsets
+        self._base = base
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        start = self._base + int(self._offsets[i])
+        end = self._base + int(self._offsets[i + 1])
+        return self._buffer[start:end].decode("utf-8")
+
+
+class _SnapshotChunks:
+    """Chunk dicts ({"source", "heading", "text"}) materialised lazily from the mapping."""
+
+    def __init__(self, snapshot: "KnowledgeSnapshot"):
+        self._snapshot = snapshot
+
+    def __len__(self) -> int:
+        return len(self._snapshot.texts)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        if i < 0:
+            i += len(self)
+        return {
+            "source": snapshot.source_names[int(snapshot.source_ids[i])],
+            "heading": snapshot.headings[i],
+            "text": snapshot.texts[i],
+        }
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class _SnapshotBM25:
+    """BM25 scorer over postings stored in the snapshot (same interface as retrieval.BM25)."""
+
+    def __init__(self, snapshot: "KnowledgeSnapshot"):
+        self.size = len(snapshot.texts)
+        self._terms = snapshot.terms
+        self._offsets = snapshot.posting_offsets
+        self._ids = snapshot.posting_ids
+        self._weights = snapshot.posting_weights
+
+    def _lookup(self, term: str) -> Optional[int]:
+        position = bisect_left(range(len(self._terms)), term, key=self._terms.__getitem__)
+        if position < len(self._terms) and self._terms[position] == term:
+            return position
+        return None
+
+    def scores(self, terms: Iterable[str]) -> np.ndarray:
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(terms):
+            position = self._lookup(term)
+            if position is not None:
+                start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+                scores[self._ids[start:end]] += self._weights[start:end]
+        return scores
+
+
+class KnowledgeSnapshot(ChunkPointers):
+    """
+    Read-only, memory-mapped knowledge index.
+
+    Exposes the attributes the retriever uses (version, files, chunks,
+    embeddings, embedding_model, sources, bm25, ivf, pointers) without copying
+    any arrays.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, directory_offset, directory_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{self.path} is not a knowledge snapshot")
+        directory = json.loads(self._mmap[directory_offset:directory_offset + directory_length])
+        sections = directory["sections"]
+
+        self.version: str = directory["version"]
+        self.built_at: Optional[float] = directory.get("built_at")
+        self.embedding_model: Optional[str] = directory.get("embedding_model")
+        self.files: Dict[str, Dict[str, Any]] = directory["files"]
+        self.source_names: List[str] = directory["sources"]
+
+        self.embeddings = self._array(sections["embeddings"]) if "embeddings" in sections else None
+        self.texts = _StringTable(self._mmap, self._array(sections["text_offsets"]), sections["text"]["offset"])
+        self.headings = _StringTable(self._mmap, self._array(sections["heading_offsets"]), sections["headings"]["offset"])
+        self.source_ids = self._array(sections["source_ids"])
+        self.terms = _StringTable(self._mmap, self._array(sections["term_offsets"]), sections["terms"]["offset"])
+        self.posting_offsets = self._array(sections["posting_offsets"])
+        self.posting_ids = self._array(sections["posting_ids"])
+        self.posting_weights = self._array(sections["posting_weights"])
+
+        self.chunks = _SnapshotChunks(self)
+        self.sources = np.array(self.source_names, dtype=object)[self.source_ids] if len(self.source_ids) else np.array([], dtype=object)
+        self.bm25 = _SnapshotBM25(self)
+        self.ivf: Optional[IVFLayout] = None
+        if "ivf_centroids" in sections:
+            centroids = self._array(sections["ivf_centroids"])
+            self.ivf = (
+                {name: centroids[start:stop] for name, (start, stop) in directory.get("ivf", {}).items()},
+                self._array(sections["ivf_assignments"]),
+            )
+
+    def chunk_sources(self) -> Iterable[str]:
+        return self.sources  # no chunk dicts are materialised
+
+    def _array(self, spec: Dict[str, Any]) -> np.ndarray:
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"])) if spec["shape"] else 0
+        return np.frombuffer(self._mmap, dtype=dtype, count=count, offset=spec["offset"]).reshape(spec["shape"])
+
+
+def open_snapshot(index_dir: Path = INDEX_DIR) -> Optional[KnowledgeSnapshot]:
+    """Open the snapshot in index_dir, or return None if it is missing or unreadable."""
+    path = snapshot_path(index_dir)
+    if not path.exists():
+        return None
+    try:
+        return KnowledgeSnapshot(path)
+    except Exception as e:
+        logger.warning(f"Could not open knowledge snapshot {path}: {e}")
+        return None
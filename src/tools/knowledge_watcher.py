@@ -0,0 +1,195 @@
+"""
+Knowledge directory watcher.
+
+Watches `knowledge/` (and its subdirectories) for added, edited, renamed or
+deleted files and triggers
+an incremental re-index (reload_knowledge_index) in the background. Uses Linux
+inotify through ctypes when available and falls back to polling file mtimes
+and sizes elsewhere. Bursts of events (editors writing temp files, copying a
+batch of files) are debounced into a single reload.
+"""
+import os
+import time
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from .docling_tool import get_knowledge_files
+from .knowledge_index import reload_knowledge_index
+
+logger = logging.getLogger(__name__)
+
+WATCH_ENABLED = os.getenv("KNOWLEDGE_WATCH", "true").lower() == "true"
+DEBOUNCE_SECONDS = float(os.getenv("KNOWLEDGE_WATCH_DEBOUNCE", "1.0"))
+POLL_INTERVAL = float(os.getenv("KNOWLEDGE_WATCH_POLL_INTERVAL", "2.0"))
+VALID_EXTENSIONS = (".pdf", ".md", ".txt")
+
+# inotify constants (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _is_knowledge_file(name: str) -> bool:
+    return name.lower().endswith(VALID_EXTENSIONS) and not name.startswith(".")
+
+
+class KnowledgeWatcher(threading.Thread):
+    """Daemon thread that calls on_change once per debounced burst of knowledge file changes."""
+
+    def __init__(self, directory: str, on_change: Callable[[], object],
+                 debounce: float = DEBOUNCE_SECONDS, poll_interval: float = POLL_INTERVAL):
+        super().__init__(name="knowledge-watcher", daemon=True)
+        self.directory = directory
+        self.on_change = on_change
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.backend: Optional[str] = None
+        self._stop_event = threading.Event()
+        # Time of the latest event of the current burst (None when nothing is pending)
+        self._last_event: Optional[float] = None
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        try:
+            self._run_inotify()
+        except OSError as e:
+            logger.info(f"inotify unavailable ({e}); polling {self.directory} every {self.poll_interval}s")
+            self._run_polling()
+
+    def _mark_changed(self):
+        self._last_event = time.monotonic()
+
+    def _maybe_fire(self):
+        # Fire once the burst has been quiet for `debounce` seconds
+        if self._last_event is not None and time.monotonic() - self._last_event >= self.debounce:
+            self._last_event = None
+            try:
+                self.on_change()
+            except Exception as e:
+                logger.error(f"Knowledge reload after file change failed: {e}")
+
+    def _run_inotify(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not supported on this platform")
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        try:
+            # inotify is not recursive: one watch per directory, added as directories appear
+            self._watches: Dict[int, str] = {}
+            self._libc, self._fd = libc, fd
+            for directory, subdirectories, _ in os.walk(self.directory):
+                subdirectories[:] = [d for d in subdirectories if not d.startswith(".")]
+                self._add_watch(directory)
+            self.backend = "inotify"
+            logger.info(f"Watching {self.directory} for knowledge changes (inotify)")
+            while not self._stop_event.is_set():
+                timeout = self.debounce / 2 if self._last_event is not None else 0.5
+                readable, _, _ = select.select([fd], [], [], timeout)
+                if readable:
+                    self._read_events(fd)
+                self._maybe_fire()
+        finally:
+            os.close(fd)
+
+    def _add_watch(self, directory: str):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self._watches[wd] = directory
+
+    def _read_events(self, fd: int):
+        try:
+            data = os.read(fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            raw_name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length]
+            offset += EVENT_HEADER.size + length
+            name = os.fsdecode(raw_name.rstrip(b"\0"))
+            if mask & IN_ISDIR:
+                if name.startswith("."):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO) and wd in self._watches:
+                    # A new collection: watch it (files copied in before this are picked up by the reload)
+                    try:
+                        self._add_watch(os.path.join(self._watches[wd], name))
+                    except OSError as e:
+                        logger.warning(f"Cannot watch new knowledge directory {name}: {e}")
+                self._mark_changed()
+            elif _is_knowledge_file(name):
+                self._mark_changed()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        state = {}
+        for directory, subdirectories, names in os.walk(self.directory):
+            subdirectories[:] = [d for d in subdirectories if not d.startswith(".")]
+            for name in names:
+                if _is_knowledge_file(name):
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    state[os.path.relpath(path, self.directory)] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def _run_polling(self):
+        self.backend = "polling"
+        previous = self._scan()
+        while not self._stop_event.wait(min(self.poll_interval, self.debounce)):
+            current = self._scan()
+            if current != previous:
+                previous = current
+                self._mark_changed()
+            self._maybe_fire()
+
+
+_watcher: Optional[KnowledgeWatcher] = None
+_watcher_lock = threading.Lock()
+
+
+def start_knowledge_watcher() -> Optional[KnowledgeWatcher]:
+    """Start the process-wide watcher (idempotent). Returns None if disabled or no knowledge dir exists."""
+    global _watcher
+    if not WATCH_ENABLED:
+        return None
+    with _watcher_lock:
+        if _watcher is None:
+            _, knowledge_dir = get_knowledge_files("knowledge")
+            if not knowledge_dir or not Path(knowledge_dir).is_dir():
+                logger.warning("No knowledge directory to watch; hot reload disabled")
+                return None
+            _watcher = KnowledgeWatcher(knowledge_dir, reload_knowledge_index)
+            _watcher.start()
+    return _watcher
+
+
+def get_watcher_status() -> Dict[str, object]:
+    watcher = _watcher
+    return {
+        "enabled": WATCH_ENABLED,
+        "running": bool(watcher and watcher.is_alive()),
+        "backend": watcher.backend if watcher else None,
+        "directory": watcher.directory if watcher else None,
+    }
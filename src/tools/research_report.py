@@ -0,0 +1,167 @@
+"""
+Deterministic research stage.
+
+Builds the knowledge research report (recommended frameworks, key techniques,
+model-specific notes, best practices, sources cited) from local retrieval and
+a framework lookup table instead of an LLM call. The report has the same
+sections the knowledge researcher is asked to produce, and every citation is
+the exact file and section a passage came from.
+"""
+import re
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from .retrieval import HybridRetriever, get_retriever
+
+logger = logging.getLogger(__name__)
+
+# Framework lookup table (elements and use cases as summarised in the knowledge base)
+FRAMEWORKS: Dict[str, Dict[str, Any]] = {
+    "PECRA": {
+        "elements": "Purpose, Expectation, Context, Request, Action",
+        "use": "goal-oriented tasks where the purpose and expected result must be explicit",
+        "cues": ["goal", "objective", "purpose", "expect", "deliverable", "business", "plan", "strategy"],
+    },
+    "RISEN": {
+        "elements": "Role, Instructions, Steps, End Goal, Narrowing",
+        "use": "complex multi-step tasks, constrained or creative processes",
+        "cues": ["step", "process", "workflow", "procedure", "guide", "tutorial", "pipeline", "constraint", "complex"],
+    },
+    "SCQA": {
+        "elements": "Situation, Complication, Question, Answer",
+        "use": "persuasive communication, problem-solving and narratives",
+        "cues": ["persuade", "persuasive", "argument", "problem", "pitch", "proposal", "story", "narrative", "decision"],
+    },
+    "GRADE": {
+        "elements": "Goal, Request, Action, Details, Examples",
+        "use": "detailed outcomes and content creation that benefit from examples",
+        "cues": ["content", "article", "blog", "write", "post", "copy", "example", "detailed", "technical"],
+    },
+    "RTF": {
+        "elements": "Role, Task, Format",
+        "use": "simple communication and data retrieval with a fixed output shape",
+        "cues": ["simple", "quick", "format", "table", "list", "json", "extract", "summar", "convert"],
+    },
+}
+DEFAULT_FRAMEWORK = "PECRA"
+
+# (technique, cue keywords, retrieval query)
+TECHNIQUES: List[Tuple[str, List[str], str]] = [
+    ("Chain-of-thought", ["reason", "analy", "math", "logic", "step", "calculate", "debug", "complex"],
+     "chain of thought step by step reasoning"),
+    ("Few-shot examples", ["classif", "label", "categor", "extract", "example", "pattern", "consistent"],
+     "few-shot examples in prompts"),
+    ("Structured output format", ["json", "table", "format", "schema", "list", "csv", "markdown", "report"],
+     "specify the desired output format"),
+    ("Role / persona prompting", ["expert", "persona", "role", "act as", "audience", "tone", "voice"],
+     "assign a role or persona"),
+    ("Context and delimiters", ["document", "context", "text", "article", "source", "data", "input"],
+     "delimiters context separate instructions from input"),
+]
+DEFAULT_TECHNIQUES = ["Role / persona prompting", "Structured output format"]
+
+# model name -> (cue keywords, source-file filter)
+MODELS: Dict[str, Tuple[List[str], str]] = {
+    "DeepSeek": (["deepseek"], "deepseek"),
+    "Grok": (["grok"], "grok"),
+    "Gemini": (["gemini"], "gemini"),
+    "OpenAI GPT": (["gpt", "openai", "chatgpt", "o1", "o3"], "openai"),
+}
+
+EXCERPT_CHARS = 280
+
+
+def excerpt(text: str, limit: int = EXCERPT_CHARS) -> str:
+    """First sentences of a chunk, Markdown noise removed, cut at a word boundary."""
+    text = re.sub(r"[#*`|>]+", " ", text)
+    text = re.sub(r"\s+", " ", text).strip().lstrip("-• ")
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + "..."
+
+
+def _citation(chunk: Dict[str, Any]) -> str:
+    return f"{chunk['source']} > {chunk['heading']}" if chunk.get("heading") else chunk["source"]
+
+
+def _cue_hits(text: str, cues: List[str]) -> List[str]:
+    return [cue for cue in cues if cue in text]
+
+
+def select_frameworks(text: str, limit: int = 2) -> List[Tuple[str, List[str]]]:
+    """Frameworks ranked by cue matches in the instruction/analysis (DEFAULT_FRAMEWORK if none match)."""
+    scored = [(name, _cue_hits(text, spec["cues"])) for name, spec in FRAMEWORKS.items()]
+    scored = [item for item in scored if item[1]]
+    scored.sort(key=lambda item: len(item[1]), reverse=True)
+    return scored[:limit] or [(DEFAULT_FRAMEWORK, [])]
+
+
+def build_research_report(instruction: str, analysis: str = "",
+                          retriever: Optional[HybridRetriever] = None) -> str:
+    """
+    Assemble the research report for an instruction from local retrieval only.
+
+    Args:
+        instruction: The user's instruction
+        analysis: Output of the requirements analysis stage
+        retriever: Retriever to use (defaults to the process-wide one)
+
+    Returns:
+        str: Markdown report with the knowledge researcher's sections
+    """
+    retriever = retriever or get_retriever()
+    text = f"{instruction}\n{analysis}".lower()
+    cited: List[str] = []
+
+    def cite(chunk: Dict[str, Any]) -> str:
+        citation = _citation(chunk)
+        if citation not in cited:
+            cited.append(citation)
+        return citation
+
+    lines = ["### Recommended Framework(s)"]
+    for name, hits in select_frameworks(text):
+        spec = FRAMEWORKS[name]
+        reason = f"matches {', '.join(hits)}" if hits else "general-purpose default"
+        line = f"- **{name}** ({spec['elements']}): suited to {spec['use']} ({reason})."
+        for chunk in retriever.search(f"{name} framework {spec['elements']}", top_k=3):
+            if name.lower() in chunk["text"].lower():
+                line += f" [{cite(chunk)}]"
+                break
+        lines.append(line)
+
+    lines.append("\n### Key Techniques")
+    techniques = [name for name, cues, _ in TECHNIQUES if _cue_hits(text, cues)][:3]
+    techniques += [name for name in DEFAULT_TECHNIQUES if name not in techniques][:max(0, 2 - len(techniques))]
+    queries = {name: query for name, _, query in TECHNIQUES}
+    for name in techniques:
+        results = retriever.search(queries[name], top_k=1)
+        if results:
+            lines.append(f"- **{name}**: {excerpt(results[0]['text'])} [{cite(results[0])}]")
+        else:
+            lines.append(f"- **{name}**")
+
+    lines.append("\n### Model-Specific Notes")
+    models = [(name, source) for name, (cues, source) in MODELS.items()
+              if any(re.search(rf"\b{re.escape(cue)}\b", text) for cue in cues)]
+    if not models:
+        lines.append("- No specific target model identified; guidance is model-agnostic.")
+    for name, source in models[:2]:
+        results = retriever.search(instruction, top_k=2, sources=[source])
+        if not results:
+            lines.append(f"- **{name}**: no model-specific notes in the knowledge base.")
+        for chunk in results:
+            lines.append(f"- **{name}**: {excerpt(chunk['text'])} [{cite(chunk)}]")
+
+    lines.append("\n### Relevant Constraints/Best Practices")
+    practices = [chunk for chunk in retriever.search(f"{instruction} best practices guidelines avoid", top_k=6)
+                 if _citation(chunk) not in cited][:3]
+    if not practices:
+        lines.append("- Be explicit about the objective, audience, output format and constraints.")
+    for chunk in practices:
+        lines.append(f"- {excerpt(chunk['text'])} [{cite(chunk)}]")
+
+    lines.append("\n### Source Files Cited")
+    lines.append("Consulted: " + (", ".join(sorted({c.split(' > ')[0] for c in cited})) or "none"))
+    lines.extend(f"- {citation}" for citation in cited)
+    return "\n".join(lines)
@@ -0,0 +1,304 @@
+"""
+In-process hybrid retrieval over the knowledge index.
+
+BM25 runs on an inverted index whose postings carry precomputed term weights,
+so a query is a handful of NumPy scatter-adds. Dense scores are one matrix-
+vector product against the index's normalised embeddings. The two are fused
+after max-normalisation; metadata filters are boolean masks applied before
+ranking. Dense scores come from an exact flat scan or, for large corpora, an
+approximate IVF index (see ann_index).
+"""
+import os
+import re
+import math
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from . import embeddings
+from .ann_index import ANN_CANDIDATES, build_vector_index
+from .knowledge_index import KnowledgeIndex, get_knowledge_index
+
+try:
+    from ..utils.tracing import span
+except ImportError:
+    from utils.tracing import span
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "was", "what", "when", "with", "you", "your",
+}
+# Weight of the dense score in the fused score (0 = BM25 only, 1 = dense only)
+DENSE_WEIGHT = float(os.getenv("RETRIEVAL_DENSE_WEIGHT", "0.5"))
+# Cached result lists (0 disables the cache)
+CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "512"))
+# Index versions with cached results: the current one and the one a reload is replacing
+CACHE_VERSIONS = 2
+# Source-filter masks kept per retriever; filters come from callers, so the cache is bounded
+MASK_CACHE_SIZE = 32
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def document_tokens(chunk: Dict[str, Any]) -> List[str]:
+    """Terms a chunk is indexed under (its heading path counts as text)."""
+    return tokenize(f"{chunk.get('heading', '')} {chunk['text']}")
+
+
+class BM25:
+    """Okapi BM25 over a fixed document set, with per-posting weights precomputed."""
+
+    def __init__(self, documents: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.size = len(documents)
+        lengths = np.array([len(doc) for doc in documents], dtype=np.float32)
+        average = float(lengths.mean()) if self.size and lengths.mean() > 0 else 1.0
+        norm = k1 * (1 - b + b * lengths / average)
+
+        postings: Dict[str, Tuple[List[int], List[int]]] = defaultdict(lambda: ([], []))
+        for doc_id, doc in enumerate(documents):
+            for term, tf in Counter(doc).items():
+                postings[term][0].append(doc_id)
+                postings[term][1].append(tf)
+
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, (ids, tfs) in postings.items():
+            ids_array = np.array(ids, dtype=np.int32)
+            tf_array = np.array(tfs, dtype=np.float32)
+            idf = math.log(1 + (self.size - len(ids) + 0.5) / (len(ids) + 0.5))
+            weights = idf * tf_array * (k1 + 1) / (tf_array + norm[ids_array])
+            self.postings[term] = (ids_array, weights.astype(np.float32))
+
+    def scores(self, terms: Iterable[str]) -> np.ndarray:
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(terms):
+            posting = self.postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        return scores
+
+
+class RetrievalCache:
+    """
+    LRU cache of search results keyed on (index version, normalised query,
+    filters, top_k, dense weight).
+
+    Each entry belongs to the index snapshot (version) it was computed from,
+    so retrievers on the old and the new snapshot can use the cache side by
+    side during a reload. Once a third version is registered (or results for
+    it are stored), the oldest version's entries are dropped and that version
+    is retired, so late results from it are not cached again until a new
+    retriever registers it.
+    """
+
+    def __init__(self, maxsize: int = CACHE_SIZE, versions: int = CACHE_VERSIONS):
+        self.maxsize = maxsize
+        self.max_versions = max(1, versions)
+        self._entries: "OrderedDict[Tuple, List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._versions: "OrderedDict[str, None]" = OrderedDict()  # oldest first, by first use
+        self._retired: set = set()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    @staticmethod
+    def key(version: str, query: str, top_k: int, sources: Optional[Iterable[str]], dense_weight: float) -> Tuple:
+        normalised = " ".join(query.lower().split())
+        filters = tuple(sorted(s.lower() for s in sources)) if sources else ()
+        return version, normalised, filters, top_k, dense_weight
+
+    def get(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            results = self._entries.get(key)
+            if results is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return [dict(result) for result in results]
+
+    def put(self, key: Tuple, results: List[Dict[str, Any]]):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            version = key[0]
+            if version in self._retired:
+                return  # computed on a snapshot that has since been replaced twice
+            if version not in self._versions:
+                self._activate(version)
+            self._entries[key] = [dict(result) for result in results]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def register(self, version: str):
+        """Mark a version as the newest one, e.g. when a retriever is built on it."""
+        with self._lock:
+            self._activate(version)
+
+    def _activate(self, version: str):
+        self._retired.discard(version)  # the same content can be loaded again after a revert
+        self._versions[version] = None
+        self._versions.move_to_end(version)
+        while len(self._versions) > self.max_versions:
+            self._retire(self._versions.popitem(last=False)[0])
+
+    def _retire(self, version: str):
+        stale = [key for key in self._entries if key[0] == version]
+        for key in stale:
+            del self._entries[key]
+        self._retired.add(version)
+        self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "index_version": next(reversed(self._versions), None),
+            }
+
+
+retrieval_cache = RetrievalCache()
+
+
+class HybridRetriever:
+    """
+    BM25 + dense retrieval over one index.
+
+    Works on an in-memory KnowledgeIndex (postings are built here) or a
+    memory-mapped KnowledgeSnapshot (postings are read from the mapping).
+    """
+
+    def __init__(self, index: KnowledgeIndex, dense_weight: float = DENSE_WEIGHT,
+                 cache: Optional[RetrievalCache] = None):
+        self.index = index
+        self.cache = cache
+        self.version = index.version
+        if cache is not None:
+            cache.register(self.version)
+        self.chunks = index.chunks
+        self.sources = getattr(index, "sources", None)
+        if self.sources is None:
+            self.sources = np.array([chunk["source"] for chunk in self.chunks], dtype=object)
+        self.bm25 = getattr(index, "bm25", None) or BM25([document_tokens(chunk) for chunk in self.chunks])
+        self.pointers = index.pointers
+        self.dense = index.embeddings
+        self.dense_weight = dense_weight if self.dense is not None else 0.0
+        self.vector_index = (
+            build_vector_index(self.dense, self.sources, ivf=getattr(index, "ivf", None))
+            if self.dense_weight > 0 else None
+        )
+        self._masks: "OrderedDict[Tuple[str, ...], np.ndarray]" = OrderedDict()
+        self._masks_lock = threading.Lock()
+
+    def filter_mask(self, sources: Optional[Iterable[str]]) -> Optional[np.ndarray]:
+        """
+        Boolean mask of chunks whose source file name contains any of the given
+        substrings (case-insensitive), e.g. ["deepseek"] -> Deepseek_cheatsheet.md.
+        """
+        if not sources:
+            return None
+        key = tuple(sorted(s.lower() for s in sources))
+        with self._masks_lock:
+            mask = self._masks.get(key)
+            if mask is not None:
+                self._masks.move_to_end(key)
+                return mask
+        mask = np.array([any(s in name.lower() for s in key) for name in self.sources], dtype=bool)
+        with self._masks_lock:
+            self._masks[key] = mask
+            if len(self._masks) > MASK_CACHE_SIZE:
+                self._masks.popitem(last=False)
+        return mask
+
+    def search(self, query: str, top_k: int = 5,
+               sources: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Rank chunks for a query.
+
+        Args:
+            query: Free-text query
+            top_k: Number of results
+            sources: Optional source-name filters (see filter_mask)
+
+        Returns:
+            list: Chunk dicts extended with "pointer", "score", "bm25" and "dense" fields, best first
+        """
+        attributes = {"retrieval.top_k": top_k, "retrieval.query_chars": len(query),
+                      "retrieval.sources": ",".join(sources) if sources else None}
+        with span("retrieval.search", require_parent=True, **attributes) as current:
+            if self.cache is None:
+                return self._search(query, top_k, sources)
+            key = self.cache.key(self.version, query, top_k, sources, self.dense_weight)
+            results = self.cache.get(key)
+            current.set_attribute("retrieval.cache_hit", results is not None)
+            if results is None:
+                results = self._search(query, top_k, sources)
+                self.cache.put(key, results)
+            return results
+
+    def _search(self, query: str, top_k: int, sources: Optional[Iterable[str]]) -> List[Dict[str, Any]]:
+        if not self.chunks:
+            return []
+        fused = self.bm25.scores(tokenize(query))
+        bm25 = fused.copy()
+        dense = None
+        mask = self.filter_mask(sources)
+        if self.vector_index is not None:
+            query_vector = embeddings.embed_query(query)
+            if query_vector is not None:
+                dense = self.vector_index.dense_scores(query_vector, max(ANN_CANDIDATES, top_k), mask)
+                fused = (1 - self.dense_weight) * _normalise(bm25) + self.dense_weight * _normalise(dense)
+
+        if mask is not None:
+            fused = np.where(mask, fused, -np.inf)
+        candidates = int(np.count_nonzero(fused > 0))
+        k = min(top_k, candidates)
+        if k <= 0:
+            return []
+        top = np.argpartition(-fused, k - 1)[:k]
+        top = top[np.argsort(-fused[top])]
+        return [
+            dict(self.chunks[i], pointer=self.pointers[i], score=float(fused[i]), bm25=float(bm25[i]),
+                 dense=float(dense[i]) if dense is not None else None)
+            for i in top
+        ]
+
+
+def _normalise(scores: np.ndarray) -> np.ndarray:
+    peak = float(scores.max()) if scores.size else 0.0
+    return np.clip(scores, 0, None) / peak if peak > 0 else np.zeros_like(scores)
+
+
+_retriever: Optional[HybridRetriever] = None
+_retriever_lock = threading.Lock()
+
+
+def get_retriever() -> HybridRetriever:
+    """Retriever for the current knowledge index (rebuilt whenever the index object changes), with the shared result cache."""
+    global _retriever
+    index = get_knowledge_index()
+    retriever = _retriever
+    if retriever is None or retriever.index is not index:
+        with _retriever_lock:
+            # Re-read under the lock: a caller still holding the replaced index must not swap it back in
+            index = get_knowledge_index()
+            if _retriever is None or _retriever.index is not index:
+                _retriever = HybridRetriever(index, cache=retrieval_cache)
+            retriever = _retriever
+    return retriever
@@ -0,0 +1,80 @@
+"""
+Correlation fields for log records: task id, run id, stage, mode and model.
+
+Fields live in contextvars, so they follow asyncio tasks and
+asyncio.to_thread automatically. Work handed to a ThreadPoolExecutor or a
+plain thread is wrapped with bind_context() so it keeps the caller's fields.
+Another process gets them through export_context() and log_context(**fields),
+for example in the socket daemon request. ContextFilter copies the fields onto
+each record on the calling thread, before it is queued for the log listener.
+
+Usage:
+    with log_context(task_id=task_id, mode="lean"):
+        with new_run():
+            pool.submit(bind_context(work), item)
+"""
+import uuid
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+CONTEXT_FIELDS = ("task_id", "run_id", "stage", "mode", "model")
+
+_vars: Dict[str, contextvars.ContextVar] = {
+    name: contextvars.ContextVar(f"log_{name}", default=None) for name in CONTEXT_FIELDS
+}
+
+
+def current_context() -> Dict[str, str]:
+    """The correlation fields set in the current context."""
+    fields = {}
+    for name, var in _vars.items():
+        value = var.get()
+        if value is not None:
+            fields[name] = value
+    return fields
+
+
+@contextmanager
+def log_context(**fields: Optional[Any]) -> Iterator[Dict[str, str]]:
+    """Set correlation fields for the enclosed block (None values and unknown names are ignored)."""
+    tokens = []
+    for name, value in fields.items():
+        if name in _vars and value is not None:
+            tokens.append((_vars[name], _vars[name].set(str(value))))
+    try:
+        yield current_context()
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def new_run(**fields: Optional[Any]):
+    """log_context with a fresh run id (one per crew execution)."""
+    return log_context(run_id=uuid.uuid4().hex[:12], **fields)
+
+
+def bind_context(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap fn to run in a copy of the caller's context (for thread pools and threads)."""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def export_context() -> Dict[str, str]:
+    """Fields to send along with a request to another process."""
+    return current_context()
+
+
+class ContextFilter(logging.Filter):
+    """Copy the current correlation fields onto each record (on the thread that logs it)."""
+
+    def filter(self, record):
+        for name, var in _vars.items():
+            if not hasattr(record, name):
+                setattr(record, name, var.get())
+        return True
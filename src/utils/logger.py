@@ -1,10 +1,31 @@
 import logging
+import logging.handlers
 import os
+import json
 import sys
 import re
+import gzip
+import time
+import queue
+import atexit
+import shutil
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Any, Optional, Dict
+
+try:
+    from .log_context import CONTEXT_FIELDS, ContextFilter
+except ImportError:
+    try:
+        from src.utils.log_context import CONTEXT_FIELDS, ContextFilter
+    except ImportError:
+        from log_context import CONTEXT_FIELDS, ContextFilter
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotation is not coordinated across processes
+    fcntl = None
 
 try:
     import colorama
@@ -44,6 +65,21 @@ DEFAULT_LOG_LEVEL_NAME = "INFO"
 APP_LOGGER_NAME = Path(__file__).resolve().parents[2].name.split("-")[0]
 ANSI_ESCAPE_PATTERN = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
 
+# File logging runs on a listener thread: callers only enqueue records.
+# The log file rotates by size and age; rotated files are gzipped and pruned.
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_HOURS = float(os.getenv("LOG_ROTATE_HOURS", "24"))  # 0 = size-based only
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "10"))
+LOG_RETENTION_DAYS = float(os.getenv("LOG_RETENTION_DAYS", "14"))  # 0 = keep by count only
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "true").lower() == "true"
+LOG_BATCH_SIZE = 256
+LOG_REOPEN_CHECK_S = 1.0  # how often a writer checks whether another process rotated the file
+# Rotated files are gzipped once untouched for this long: another process may still append briefly
+LOG_COMPRESS_AFTER_S = 60.0
+# "text" (default) or "json": one JSON object per line with the correlation fields
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LIBRARY_LOGGERS = ["httpx", "LiteLLM", "openai", "crewai", "chromadb", "docling"]
+
 class ConsoleFormatter(logging.Formatter):
     LEVEL_COLORS = {
         logging.DEBUG: Fore.CYAN,
@@ -84,12 +120,12 @@ class ConsoleFormatter(logging.Formatter):
             record.levelname = f"{log_color}{level_name_str}{padding}{Style.RESET_ALL}"
             log_symbol = self.LEVEL_SYMBOLS.get(record.levelno, "")
             current_msg = f"{log_symbol} {original_msg}"
-            original_args = record.args
+            original_msg_template, original_args = record.msg, record.args
             record.msg = current_msg
             record.args = []
             formatted = super().format(record)
             record.levelname = level_name_str
-            record.msg = original_msg
+            record.msg = original_msg_template
             record.args = original_args
             return formatted
         return self._simple_formatter.format(record)
@@ -121,28 +157,278 @@ class FileFormatter(logging.Formatter):
             current_msg = f"{log_symbol} {original_msg}"
         else:
             current_msg = f"[lib] {original_msg}"
-        original_args = record.args
+        tags = " ".join(f"{name}={getattr(record, name)}" for name in ("task_id", "run_id", "stage")
+                        if getattr(record, name, None))
+        if tags:
+            current_msg = f"[{tags}] {current_msg}"
+        original_msg_template, original_args = record.msg, record.args
         record.msg = current_msg
         record.args = []
         formatted = super().format(record)
         record.levelname = level_name_str
-        record.msg = original_msg
+        record.msg = original_msg_template
         record.args = original_args
         return ANSI_ESCAPE_PATTERN.sub('', formatted)
 
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, thread and the correlation fields."""
+
+    def format(self, record):
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": ANSI_ESCAPE_PATTERN.sub('', record.getMessage()),
+            "thread": record.threadName,
+            "pid": record.process,
+        }
+        for name in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves message formatting to the listener thread when
+    the arguments are immutable (the common case), so the calling thread only
+    captures the record. Other arguments are merged here, as they may change
+    before the listener gets to them.
+    """
+
+    IMMUTABLE_ARGS = (str, int, float, bool, type(None))
+
+    def prepare(self, record):
+        args = record.args
+        if not args or (isinstance(args, tuple) and all(isinstance(a, self.IMMUTABLE_ARGS) for a in args)):
+            if record.exc_info and not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+            return record
+        return super().prepare(record)
+
+
+class _BatchFlush:
+    """Skip the per-record flush; the listener flushes once per batch."""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class BatchedStreamHandler(_BatchFlush, logging.StreamHandler):
+    pass
+
+
+class CompressingRotatingFileHandler(_BatchFlush, logging.handlers.BaseRotatingHandler):
+    """
+    Log file rotated when it exceeds max_bytes or is older than rotate_hours.
+    Rotated files are renamed <file>.<timestamp>[.gz] and pruned to backup_count
+    files and retention_days days.
+
+    Every process (API workers, Streamlit, CLI) appends to the same file, so
+    rotation and pruning run under an exclusive lock file, and a writer whose
+    file was rotated by another process reopens the new one. Until it notices,
+    it still appends to the rotated file, so that file is only gzipped at a
+    later rotation (or start) once nothing has written to it for
+    LOG_COMPRESS_AFTER_S.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = LOG_MAX_BYTES, rotate_hours: float = LOG_ROTATE_HOURS,
+                 backup_count: int = LOG_BACKUP_COUNT, retention_days: float = LOG_RETENTION_DAYS,
+                 compress: bool = LOG_COMPRESS):
+        super().__init__(filename, mode="a", encoding="utf-8", delay=True)
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_hours * 3600
+        self.backup_count = backup_count
+        self.retention_seconds = retention_days * 86400
+        self.compress = compress
+        self._pending_text = ""
+        # Hidden, so it never matches the rotated-file patterns that prune() deletes
+        self.lock_path = str(Path(self.baseFilename).with_name(f".{Path(self.baseFilename).name}.lock"))
+        self._checked_at = 0.0
+        started = os.path.getmtime(filename) if os.path.exists(filename) else time.time()
+        self.rollover_at = started + self.rotate_seconds if self.rotate_seconds else None
+        with self.rotation_lock():
+            self.compress_rotated()
+            self.prune()
+
+    @contextmanager
+    def rotation_lock(self):
+        """Exclusive lock shared by every process writing this log file."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _rotated_elsewhere(self) -> bool:
+        """True when the open file is no longer the one at baseFilename (another process rotated it)."""
+        try:
+            return os.fstat(self.stream.fileno()).st_ino != os.stat(self.baseFilename).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _reopen_if_rotated(self):
+        now = time.time()
+        if now - self._checked_at < LOG_REOPEN_CHECK_S:
+            return
+        self._checked_at = now
+        if self._rotated_elsewhere():
+            self.stream.close()
+            self.stream = self._open()
+            if self.rotate_seconds:
+                self.rollover_at = now + self.rotate_seconds
+
+    def shouldRollover(self, record) -> bool:
+        if self.stream is None:
+            self.stream = self._open()
+        self._reopen_if_rotated()
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            if self.stream.tell():
+                return True
+            self.rollover_at = time.time() + self.rotate_seconds  # nothing logged: keep the empty file
+        # Sized by the stream position alone; formatting the record here would format it twice
+        return self.max_bytes > 0 and self.stream.tell() >= self.max_bytes
+
+    def doRollover(self):
+        with self.rotation_lock():
+            rotated_elsewhere = False
+            if self.stream:
+                rotated_elsewhere = self._rotated_elsewhere()
+                self.stream.close()
+                self.stream = None
+            # Another process may have rotated while this one waited: then only reopen
+            if not rotated_elsewhere and os.path.exists(self.baseFilename):
+                rotated = f"{self.baseFilename}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+                os.replace(self.baseFilename, rotated)
+            if self.rotate_seconds:
+                self.rollover_at = time.time() + self.rotate_seconds
+            self.compress_rotated()
+            self.prune()
+
+    def compress_rotated(self):
+        """Gzip rotated files that no process has written to for LOG_COMPRESS_AFTER_S."""
+        if not self.compress:
+            return
+        cutoff = time.time() - LOG_COMPRESS_AFTER_S
+        base = Path(self.baseFilename)
+        for rotated in base.parent.glob(f"{base.name}.*"):
+            if rotated.suffix == ".gz" or rotated.stat().st_mtime > cutoff:
+                continue
+            with open(rotated, "rb") as source, gzip.open(f"{rotated}.gz", "wb") as target:
+                shutil.copyfileobj(source, target)
+            shutil.copystat(rotated, f"{rotated}.gz")  # keep the age that prune() goes by
+            os.remove(rotated)
+
+    def prune(self):
+        """Delete rotated files (and old per-start log files) beyond the count and age limits."""
+        log_dir = Path(self.baseFilename).parent
+        base = Path(self.baseFilename).name
+        candidates = [p for p in log_dir.glob(f"{base}.*")]
+        candidates += [p for p in log_dir.glob(f"{APP_LOGGER_NAME}_*.log") if str(p) != self.baseFilename]
+        candidates.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+        cutoff = time.time() - self.retention_seconds if self.retention_seconds else None
+        for position, path in enumerate(candidates):
+            if position >= self.backup_count or (cutoff is not None and path.stat().st_mtime < cutoff):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def write_text(self, text: str):
+        """Append captured stdout text (ANSI codes removed) to the log file."""
+        text = ANSI_ESCAPE_PATTERN.sub('', text)
+        if isinstance(self.formatter, JsonFormatter):
+            # Keep the file one JSON object per line: complete lines become "stdout" records
+            text = self._pending_text + text
+            lines = text.split("\n")
+            self._pending_text = lines.pop()
+            now = datetime.now().isoformat(timespec="milliseconds")
+            text = "".join(json.dumps({"ts": now, "level": "INFO", "logger": "stdout", "message": line},
+                                      ensure_ascii=False) + "\n" for line in lines if line.strip())
+        self.acquire()
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(text)
+        finally:
+            self.release()
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """
+    QueueListener that drains up to LOG_BATCH_SIZE items at a time and flushes
+    its handlers once per batch. Plain strings on the queue are captured
+    stdout/stderr text and go to the file handler as-is.
+    """
+
+    def __init__(self, log_queue, *handlers, file_handler: Optional[CompressingRotatingFileHandler] = None):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.file_handler = file_handler
+
+    def _monitor(self):
+        q = self.queue
+        while True:
+            batch = [q.get()]
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            for item in batch:
+                if item is self._sentinel:
+                    stop = True
+                elif isinstance(item, str):
+                    if self.file_handler is not None:
+                        self.file_handler.write_text(item)
+                else:
+                    self.handle(item)
+            for handler in self.handlers:
+                try:
+                    handler.flush_batch() if isinstance(handler, _BatchFlush) else handler.flush()
+                except Exception:
+                    pass
+            if stop:
+                return
+
+
+class AppRecordFilter(logging.Filter):
+    """Only records from the application's own loggers (the console shows app logs only)."""
+
+    def filter(self, record):
+        return record.name == APP_LOGGER_NAME or record.name.startswith(APP_LOGGER_NAME + ".")
+
+
 class StdoutInterceptor:
-    def __init__(self, log_path: str):
-        self.terminal = sys.stdout
-        self.log = open(log_path, "a", encoding="utf-8", buffering=1)
+    """Echo to the terminal and hand the text to the log listener thread (no file I/O here)."""
+
+    def __init__(self, terminal, log_queue):
+        self.terminal = terminal
+        self.queue = log_queue
 
     def write(self, message):
         self.terminal.write(message)
-        cleaned = ANSI_ESCAPE_PATTERN.sub('', message)  # 🧼 strip ANSI before writing
-        self.log.write(cleaned)
+        if message:
+            self.queue.put(message)
 
     def flush(self):
         self.terminal.flush()
-        self.log.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.terminal, name)
 
 class Logger:
     _is_setup = False
@@ -153,12 +439,14 @@ class Logger:
     DEFAULT_LOG_LEVEL = logging.INFO
     DEFAULT_FILE_ENABLE = True
 
+    _listener: Optional[BatchingQueueListener] = None
+
     @staticmethod
     def get_default_log_file() -> Path:
         project_root = Path(__file__).resolve().parent.parent.parent
         log_dir = project_root / "logs"
         log_dir.mkdir(parents=True, exist_ok=True)
-        return log_dir / f"{APP_LOGGER_NAME}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+        return log_dir / f"{APP_LOGGER_NAME}.log"
 
     @staticmethod
     def setup() -> logging.Logger:
@@ -183,34 +471,46 @@ class Logger:
         file_fmt = '%(asctime)s │ %(levelname)-9s │ %(name)-15s │ %(message)s'
         date_fmt = '%H:%M:%S'
 
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setFormatter(ConsoleFormatter(fmt=console_fmt, datefmt=date_fmt))
-        app_logger.addHandler(console_handler)
+        # Callers only enqueue; a listener thread formats and writes in batches
+        log_queue = queue.SimpleQueue()
+        queue_handler = LazyQueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+        json_logs = LOG_FORMAT == "json"
+        console_handler = BatchedStreamHandler(sys.stdout)
+        console_handler.setFormatter(JsonFormatter() if json_logs else ConsoleFormatter(fmt=console_fmt, datefmt=date_fmt))
+        console_handler.addFilter(AppRecordFilter())
+        handlers = [console_handler]
 
         actual_log_file = None
+        file_handler = None
         if log_file_enable:
             actual_log_file = Path(log_file_path_override) if log_file_path_override else Logger.get_default_log_file()
             actual_log_file.parent.mkdir(parents=True, exist_ok=True)
-            file_handler = logging.FileHandler(str(actual_log_file), encoding='utf-8', delay=True)
-            file_handler.setFormatter(FileFormatter(fmt=file_fmt, datefmt=date_fmt))
-            app_logger.addHandler(file_handler)
-            root_file_handler = logging.FileHandler(str(actual_log_file), encoding='utf-8', delay=True)
-            root_file_handler.setFormatter(FileFormatter(fmt=file_fmt, datefmt=date_fmt))
-            root_logger.addHandler(root_file_handler)
-            sys.stdout = StdoutInterceptor(str(actual_log_file))
+            file_handler = CompressingRotatingFileHandler(str(actual_log_file))
+            file_handler.setFormatter(JsonFormatter() if json_logs else FileFormatter(fmt=file_fmt, datefmt=date_fmt))
+            handlers.append(file_handler)
+            root_logger.addHandler(queue_handler)
+        app_logger.addHandler(queue_handler)
+
+        Logger._listener = BatchingQueueListener(log_queue, *handlers, file_handler=file_handler)
+        Logger._listener.start()
+        atexit.register(Logger.shutdown)
+        if file_handler is not None:
+            sys.stdout = StdoutInterceptor(sys.stdout, log_queue)
             sys.stderr = sys.stdout
             print(f"{LogSymbols.INFO} Logging to file: {actual_log_file}")
 
         lib_level = LOG_LEVEL_MAP.get(os.getenv("LIBRARY_LOG_LEVEL", "WARNING").upper(), logging.WARNING)
-        for lib in ["httpx", "LiteLLM", "openai", "crewai", "chromadb", "docling"]:
+        for lib in LIBRARY_LOGGERS:
             lib_logger = logging.getLogger(lib)
             lib_logger.setLevel(lib_level)
             lib_logger.handlers.clear()
-            lib_logger.propagate = False
+            # Library records reach the log file through the root logger's queue handler
+            lib_logger.propagate = True
 
         divider = f"{LogSymbols.DIVIDER * 60}"
         app_logger.info(divider)
-        app_logger.info(f"Logger Setup Complete (App Level: {log_level_name}) {LogSymbols.SUCCESS}")
+        app_logger.info(f"Logger Setup Complete (App Level: {log_level_name}, Format: {LOG_FORMAT}) {LogSymbols.SUCCESS}")
         if actual_log_file:
             app_logger.info(f"File Logging: Enabled ({str(actual_log_file)})")
         else:
@@ -222,6 +522,65 @@ class Logger:
         Logger._app_logger_instance = app_logger
         return app_logger
 
+    @staticmethod
+    def get_levels() -> Dict[str, str]:
+        """Current app and library log levels."""
+        levels = {"app": logging.getLevelName(logging.getLogger(APP_LOGGER_NAME).level)}
+        for lib in LIBRARY_LOGGERS:
+            levels[lib] = logging.getLevelName(logging.getLogger(lib).level)
+        return levels
+
+    @staticmethod
+    def set_levels(app: Optional[str] = None, library: Optional[str] = None,
+                   loggers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """
+        Change log levels at runtime (no restart needed).
+
+        Args:
+            app: Level for the app logger (LOG_LEVEL); the root logger is left alone
+            library: Level for all library loggers (LIBRARY_LOG_LEVEL)
+            loggers: Levels for individual loggers, e.g. {"crewai": "DEBUG"} ("" is the root logger)
+
+        Returns:
+            dict: The levels after the change (see get_levels)
+
+        Raises:
+            ValueError: If a level name is unknown.
+        """
+        def level_of(name: str) -> int:
+            level = LOG_LEVEL_MAP.get(name.upper())
+            if level is None:
+                raise ValueError(f"Unknown log level '{name}' (use one of {', '.join(LOG_LEVEL_MAP)})")
+            return level
+
+        changes = []
+        if app:
+            changes.append((APP_LOGGER_NAME, level_of(app)))
+        if library:
+            changes.extend((lib, level_of(library)) for lib in LIBRARY_LOGGERS)
+        for name, level_name in (loggers or {}).items():
+            changes.append((name, level_of(level_name)))
+        for name, level in changes:
+            logging.getLogger(name).setLevel(level)
+        if app:
+            os.environ[Logger.ENV_VAR_LOG_LEVEL] = app.upper()
+        if library:
+            os.environ["LIBRARY_LOG_LEVEL"] = library.upper()
+        if changes:
+            summary = ", ".join(f"{name or 'root'}={logging.getLevelName(level)}" for name, level in changes)
+            logging.getLogger(APP_LOGGER_NAME).info(f"Log levels changed: {summary}")
+        return Logger.get_levels()
+
+    @staticmethod
+    def shutdown():
+        """Write out queued log records and stop the listener thread."""
+        listener = Logger._listener
+        if listener is not None:
+            Logger._listener = None
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+
 def get_logger(name: str) -> logging.Logger:
     if not Logger._is_setup:
         Logger.setup()
@@ -0,0 +1,298 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Counters, gauges and histograms are plain objects with one lock each, so
+recording a value is a dict lookup and an addition. Run, stage, task, LLM
+and retrieval timings come from finished tracing spans (see utils.tracing),
+so instrumented code records them once; utils.usage adds cost and per-stage
+token counts the same way. Values that are already tracked
+elsewhere (task states, output queue depth, retrieval cache hits) are read
+at scrape time by collectors registered with register_collector().
+
+Usage:
+    GET /metrics on the A2A server, or print(render()) in-process
+"""
+import abc
+import sys
+import bisect
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+try:
+    from .tracing import add_span_listener
+except ImportError:
+    from tracing import add_span_listener
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds: LLM calls and crew runs take seconds to minutes
+SECONDS_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+        if not self.labelnames:
+            self.labels()  # export 0 before the first event
+
+    def labels(self, *values: str):
+        """The child value for one combination of label values."""
+        key = tuple(str(v) for v in values)
+        child = self._values.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._values.setdefault(key, self._new_child())
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """A fresh value for one label combination."""
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        for key, child in list(self._values.items()):
+            samples.extend(child.samples(self.name, dict(zip(self.labelnames, key))))
+        return samples
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self, name: str, labels: Dict[str, str]) -> List[Sample]:
+        return [(name, labels, self.value)]
+
+
+class Counter(_Metric):
+    """Monotonic count (name it with a _total suffix)."""
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """Value that goes up and down."""
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self, name: str, labels: Dict[str, str]) -> List[Sample]:
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        samples, cumulative = [], 0
+        for bound, count in zip(list(self.buckets) + [float("inf")], counts):
+            cumulative += count
+            samples.append((f"{name}_bucket", dict(labels, le=_format_value(bound)), cumulative))
+        samples.append((f"{name}_sum", labels, total))
+        samples.append((f"{name}_count", labels, cumulative))
+        return samples
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count of observed values."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = SECONDS_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        families = [(m.name, m.kind, m.documentation, m.samples()) for m in self._metrics]
+        for collector in self._collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+        lines = []
+        for name, kind, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+register_collector = REGISTRY.register_collector
+render = REGISTRY.render
+
+# === Application metrics ===
+RUNS_ACTIVE = Gauge("promptweaver_runs_active", "Crew runs in progress.", ["kind"])
+RUN_DURATION = Histogram("promptweaver_run_duration_seconds", "End-to-end crew run latency.", ["kind", "status"])
+STAGE_DURATION = Histogram("promptweaver_stage_duration_seconds",
+                           "Latency of pipeline stages and CrewAI tasks (task:<agent role>).", ["stage"])
+LLM_CALLS = Counter("promptweaver_llm_calls_total", "LLM calls.", ["provider", "model", "status"])
+LLM_DURATION = Histogram("promptweaver_llm_call_duration_seconds", "LLM call latency.", ["provider", "model"])
+LLM_TOKENS = Counter("promptweaver_llm_tokens_total", "LLM tokens used.", ["provider", "model", "type"])
+LLM_COST = Counter("promptweaver_llm_cost_usd_total", "Estimated LLM spend in USD (utils.usage price table).",
+                   ["provider", "model"])
+STAGE_TOKENS = Counter("promptweaver_stage_tokens_total",
+                       "LLM tokens by pipeline stage or CrewAI task (task:<agent role>).", ["stage", "type"])
+RETRIES = Counter("promptweaver_retries_total", "Crew kickoff attempts that failed and were retried or gave up.")
+FALLBACKS = Counter("promptweaver_fallbacks_total", "Fallback prompt generations.", ["reason"])
+RETRIEVALS = Histogram("promptweaver_retrieval_duration_seconds", "Knowledge retrieval latency.", ["cache"],
+                       buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+
+
+def split_model(model: str) -> Tuple[str, str]:
+    """("openrouter", "mistralai/mistral-7b-instruct") for "openrouter/mistralai/mistral-7b-instruct"."""
+    provider, _, name = model.partition("/")
+    return (provider, name) if name else ("default", provider)
+
+
+def record_span(span) -> None:
+    """Span listener: turn finished run, stage, task, LLM and retrieval spans into metrics."""
+    name = span.name
+    seconds = (span.end_ns - span.start_ns) / 1e9
+    attributes = span.attributes
+    if name.startswith("run."):
+        RUN_DURATION.labels(name[4:], "error" if span.status == "ERROR" else "ok").observe(seconds)
+    elif name.startswith("stage."):
+        stage = name[6:]
+        STAGE_DURATION.labels("variant" if stage.startswith("variant-") else stage).observe(seconds)
+    elif name.startswith("task "):
+        STAGE_DURATION.labels(f"task:{attributes.get('crewai.agent', name[5:])}").observe(seconds)
+    elif name in ("llm.call", "llm.fallback_completion"):
+        provider, model = split_model(attributes.get("llm.model") or "openai/fallback")
+        LLM_CALLS.labels(provider, model, "error" if span.status == "ERROR" else "ok").inc()
+        LLM_DURATION.labels(provider, model).observe(seconds)
+        for kind in ("prompt", "completion"):
+            tokens = attributes.get(f"llm.{kind}_tokens")
+            if tokens:
+                LLM_TOKENS.labels(provider, model, kind).inc(tokens)
+    elif name == "retrieval.search":
+        hit = attributes.get("retrieval.cache_hit")
+        RETRIEVALS.labels("none" if hit is None else "hit" if hit else "miss").observe(seconds)
+
+
+add_span_listener(record_span)
+
+
+def state_counts(name: str, documentation: str, counts: Dict[str, float], label: str = "state",
+                 kind: str = "gauge") -> Tuple[str, str, str, List[Sample]]:
+    """Collector helper: one labelled sample per entry of counts."""
+    return name, kind, documentation, [(name, {label: key}, value) for key, value in counts.items()]
+
+
+def _loaded_module(*names: str):
+    """An already imported module (collectors never import heavy modules themselves)."""
+    for name in names:
+        if name in sys.modules:
+            return sys.modules[name]
+    return None
+
+
+def _writer_and_cache_metrics():
+    families = []
+    output_writer = _loaded_module("src.utils.output_writer", "utils.output_writer")
+    writer = output_writer._writer if output_writer else None
+    if writer is not None:
+        stats = writer.stats()
+        families.append(("promptweaver_output_queue_depth", "gauge", "Outputs waiting for the background writer.",
+                         [("promptweaver_output_queue_depth", {}, stats["queued"])]))
+        families.append(("promptweaver_outputs_written_total", "counter", "Outputs saved by the background writer.",
+                         [("promptweaver_outputs_written_total", {}, stats["written"])]))
+    retrieval = _loaded_module("src.tools.retrieval", "tools.retrieval")
+    if retrieval is None:
+        return families
+    stats = retrieval.retrieval_cache.stats()
+    families.append(state_counts("promptweaver_retrieval_cache_lookups_total", "Retrieval cache lookups.",
+                                 {"hit": stats["hits"], "miss": stats["misses"]}, label="result", kind="counter"))
+    families.append(("promptweaver_retrieval_cache_entries", "gauge", "Cached retrieval result lists.",
+                     [("promptweaver_retrieval_cache_entries", {}, stats["size"])]))
+    return families
+
+
+register_collector(_writer_and_cache_metrics)
@@ -1,7 +1,36 @@
 import os
 import re
+import time
+import queue
+import atexit
 import hashlib
+import logging
+import threading
 from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from .prompt_store import DEFAULT_STORE_DIR, get_prompt_store, run_metadata
+    from .prompt_search import notify_saved
+except ImportError:
+    from prompt_store import DEFAULT_STORE_DIR, get_prompt_store, run_metadata
+    from prompt_search import notify_saved
+
+logger = logging.getLogger(__name__)
+
+# Save generated prompts to the content-addressed store (false = <title>_<hash>_<timestamp>.md files)
+OUTPUT_STORE = os.getenv("OUTPUT_STORE", "true").lower() == "true"
+# Write generated prompts from a background thread (false = write inline)
+OUTPUT_WRITE_BEHIND = os.getenv("OUTPUT_WRITE_BEHIND", "true").lower() == "true"
+# none: leave durability to the OS; batch: fsync once per written batch; always: fsync every file
+FSYNC_POLICIES = ("none", "batch", "always")
+OUTPUT_FSYNC = os.getenv("OUTPUT_FSYNC", "batch").lower()
+OUTPUT_QUEUE_SIZE = int(os.getenv("OUTPUT_QUEUE_SIZE", "256"))
+OUTPUT_BATCH_SIZE = int(os.getenv("OUTPUT_BATCH_SIZE", "32"))
+OUTPUT_BATCH_WAIT_MS = float(os.getenv("OUTPUT_BATCH_WAIT_MS", "50"))
+OUTPUT_SUBMIT_TIMEOUT_S = float(os.getenv("OUTPUT_SUBMIT_TIMEOUT_S", "5"))
+OUTPUT_FLUSH_TIMEOUT_S = float(os.getenv("OUTPUT_FLUSH_TIMEOUT_S", "10"))
+DEFAULT_OUTPUT_DIR = DEFAULT_STORE_DIR
 
 def extract_simple_title(text: str) -> str:
     # Try to extract a concise title from the prompt (first sentence or main keywords)
@@ -48,17 +77,26 @@ def sanitize_filename(text: str) -> str:
 def get_timestamp() -> str:
     return datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
 
-def save_clean_output(prompt: str, instruction: str, output_dir="output"):
+def render_output(prompt: str, instruction: str, timestamp: str = None):
     """
-    Save the generated prompt to a file with a sanitized filename.
+    Build the file name and Markdown content for a generated prompt.
 
     Args:
         prompt: The generated prompt content
         instruction: The original user instruction
-        output_dir: Directory to save the file (default: "output")
+        timestamp: Timestamp for the file name (default: now)
+
+    Returns:
+        tuple: (file name, Markdown content)
     """
-    os.makedirs(output_dir, exist_ok=True)
+    simple_title, markdown_output = render_document(prompt, instruction)
+    # Create a safe filename
+    base_filename = sanitize_filename(simple_title)
+    filename = f"{base_filename}_{timestamp or get_timestamp()}.md"
+    return filename, markdown_output
 
+def render_document(prompt: str, instruction: str):
+    """Title and Markdown content for a generated prompt (no file name)."""
     # Try to extract the first Markdown header from the prompt
     header_title = extract_markdown_header(prompt)
     if header_title:
@@ -67,11 +105,6 @@ def save_clean_output(prompt: str, instruction: str, output_dir="output"):
         # Fallback to extracting from instruction
         simple_title = extract_simple_title(instruction)
 
-    # Create a safe filename
-    base_filename = sanitize_filename(simple_title)
-    filename = f"{base_filename}_{get_timestamp()}.md"
-    filepath = os.path.join(output_dir, filename)
-
     # Strip framework explanation if present
     clean_prompt = prompt.split("This prompt combines")[0].strip()
 
@@ -80,8 +113,262 @@ def save_clean_output(prompt: str, instruction: str, output_dir="output"):
         markdown_output = f"# {simple_title}\n\n{clean_prompt}\n"
     else:
         markdown_output = f"{clean_prompt}\n"
+    return simple_title, markdown_output
 
+def _write_output(filepath: str, content: str, fsync: bool = False):
     with open(filepath, "w", encoding="utf-8") as f:
-        f.write(markdown_output)
+        f.write(content)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+
+def save_clean_output(prompt: str, instruction: str, output_dir="output"):
+    """
+    Save the generated prompt to a file with a sanitized filename.
+
+    Args:
+        prompt: The generated prompt content
+        instruction: The original user instruction
+        output_dir: Directory to save the file (default: "output")
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    filename, markdown_output = render_output(prompt, instruction)
+    filepath = os.path.join(output_dir, filename)
+    _write_output(filepath, markdown_output, fsync=OUTPUT_FSYNC == "always")
 
     print(f"\n✅ Prompt saved to: {filepath}")
+    return filepath
+
+
+# === Write-behind persistence ===
+# Requests hand outputs to a background writer thread instead of writing them
+# on the request path; the writer renders, writes and (optionally) fsyncs them
+# in batches. A full queue makes callers wait up to OUTPUT_SUBMIT_TIMEOUT_S and
+# then write synchronously, so a slow disk slows producers down instead of
+# growing memory or dropping outputs. Pending outputs are flushed at exit.
+
+class OutputWriter:
+    """Background writer thread draining a bounded queue of outputs in batches."""
+
+    def __init__(self, queue_size: int = OUTPUT_QUEUE_SIZE, batch_size: int = OUTPUT_BATCH_SIZE,
+                 batch_wait_ms: float = OUTPUT_BATCH_WAIT_MS, fsync: str = OUTPUT_FSYNC,
+                 submit_timeout_s: float = OUTPUT_SUBMIT_TIMEOUT_S):
+        if fsync not in FSYNC_POLICIES:
+            logger.warning(f"Unknown OUTPUT_FSYNC '{fsync}', using 'batch'")
+            fsync = "batch"
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait_ms / 1000
+        self.fsync = fsync
+        self.submit_timeout_s = submit_timeout_s
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "written": 0, "failed": 0, "batches": 0,
+                       "sync_fallbacks": 0, "last_error": None}
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="output-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt: str, instruction: str, output_dir: str = DEFAULT_OUTPUT_DIR,
+               on_written: Optional[Callable[[str], None]] = None, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Queue an output for writing. Returns immediately unless the queue is
+        full, in which case it waits (backpressure) and finally writes inline.
+
+        Args:
+            prompt: The generated prompt content
+            instruction: The original user instruction
+            output_dir: Directory to save the file
+            on_written: Called with the file path once the file is written
+            metadata: Index fields for the prompt store (mode, model, timings, usage)
+        """
+        item = (prompt, instruction, output_dir, datetime.now(), on_written, metadata or {})
+        self._count("submitted")
+        if not self._closed:
+            try:
+                self._queue.put(item, timeout=self.submit_timeout_s)
+                return
+            except queue.Full:
+                logger.warning(f"Output queue full for {self.submit_timeout_s}s; writing synchronously")
+                self._count("sync_fallbacks")
+        self._write_batch([item])
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued output is written. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = OUTPUT_FLUSH_TIMEOUT_S) -> bool:
+        """Flush pending outputs and stop the writer thread."""
+        if self._closed:
+            return True
+        flushed = self.flush(timeout)
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=1)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=1)
+        if not flushed:
+            logger.warning(f"Output writer closed with {self._queue.qsize()} outputs unwritten")
+        return flushed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, queued=self._queue.qsize(), fsync=self.fsync)
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.task_done()
+                    stopping = True  # stop once this batch is written
+                    break
+                batch.append(item)
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch):
+        written = []
+        if OUTPUT_STORE:
+            by_dir: Dict[str, list] = {}
+            for item in batch:
+                by_dir.setdefault(item[2], []).append(item)
+            for output_dir, items in by_dir.items():
+                try:
+                    written.extend(self._store_items(output_dir, items))
+                except Exception as e:
+                    self._failed(len(items), e)
+        else:
+            written = self._write_files(batch)
+        with self._lock:
+            self._stats["written"] += len(written)
+            self._stats["batches"] += 1
+        for filepath, on_written in written:
+            logger.info(f"Prompt saved to: {filepath}")
+            if on_written is not None:
+                try:
+                    on_written(filepath)
+                except Exception as e:
+                    logger.warning(f"Output callback failed: {e}")
+
+    def _store_items(self, output_dir: str, items):
+        entries = []
+        for prompt, instruction, _, created, _, metadata in items:
+            title, content = render_document(prompt, instruction)
+            entries.append(dict(run_metadata(metadata.get("mode"), metadata.get("model")),
+                                timings=metadata.get("timings"), usage=metadata.get("usage"),
+                                content=content, instruction=instruction,
+                                title=title, created_at=created.isoformat(timespec="seconds")))
+        records = get_prompt_store(output_dir).add_many(entries, fsync=self.fsync != "none")
+        notify_saved(output_dir)
+        return [(record["path"], item[4]) for record, item in zip(records, items)]
+
+    def _write_files(self, batch):
+        directories = set()
+        written = []
+        for prompt, instruction, output_dir, created, on_written, _ in batch:
+            try:
+                if output_dir not in directories:
+                    os.makedirs(output_dir, exist_ok=True)
+                    directories.add(output_dir)
+                filename, content = render_output(prompt, instruction, created.strftime("%Y-%m-%dT%H-%M-%S"))
+                filepath = os.path.join(output_dir, filename)
+                _write_output(filepath, content, fsync=self.fsync == "always")
+                written.append((filepath, on_written))
+            except Exception as e:
+                self._failed(1, e, instruction)
+        if self.fsync == "batch":
+            for filepath, _ in written:
+                _fsync_path(filepath)
+        if self.fsync != "none":
+            for directory in directories:
+                _fsync_path(directory)
+        return written
+
+    def _failed(self, count: int, error: Exception, instruction: str = ""):
+        logger.error(f"Failed to save output{f' for {instruction[:50]!r}' if instruction else ''}: {error}")
+        with self._lock:
+            self._stats["failed"] += count
+            self._stats["last_error"] = str(error)
+
+
+def _fsync_path(path: str):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # e.g. directories cannot be opened on Windows
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+_writer: Optional[OutputWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_output_writer() -> OutputWriter:
+    """Process-wide output writer, started on first use and flushed at exit."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = OutputWriter()
+                atexit.register(shutdown_output_writer)
+    return _writer
+
+
+def shutdown_output_writer(timeout: Optional[float] = OUTPUT_FLUSH_TIMEOUT_S) -> bool:
+    """Flush and stop the process-wide writer (no-op if it was never started)."""
+    writer = _writer
+    return writer.close(timeout) if writer is not None else True
+
+
+def persist_output(prompt: str, instruction: str, output_dir: str = DEFAULT_OUTPUT_DIR,
+                   on_written: Optional[Callable[[str], None]] = None, **metadata):
+    """
+    Save a generated prompt without blocking the caller on disk I/O
+    (synchronously when OUTPUT_WRITE_BEHIND=false).
+
+    Keyword arguments (mode, model, timings, usage) are recorded in the prompt store index.
+    """
+    if not OUTPUT_WRITE_BEHIND:
+        if OUTPUT_STORE:
+            title, content = render_document(prompt, instruction)
+            record = get_prompt_store(output_dir).add(
+                content, instruction, title=title, timings=metadata.get("timings"), usage=metadata.get("usage"),
+                **run_metadata(metadata.get("mode"), metadata.get("model")))
+            filepath = record["path"]
+            notify_saved(output_dir)
+        else:
+            filepath = save_clean_output(prompt, instruction, output_dir)
+        if on_written is not None:
+            on_written(filepath)
+        return
+    get_output_writer().submit(prompt, instruction, output_dir, on_written, metadata)
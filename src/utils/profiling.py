@@ -0,0 +1,324 @@
+"""
+Opt-in CPU profiling of crew runs, tagged by pipeline stage.
+
+Off by default. PROFILE_RUNS=true profiles every crew run; the A2A API also
+profiles single tasks sent with {"profile": true} in a data part (see
+request_profiling). A profiled run writes its files to
+profiles/<task id>/<run id>-<run kind>.* (PROFILE_DIR):
+
+- PROFILER=sampling (default): a background thread samples the stacks of
+  the run's threads every PROFILE_INTERVAL_MS and writes collapsed stacks
+  (.collapsed, one "frame;frame;... count" line per stack) for flamegraph.pl
+  or speedscope. Samples are wall-clock, so time spent waiting for the LLM
+  shows up under the HTTP client frames; local CPU hotspots are the rest.
+- PROFILER=cprofile: deterministic cProfile per thread and stage, merged
+  into a .pstats file per stage plus one for the whole run. From Python
+  3.12 cProfile is process-wide (sys.monitoring) and cannot run per thread,
+  so there the runs are sampled instead (with a warning).
+
+Stages come from tracing.stage_span() and the CrewAI task spans; a stage
+entered in a pool worker (bind_context() carries the session) adds that
+worker to the profile. Stacks start with the stage path, e.g.
+[pipeline];[draft];[task:Prompt Engineer];... When profiling is off the
+hooks cost one flag check and one contextvar lookup per run or stage.
+
+Usage:
+    PROFILE_RUNS=true python src/main.py "..."
+    python -m src.utils.profiling top profiles/<task id>/<file> [--limit 25]
+"""
+import os
+import re
+import abc
+import sys
+import time
+import pstats
+import cProfile
+import logging
+import argparse
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    from .log_context import current_context
+except ImportError:
+    from log_context import current_context
+
+logger = logging.getLogger(__name__)
+
+PROFILE_RUNS = os.getenv("PROFILE_RUNS", "false").lower() == "true"
+PROFILER = os.getenv("PROFILER", "sampling").lower()  # sampling | cprofile
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "profiles")
+)
+MAX_STACK_DEPTH = 128
+# Before 3.12 each thread can run its own cProfile.Profile; from 3.12 only one can be active per process
+CPROFILE_PER_THREAD = sys.version_info < (3, 12)
+_sampling_fallback_warned = False
+
+_session: contextvars.ContextVar = contextvars.ContextVar("profile_session", default=None)
+# Stage path of the current context, so pool workers continue the caller's path
+_stage_path: contextvars.ContextVar = contextvars.ContextVar("profile_stage_path", default=())
+# Set by request_profiling(): the list that receives the files written by the profiled runs
+_requested: contextvars.ContextVar = contextvars.ContextVar("profile_requested", default=None)
+
+
+def _safe(name: str) -> str:
+    return re.sub(r"[^\w.+-]+", "_", str(name)).strip("_") or "_"
+
+
+class _Session(abc.ABC):
+    """Stage tags per thread for one profiled run."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        # thread id -> stage path; replaced, never mutated, so samplers can read it without a lock
+        self._tags: Dict[int, Tuple[str, ...]] = {}
+
+    def enter(self, path: Tuple[str, ...]) -> Tuple[str, ...]:
+        """Tag the calling thread with a stage path; returns the previous one for leave()."""
+        ident = threading.get_ident()
+        previous = self._tags.get(ident, ())
+        self._tags[ident] = path
+        return previous
+
+    def leave(self, previous: Tuple[str, ...]):
+        ident = threading.get_ident()
+        if previous:
+            self._tags[ident] = previous
+        else:
+            self._tags.pop(ident, None)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    @abc.abstractmethod
+    def write(self, base: str) -> List[str]:
+        """Write the profile files, named base + suffix; returns their paths."""
+
+
+class SamplingSession(_Session):
+    """Periodic stack samples of the tagged threads, aggregated as collapsed stacks."""
+
+    def __init__(self, name: str, interval_ms: float = PROFILE_INTERVAL_MS):
+        super().__init__(name)
+        self.interval = max(interval_ms, 0.5) / 1000
+        self.counts: Counter = Counter()
+        self._labels: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident, tags in list(self._tags.items()):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    self.counts[";".join([f"[{tag}]" for tag in tags] + stack[::-1])] += 1
+            del frames
+
+    def write(self, base: str) -> List[str]:
+        path = f"{base}.collapsed"
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+        return [path]
+
+
+class CProfileSession(_Session):
+    """One cProfile.Profile per thread and stage path, enabled while that stage runs on that thread."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.profiles: Dict[Tuple[int, Tuple[str, ...]], cProfile.Profile] = {}
+        self._lock = threading.Lock()
+        self._warned = False
+
+    def _enable(self, ident: int, tags: Tuple[str, ...]):
+        with self._lock:
+            profile = self.profiles.setdefault((ident, tags), cProfile.Profile())
+        try:
+            profile.enable()
+        except ValueError as e:  # another profiler is already active (e.g. a debugger)
+            with self._lock:
+                self.profiles.pop((ident, tags), None)
+                warn, self._warned = not self._warned, True
+            if warn:
+                logger.warning(f"cProfile unavailable on {threading.current_thread().name} ({e}); "
+                               f"stage {'/'.join(tags)} of the {self.name} run is not profiled")
+
+    def _disable(self, ident: int):
+        profile = self.profiles.get((ident, self._tags.get(ident, ())))
+        if profile is not None:
+            profile.disable()
+
+    def enter(self, path: Tuple[str, ...]) -> Tuple[str, ...]:
+        ident = threading.get_ident()
+        self._disable(ident)
+        previous = super().enter(path)
+        self._enable(ident, path)
+        return previous
+
+    def leave(self, previous: Tuple[str, ...]):
+        ident = threading.get_ident()
+        self._disable(ident)
+        super().leave(previous)
+        if previous:
+            self._enable(ident, previous)
+
+    def write(self, base: str) -> List[str]:
+        by_stage: Dict[str, List[cProfile.Profile]] = {}
+        for (_, tags), profile in self.profiles.items():
+            by_stage.setdefault("/".join(tags), []).append(profile)
+        if not by_stage:
+            return []
+        paths = [f"{base}.pstats"]
+        pstats.Stats(*[p for profiles in by_stage.values() for p in profiles]).dump_stats(paths[0])
+        for stage, profiles in sorted(by_stage.items()):
+            path = f"{base}.{_safe(stage)}.pstats"
+            pstats.Stats(*profiles).dump_stats(path)
+            paths.append(path)
+        return paths
+
+
+def _new_session(name: str) -> _Session:
+    global _sampling_fallback_warned
+    if PROFILER == "cprofile":
+        if CPROFILE_PER_THREAD:
+            return CProfileSession(name)
+        if not _sampling_fallback_warned:
+            _sampling_fallback_warned = True
+            logger.warning(f"PROFILER=cprofile needs per-thread profilers (Python < 3.12); "
+                           f"sampling runs instead on Python {sys.version_info.major}.{sys.version_info.minor}")
+    return SamplingSession(name)
+
+
+@contextmanager
+def request_profiling(enabled: bool = True, written: Optional[List[str]] = None) -> Iterator[List[str]]:
+    """
+    Profile the runs started in the enclosed block even with PROFILE_RUNS off.
+    Yields the list (written, or a new one) that receives the profile files.
+    """
+    written = [] if written is None else written
+    if not enabled:
+        yield written
+        return
+    token = _requested.set(written)
+    try:
+        yield written
+    finally:
+        _requested.reset(token)
+
+
+@contextmanager
+def profile_run(name: str, profile_dir: Optional[str] = None) -> Iterator[Optional[_Session]]:
+    """Profile the enclosed crew run when PROFILE_RUNS is on or profiling was requested (else a no-op)."""
+    requested = _requested.get()
+    if (not PROFILE_RUNS and requested is None) or _session.get() is not None:
+        yield None
+        return
+    session = _new_session(name)
+    token = _session.set(session)
+    session.start()
+    try:
+        with profile_stage(name):
+            yield session
+    finally:
+        session.stop()
+        _session.reset(token)
+        try:
+            fields = current_context()
+            directory = os.path.join(profile_dir or PROFILE_DIR, _safe(fields.get("task_id", "untracked")))
+            os.makedirs(directory, exist_ok=True)
+            paths = session.write(os.path.join(directory, f"{_safe(fields.get('run_id', int(time.time())))}-{_safe(name)}"))
+            if requested is not None:
+                requested.extend(paths)
+            logger.info(f"Profile of {name} run ({time.perf_counter() - session.started:.1f}s) written to "
+                        f"{', '.join(paths) or 'nothing (no samples)'}")
+        except Exception as e:
+            logger.warning(f"Could not write the {name} run profile: {e}")
+
+
+@contextmanager
+def profile_stage(name: str) -> Iterator[None]:
+    """Tag profile samples taken in the enclosed block with a stage (no-op outside a profiled run)."""
+    session = _session.get()
+    if session is None:
+        yield
+        return
+    path = _stage_path.get() + (name,)
+    token = _stage_path.set(path)
+    previous = session.enter(path)
+    try:
+        yield
+    finally:
+        session.leave(previous)
+        _stage_path.reset(token)
+
+
+# === Reports ===
+def top_collapsed(path: str, limit: int = 25) -> List[str]:
+    """Sample share per stage path and the frames with the most self samples."""
+    stages, leaves, total = Counter(), Counter(), 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            frames = stack.split(";")
+            count = int(count)
+            total += count
+            stages[";".join(frame for frame in frames if frame.startswith("["))] += count
+            leaves[frames[-1]] += count
+    if not total:
+        return ["no samples"]
+    lines = [f"{total} samples", "", f"{'share':>7}  stage"]
+    lines += [f"{count / total:>7.1%}  {stage}" for stage, count in stages.most_common(limit)]
+    lines += ["", f"{'self':>7}  frame"]
+    lines += [f"{count / total:>7.1%}  {frame}" for frame, count in leaves.most_common(limit)]
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize crew run profiles.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    top = sub.add_parser("top", help="Hottest stages and frames of a .collapsed or .pstats profile.")
+    top.add_argument("path")
+    top.add_argument("--limit", type=int, default=25)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        parser.exit(1, f"No profile at {args.path}\n")
+    if args.path.endswith(".pstats"):
+        stats = pstats.Stats(args.path)
+        stats.sort_stats("cumulative").print_stats(args.limit)
+        stats.sort_stats("tottime").print_stats(args.limit)
+    else:
+        for line in top_collapsed(args.path, args.limit):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import re
+from typing import Dict, List
+
+# Section groups we expect in a finished prompt (any heading in a group counts)
+EXPECTED_SECTIONS: List[List[str]] = [
+    ["objective", "goal"],
+    ["context", "persona", "background", "role"],
+    ["workflow", "instructions", "steps", "task"],
+    ["constraints", "rules", "requirements"],
+    ["validation", "examples", "output format", "format"],
+]
+
+# Meta-text that should never survive into a final prompt
+FORBIDDEN_PHRASES = ["feedback:", "notes:", "critique", "validation report", "overall status:"]
+
+STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "into", "your", "about",
+    "create", "make", "write", "generate", "include", "using", "have", "will", "should",
+}
+
+MIN_WORDS = 120
+MAX_WORDS = 1500
+
+
+def _headings(text: str) -> List[str]:
+    return [h.strip().lower() for h in re.findall(r'^#{1,6}\s+(.+)$', text, re.MULTILINE)]
+
+
+def score_breakdown(prompt: str, instruction: str = "") -> Dict[str, float]:
+    """
+    Score a generated prompt with cheap local heuristics (no LLM call).
+
+    Args:
+        prompt: The generated prompt in Markdown
+        instruction: The original user instruction, used for keyword coverage
+
+    Returns:
+        dict: Per-criterion scores in [0, 1] plus the weighted 'total'
+    """
+    text = prompt or ""
+    lowered = text.lower()
+    headings = _headings(text)
+
+    sections_found = sum(
+        1 for group in EXPECTED_SECTIONS
+        if any(keyword in heading for heading in headings for keyword in group)
+    )
+    structure = sections_found / len(EXPECTED_SECTIONS)
+
+    title = 1.0 if re.match(r'^\s*# ', text) else 0.0
+
+    meta_hits = sum(lowered.count(phrase) for phrase in FORBIDDEN_PHRASES)
+    cleanliness = max(0.0, 1.0 - 0.25 * meta_hits)
+
+    keywords = {
+        word for word in re.findall(r'[a-z0-9]+', instruction.lower())
+        if len(word) > 3 and word not in STOPWORDS
+    }
+    coverage = (sum(1 for word in keywords if word in lowered) / len(keywords)) if keywords else 1.0
+
+    word_count = len(re.findall(r'\w+', text))
+    if word_count < MIN_WORDS:
+        length = word_count / MIN_WORDS
+    elif word_count > MAX_WORDS:
+        length = max(0.0, 1.0 - (word_count - MAX_WORDS) / MAX_WORDS)
+    else:
+        length = 1.0
+
+    total = 0.35 * structure + 0.1 * title + 0.15 * cleanliness + 0.25 * coverage + 0.15 * length
+    return {
+        "structure": round(structure, 3),
+        "title": title,
+        "cleanliness": round(cleanliness, 3),
+        "coverage": round(coverage, 3),
+        "length": round(length, 3),
+        "total": round(total, 3),
+    }
+
+
+def score_prompt(prompt: str, instruction: str = "") -> float:
+    """Return the weighted heuristic score of a prompt in [0, 1]."""
+    return score_breakdown(prompt, instruction)["total"]
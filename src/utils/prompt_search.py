@@ -0,0 +1,296 @@
+"""
+Full-text search over the prompt history in the prompt store.
+
+An incremental inverted index over every stored generation (title,
+instruction and prompt text) ranked with BM25. Postings are compact arrays
+(document numbers and term frequencies) scored with NumPy at query time, and
+the last query word is matched as a prefix ("launch pla" finds "plan",
+"planning", ...) through a sorted vocabulary. New records are indexed as the
+output writer saves them, and records written by other processes are picked
+up on the next query. The index is saved next to the store
+(output/search_index.npz, plain arrays loaded without pickle, since output/
+is writable by every process that saves prompts) every SAVE_EVERY new
+records and at exit, so a restart only indexes what is new.
+
+Usage:
+    python -m src.utils.prompt_search "launch plan" [--limit 10]
+"""
+import os
+import re
+import atexit
+import logging
+import argparse
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .prompt_store import DEFAULT_STORE_DIR, PromptStore, get_prompt_store
+except ImportError:
+    from prompt_store import DEFAULT_STORE_DIR, PromptStore, get_prompt_store
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_FILE = "search_index.npz"
+SEARCH_INDEX_VERSION = 2
+# Save the index after this many newly indexed records
+SAVE_EVERY = int(os.getenv("PROMPT_SEARCH_SAVE_EVERY", "1000"))
+MAX_PREFIX_EXPANSIONS = 64
+SNIPPET_CHARS = 200
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "was", "what", "when", "with", "you", "your",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class PromptSearchIndex:
+    """Append-only BM25 index over the records of one PromptStore."""
+
+    def __init__(self, store: PromptStore, k1: float = 1.2, b: float = 0.75):
+        self.store = store
+        self.k1, self.b = k1, b
+        self.path = os.path.join(store.root, SEARCH_INDEX_FILE)
+        self.doc_ids: List[str] = []
+        self.lengths = array("I")
+        self.total_length = 0
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.vocabulary: List[str] = []
+        self._unsaved = 0
+        self._lock = threading.RLock()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def add(self, record_id: str, text: str):
+        """Index one document (a store record's title, instruction and prompt)."""
+        counts = Counter(tokenize(text))
+        doc = len(self.doc_ids)
+        self.doc_ids.append(record_id)
+        length = sum(counts.values())
+        self.lengths.append(length)
+        self.total_length += length
+        for term, tf in counts.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array("I"), array("I"))
+                insort(self.vocabulary, term)
+            posting[0].append(doc)
+            posting[1].append(tf)
+        self._unsaved += 1
+
+    def sync(self) -> int:
+        """Index store records added since the last sync; returns how many were added."""
+        with self._lock:
+            records = self.store.records()
+            new = records[len(self.doc_ids):]
+            for record in new:
+                try:
+                    with open(self.store.blob_path(record["hash"]), encoding="utf-8") as f:
+                        content = f.read()
+                except OSError as e:
+                    logger.warning(f"Prompt {record['id']} has no readable blob: {e}")
+                    content = ""
+                self.add(record["id"], f"{record.get('title') or ''}\n{record['instruction']}\n{content}")
+            if self._unsaved >= SAVE_EVERY:
+                self.save()
+            return len(new)
+
+    def _expand(self, prefix: str) -> List[str]:
+        start = bisect_left(self.vocabulary, prefix)
+        terms = []
+        for term in self.vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def _term_scores(self, term: str, size: int, norm: np.ndarray) -> Optional[np.ndarray]:
+        posting = self.postings.get(term)
+        if posting is None:
+            return None
+        ids = np.frombuffer(posting[0], dtype=np.uint32)
+        tf = np.frombuffer(posting[1], dtype=np.uint32).astype(np.float32)
+        idf = np.log(1 + (size - len(ids) + 0.5) / (len(ids) + 0.5))
+        weights = idf * tf * (self.k1 + 1) / (tf + norm[ids])
+        return np.bincount(ids, weights=weights, minlength=size)
+
+    def search(self, query: str, limit: int = 10, offset: int = 0, prefix: bool = True) -> Dict[str, Any]:
+        """
+        Rank past prompts for a query.
+
+        Args:
+            query: Search words; the last one is matched as a prefix unless the
+                query ends with a space (or prefix=False)
+            limit: Number of results
+            offset: Results to skip (paging)
+            prefix: Allow prefix matching of the last word
+
+        Returns:
+            dict: {"total", "took_ms", "results": store records with "score" and "snippet"}
+        """
+        started = time.perf_counter()
+        self.sync()
+        with self._lock:
+            terms = tokenize(query)
+            size = len(self.doc_ids)
+            if not terms or not size:
+                return {"total": 0, "took_ms": 0.0, "results": []}
+            lengths = np.frombuffer(self.lengths, dtype=np.uint32).astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * lengths / max(self.total_length / size, 1.0))
+            scores = np.zeros(size)
+            exact = terms[:-1] if prefix and not query.endswith(" ") else terms
+            for term in set(exact):
+                term_scores = self._term_scores(term, size, norm)
+                if term_scores is not None:
+                    scores += term_scores
+            if len(exact) < len(terms):
+                # Best-matching completion of the last word counts once
+                best = np.zeros(size)
+                for term in self._expand(terms[-1]):
+                    np.maximum(best, self._term_scores(term, size, norm), out=best)
+                scores += best
+            matched = np.flatnonzero(scores > 0)
+            total = len(matched)
+            wanted = min(total, offset + limit)
+            if wanted < total:
+                matched = matched[np.argpartition(-scores[matched], wanted - 1)[:wanted]]
+            ranked = matched[np.argsort(-scores[matched], kind="stable")][offset:offset + limit]
+            hits = [(self.doc_ids[doc], float(scores[doc])) for doc in ranked]
+        results = []
+        for record_id, score in hits:
+            record = self.store.get(record_id)
+            if record is not None:
+                record.pop("path", None)
+                results.append(dict(record, score=round(score, 4), snippet=self._snippet(record_id, terms)))
+        return {"total": total, "took_ms": round((time.perf_counter() - started) * 1000, 3), "results": results}
+
+    def _snippet(self, record_id: str, terms: List[str]) -> str:
+        content = " ".join((self.store.read(record_id) or "").split())
+        lowered = content.lower()
+        positions = [p for p in (lowered.find(term) for term in terms) if p >= 0]
+        start = max(0, min(positions) - SNIPPET_CHARS // 4) if positions else 0
+        snippet = content[start:start + SNIPPET_CHARS]
+        return ("..." if start else "") + snippet + ("..." if start + SNIPPET_CHARS < len(content) else "")
+
+    def save(self):
+        """Write the index next to the store (atomically)."""
+        with self._lock:
+            terms = list(self.vocabulary)
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            np.cumsum([len(self.postings[term][0]) for term in terms], out=offsets[1:])
+
+            def concatenated(part: int) -> np.ndarray:
+                arrays = [np.frombuffer(self.postings[term][part], dtype=np.uint32) for term in terms]
+                return np.concatenate(arrays) if arrays else np.zeros(0, dtype=np.uint32)
+
+            os.makedirs(self.store.root, exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "wb") as f:
+                np.savez(
+                    f,
+                    version=np.array(SEARCH_INDEX_VERSION),
+                    doc_ids=np.array(self.doc_ids, dtype=str),
+                    lengths=np.frombuffer(self.lengths, dtype=np.uint32),
+                    terms=np.array(terms, dtype=str),
+                    offsets=offsets,
+                    docs=concatenated(0),
+                    tfs=concatenated(1),
+                )
+            os.replace(tmp, self.path)
+            self._unsaved = 0
+
+    def _load(self):
+        try:
+            # allow_pickle=False: a tampered file can fail to load but cannot run code
+            with np.load(self.path, allow_pickle=False) as state:
+                version = int(state["version"])
+                doc_ids = state["doc_ids"].tolist()
+                lengths, terms, offsets = state["lengths"], state["terms"].tolist(), state["offsets"]
+                docs, tfs = state["docs"].astype(np.uint32), state["tfs"].astype(np.uint32)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"Could not read prompt search index {self.path}, rebuilding: {e}")
+            return
+        records = self.store.records()
+        count = len(doc_ids)
+        # Only reuse an index built from this store's records, in order
+        if version != SEARCH_INDEX_VERSION or count > len(records) or (
+                count and records[count - 1]["id"] != doc_ids[-1]):
+            logger.warning(f"Prompt search index {self.path} does not match the store, rebuilding")
+            return
+        self.doc_ids = doc_ids
+        self.lengths = array("I", lengths.astype(np.uint32).tobytes())
+        self.total_length = int(lengths.sum())
+        for term, start, end in zip(terms, offsets[:-1], offsets[1:]):
+            self.postings[term] = (array("I", docs[start:end].tobytes()), array("I", tfs[start:end].tobytes()))
+        self.vocabulary = terms
+
+
+_indexes: Dict[str, PromptSearchIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_prompt_search(root: str = DEFAULT_STORE_DIR) -> PromptSearchIndex:
+    """Shared search index for a store directory (loaded and synced on first use)."""
+    key = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = PromptSearchIndex(get_prompt_store(root))
+    return index
+
+
+@atexit.register
+def save_prompt_search():
+    """Save the search indexes of this process that have unsaved records (also run at exit)."""
+    for index in list(_indexes.values()):
+        if index._unsaved:
+            try:
+                index.save()
+            except Exception as e:
+                logger.warning(f"Could not save prompt search index {index.path}: {e}")
+
+
+def notify_saved(root: str):
+    """Index newly saved records right away if this process has a search index for the store."""
+    index = _indexes.get(os.path.abspath(root))
+    if index is not None:
+        index.sync()
+
+
+def search_prompts(query: str, limit: int = 10, offset: int = 0, root: str = DEFAULT_STORE_DIR) -> Dict[str, Any]:
+    """Search the prompt history (see PromptSearchIndex.search)."""
+    return get_prompt_search(root).search(query, limit=limit, offset=offset)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search past generated prompts.")
+    parser.add_argument("query", help="Search words; the last one also matches as a prefix.")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--dir", default=DEFAULT_STORE_DIR, help=f"Store directory (default: {DEFAULT_STORE_DIR}).")
+    args = parser.parse_args(argv)
+
+    index = get_prompt_search(args.dir)
+    response = index.search(args.query, limit=args.limit)
+    index.save()
+    print(f"{response['total']} matches in {response['took_ms']:.2f} ms\n")
+    for result in response["results"]:
+        print(f"{result['score']:7.3f}  {result['id']}  {result['created_at']}  {result.get('title') or ''}")
+        print(f"         {result['snippet']}\n")
+
+
+if __name__ == "__main__":
+    main()
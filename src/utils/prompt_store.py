@@ -0,0 +1,276 @@
+"""
+Content-addressed store for generated prompts.
+
+Each prompt is saved once as a blob named by the SHA-256 of its Markdown
+(output/blobs/<2 hex>/<sha256>.md); saving identical content again only adds
+an index record. The index is an append-only JSONL file (output/index.jsonl)
+with one record per generation: id, hash, title, instruction, mode, model,
+timings, token usage and creation time. It is read into memory maps keyed by
+id and hash, so lookups are O(1) and listing never scans the output
+directory. Records appended by other processes are picked up incrementally.
+
+Usage:
+    python -m src.utils.prompt_store list [--limit 20]
+    python -m src.utils.prompt_store show <id or hash>
+    python -m src.utils.prompt_store import-legacy   # index existing output/*.md files
+"""
+import os
+import re
+import json
+import uuid
+import hashlib
+import logging
+import argparse
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.jsonl"
+LEGACY_TIMESTAMP = re.compile(r"_(\d{4}-\d{2}-\d{2}T\d{2}-\d{2}-\d{2})\.md$")
+BLOBS_DIR = "blobs"
+DEFAULT_STORE_DIR = os.getenv(
+    "OUTPUT_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "output")
+)
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def run_metadata(mode: Optional[str] = None, model: Optional[str] = None) -> Dict[str, str]:
+    """Mode and model of the current process configuration (same defaults as crew.py)."""
+    return {
+        "mode": mode or ("lean" if os.getenv("USE_LEAN_MODE", "true").lower() == "true" else "full"),
+        "model": model or os.getenv("OPENROUTER_MODEL_ID", "mistralai/mistral-7b-instruct"),
+    }
+
+
+class PromptStore:
+    """Blob directory plus append-only JSONL index with in-memory id/hash maps."""
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, INDEX_FILE)
+        self._records: List[Dict[str, Any]] = []
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_hash: Dict[str, Dict[str, Any]] = {}
+        self._offset = 0
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, BLOBS_DIR, digest[:2], f"{digest}.md")
+
+    def refresh(self):
+        """Read index records appended since the last refresh (by any process)."""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        end = data.rfind(b"\n") + 1  # leave a partially written last line for the next refresh
+        for line in data[:end].splitlines():
+            try:
+                self._remember(json.loads(line))
+            except (ValueError, TypeError, KeyError):  # bad JSON or encoding, or not a record object
+                logger.warning(f"Skipping malformed record in {self.index_path}")
+        self._offset += end
+
+    def _remember(self, record: Dict[str, Any]):
+        record_id, digest = record["id"], record["hash"]  # raise before storing a partial record
+        self._records.append(record)
+        self._by_id[record_id] = record
+        self._by_hash[digest] = record  # latest generation of this content
+
+    def add_many(self, entries: Iterable[Dict[str, Any]], fsync: bool = False) -> List[Dict[str, Any]]:
+        """
+        Store several prompts with one index append.
+
+        Args:
+            entries: Dicts with "content" and "instruction", plus optional "title",
+                "mode", "model", "timings", "usage" (tokens and cost, see utils.usage)
+                and "created_at"
+            fsync: fsync new blobs, the index and their directories before returning
+
+        Returns:
+            list: The index records, each with "path" and "duplicate" (content already stored)
+        """
+        records, lines, synced = [], [], set()
+        for entry in entries:
+            content = entry["content"]
+            digest = content_hash(content)
+            path = self.blob_path(digest)
+            duplicate = os.path.exists(path)
+            if not duplicate:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(content)
+                    if fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                os.replace(tmp, path)
+                synced.add(os.path.dirname(path))
+            record = {
+                "id": uuid.uuid4().hex[:12],
+                "hash": digest,
+                "title": entry.get("title"),
+                "instruction": entry["instruction"],
+                "mode": entry.get("mode"),
+                "model": entry.get("model"),
+                "timings": entry.get("timings") or {},
+                "usage": entry.get("usage") or {},
+                "size": len(content.encode("utf-8")),
+                "created_at": entry.get("created_at") or datetime.now().isoformat(timespec="seconds"),
+            }
+            lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+            records.append(dict(record, path=path, duplicate=duplicate))
+        if not lines:
+            return records
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            self._refresh()
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write("".join(lines))
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._refresh()
+        if fsync:
+            for directory in synced | {self.root}:
+                _fsync_dir(directory)
+        return records
+
+    def add(self, content: str, instruction: str, **fields) -> Dict[str, Any]:
+        """Store one prompt (see add_many)."""
+        return self.add_many([dict(fields, content=content, instruction=instruction)])[0]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Record by id or content hash (the latest generation for a hash)."""
+        with self._lock:
+            record = self._by_id.get(key) or self._by_hash.get(key)
+            if record is None:
+                self._refresh()
+                record = self._by_id.get(key) or self._by_hash.get(key)
+        return dict(record, path=self.blob_path(record["hash"])) if record else None
+
+    def read(self, key: str) -> Optional[str]:
+        """Prompt Markdown for an id or hash."""
+        record = self.get(key)
+        if record is None:
+            return None
+        with open(record["path"], encoding="utf-8") as f:
+            return f.read()
+
+    def list(self, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Records, newest first."""
+        with self._lock:
+            self._refresh()
+            stop = len(self._records) - offset
+            return [dict(r) for r in reversed(self._records[max(0, stop - limit):max(0, stop)])]
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Every record, oldest first."""
+        with self._lock:
+            self._refresh()
+            return list(self._records)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._records)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            return {"records": len(self._records), "blobs": len(self._by_hash), "index": self.index_path}
+
+
+def _fsync_dir(path: str):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # directories cannot be opened on Windows
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+_stores: Dict[str, PromptStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_prompt_store(root: str = DEFAULT_STORE_DIR) -> PromptStore:
+    """Shared store for a directory (one in-memory index per process)."""
+    key = os.path.abspath(root)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = PromptStore(root)
+        return store
+
+
+def import_legacy_outputs(store: PromptStore) -> int:
+    """Index the `<title>_<hash>_<timestamp>.md` files written before the store existed."""
+    known = {record["hash"] for record in store.records()}
+    entries = []
+    for name in sorted(os.listdir(store.root)):
+        path = os.path.join(store.root, name)
+        if not name.endswith(".md") or not os.path.isfile(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+        if content_hash(content) in known:
+            continue
+        first_line = content.splitlines()[0] if content else ""
+        stamp = LEGACY_TIMESTAMP.search(name)
+        created = (datetime.strptime(stamp.group(1), "%Y-%m-%dT%H-%M-%S") if stamp
+                   else datetime.fromtimestamp(os.path.getmtime(path)))
+        entries.append({
+            "content": content,
+            "instruction": "",
+            "title": first_line[2:].strip() if first_line.startswith("# ") else name[:-3],
+            "created_at": created.isoformat(timespec="seconds"),
+        })
+    store.add_many(entries)
+    return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Browse the content-addressed prompt store.")
+    parser.add_argument("--dir", default=DEFAULT_STORE_DIR, help=f"Store directory (default: {DEFAULT_STORE_DIR}).")
+    sub = parser.add_subparsers(dest="command", required=True)
+    listing = sub.add_parser("list", help="List stored prompts, newest first.")
+    listing.add_argument("--limit", type=int, default=20)
+    show = sub.add_parser("show", help="Print a stored prompt.")
+    show.add_argument("key", help="Record id or content hash.")
+    sub.add_parser("import-legacy", help="Index existing <title>_<hash>_<timestamp>.md files.")
+    args = parser.parse_args(argv)
+
+    store = PromptStore(args.dir)
+    if args.command == "list":
+        for record in store.list(args.limit):
+            print(f"{record['id']}  {record['hash'][:12]}  {record['created_at']}  {record.get('mode') or '-':<5}  "
+                  f"{record.get('title') or record['instruction'][:60]}")
+        print(f"\n{store.stats()['records']} records, {store.stats()['blobs']} unique prompts")
+    elif args.command == "show":
+        content = store.read(args.key)
+        if content is None:
+            parser.exit(1, f"No prompt with id or hash '{args.key}'\n")
+        print(content)
+    else:
+        print(f"Imported {import_legacy_outputs(store)} legacy output files into {store.index_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,12 @@
 import time
 
+try:
+    from .tracing import current_span
+    from .metrics import RETRIES
+except ImportError:
+    from tracing import current_span
+    from metrics import RETRIES
+
 def run_with_retries(fn, inputs=None, retries=3, delay=5):
     """
     Runs a function with retry logic.
@@ -19,6 +26,8 @@ def run_with_retries(fn, inputs=None, retries=3, delay=5):
             return fn(inputs=inputs)
         except Exception as e:
             last_exception = e
+            RETRIES.inc()
+            current_span().add_event("retry", attempt=attempt, retries=retries, error=str(e)[:200])
             print(f"[Retry {attempt}/{retries}] Error: {e}")
             if attempt < retries:
                 print(f"Retrying in {delay} seconds...")
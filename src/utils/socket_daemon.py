@@ -0,0 +1,134 @@
+import os
+import json
+import socket
+import logging
+import tempfile
+import socketserver
+from typing import Any, Callable, Dict, Optional
+
+from .log_context import export_context, log_context
+
+logger = logging.getLogger(__name__)
+
+# Newline-delimited JSON over a Unix domain socket: one request line, one response line.
+ENV_VAR_SOCKET_PATH = "PROMPTWEAVER_SOCKET"
+CONNECT_TIMEOUT = 0.2  # seconds; detection must stay cheap when no daemon is running
+REQUEST_TIMEOUT = 900  # seconds; a full-mode crew run can take several minutes
+
+
+def is_supported() -> bool:
+    return hasattr(socket, "AF_UNIX")
+
+
+def default_socket_path() -> str:
+    """Socket path from PROMPTWEAVER_SOCKET, or a per-user file in the temp directory."""
+    override = os.getenv(ENV_VAR_SOCKET_PATH)
+    if override:
+        return override
+    uid = os.getuid() if hasattr(os, "getuid") else "user"
+    return os.path.join(tempfile.gettempdir(), f"promptweaver-{uid}.sock")
+
+
+def send_request(socket_path: str, payload: Dict[str, Any], timeout: float = REQUEST_TIMEOUT) -> Dict[str, Any]:
+    """
+    Send one request to the daemon and wait for its response.
+
+    Raises:
+        OSError: If the daemon is not reachable.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(socket_path)
+        sock.settimeout(timeout)
+        # The caller's log correlation fields travel with the request
+        sock.sendall(json.dumps(dict(payload, log_context=export_context())).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError("Daemon closed the connection without a response")
+    return json.loads(line)
+
+
+def daemon_available(socket_path: str) -> bool:
+    """Return True if a daemon is listening on socket_path and answers a ping."""
+    if not is_supported() or not os.path.exists(socket_path):
+        return False
+    try:
+        return send_request(socket_path, {"op": "ping"}, timeout=CONNECT_TIMEOUT).get("ok", False)
+    except (OSError, ValueError):
+        return False
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            if request.get("op") == "ping":
+                response = {"ok": True, "pid": os.getpid()}
+            else:
+                with log_context(**(request.pop("log_context", None) or {})):
+                    response = self.server.handle_request_payload(request)
+        except Exception as e:
+            logger.exception(f"Daemon request failed: {e}")
+            response = {"ok": False, "error": str(e)}
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+
+
+class _DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, handler: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        self.handle_request_payload = handler
+        super().__init__(socket_path, _RequestHandler)
+
+
+def create_server(handler: Callable[[Dict[str, Any]], Dict[str, Any]],
+                  socket_path: Optional[str] = None) -> socketserver.BaseServer:
+    """
+    Bind the daemon socket (owner-only) without serving yet.
+
+    Args:
+        handler: Called with each decoded request dict (in its own thread);
+            returns the response dict.
+        socket_path: Path of the socket file (default: default_socket_path()).
+
+    Raises:
+        RuntimeError: If Unix sockets are unsupported or a daemon is already running.
+    """
+    if not is_supported():
+        raise RuntimeError("Unix domain sockets are not supported on this platform")
+    socket_path = socket_path or default_socket_path()
+    if os.path.exists(socket_path):
+        if daemon_available(socket_path):
+            raise RuntimeError(f"A PromptWeaver daemon is already listening on {socket_path}")
+        os.unlink(socket_path)  # Stale socket from a daemon that did not shut down cleanly
+
+    # Created with mode 0600 by bind itself, so there is no window in which other users can connect
+    previous_umask = os.umask(0o077)
+    try:
+        return _DaemonServer(socket_path, handler)
+    finally:
+        os.umask(previous_umask)
+
+
+def serve(handler: Callable[[Dict[str, Any]], Dict[str, Any]], socket_path: Optional[str] = None):
+    """
+    Serve requests on a Unix domain socket until interrupted (see create_server).
+
+    Raises:
+        RuntimeError: If Unix sockets are unsupported or a daemon is already running.
+    """
+    socket_path = socket_path or default_socket_path()
+    server = create_server(handler, socket_path)
+    logger.info(f"PromptWeaver daemon listening on {socket_path} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("PromptWeaver daemon shutting down.")
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
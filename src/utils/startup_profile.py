@@ -0,0 +1,82 @@
+"""
+Import-time profile for PromptWeaver entry points.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and
+summarises where the startup time goes.
+
+Usage:
+    python -m src.utils.startup_profile                 # profiles src.api
+    python -m src.utils.startup_profile src.crew --top 30
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_import(module: str) -> Tuple[float, str]:
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Returns:
+        tuple: (wall-clock seconds for the whole interpreter run, raw importtime stderr)
+    """
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT, LOG_FILE_ENABLE="false")
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if proc.returncode != 0:
+        tail = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")][-5:]
+        raise RuntimeError(f"Importing {module} failed:\n" + "\n".join(tail))
+    return elapsed, proc.stderr
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """Parse importtime output into (module, self_us, cumulative_us, depth) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def top_level_packages(rows: List[Tuple[str, int, int, int]]) -> Dict[str, int]:
+    """Total self time (us) per top-level package, e.g. all of crewai.* under 'crewai'."""
+    totals: Dict[str, int] = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        totals[name.split(".")[0]] += self_us
+    return dict(totals)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the import time of a PromptWeaver module.")
+    parser.add_argument("module", nargs="?", default="src.api", help="Module to import (default: src.api).")
+    parser.add_argument("--top", type=int, default=20, help="Number of packages to list (default: 20).")
+    args = parser.parse_args(argv)
+
+    elapsed, stderr = measure_import(args.module)
+    rows = parse_importtime(stderr)
+    totals = top_level_packages(rows)
+    total_us = sum(totals.values())
+
+    print(f"Import profile for '{args.module}': {elapsed * 1000:.0f} ms wall clock, "
+          f"{total_us / 1000:.0f} ms in imports ({len(rows)} modules)\n")
+    print(f"{'package':<32} {'self ms':>10} {'share':>7}")
+    for package, self_us in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{package:<32} {self_us / 1000:>10.1f} {self_us / max(total_us, 1):>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+"""
+Tracing spans for crew runs, stages, CrewAI tasks, LLM calls and retrievals.
+
+Spans follow the OpenTelemetry data model (trace id, span id, parent span id,
+start/end time in Unix nanoseconds, attributes, status, events) and are
+parented through contextvars, so they follow asyncio tasks, asyncio.to_thread
+and bind_context()-wrapped pool workers like the log correlation fields. Each
+span also carries the task and run id from utils.log_context. Finished spans
+go to the span listeners (utils.metrics derives its latency metrics from
+them) and, unless TRACING_ENABLED=false, to a background exporter that
+appends them to traces/spans.jsonl and, when OTEL_EXPORTER_OTLP_ENDPOINT is
+set, posts them to an OTLP/HTTP collector (JSON encoding, no extra
+dependencies).
+
+Usage:
+    python -m src.utils.tracing list [--limit 20]
+    python -m src.utils.tracing waterfall <task id | run id | trace id>
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import argparse
+import threading
+import contextvars
+import urllib.request
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from .log_context import current_context, log_context
+    from .profiling import profile_stage
+except ImportError:
+    from log_context import current_context, log_context
+    from profiling import profile_stage
+
+logger = logging.getLogger(__name__)
+
+# Export spans (they are always created for the span listeners, e.g. metrics)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_DIR = os.getenv(
+    "TRACE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "traces")
+)
+TRACE_FILE = "spans.jsonl"
+# spans.jsonl is moved to spans.jsonl.1 when it grows past this size
+TRACE_MAX_MB = float(os.getenv("TRACE_MAX_MB", "50"))
+# Base URL of an OTLP/HTTP collector, e.g. http://localhost:4318 (spans go to /v1/traces)
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT", "")
+if not OTLP_ENDPOINT and os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+    OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT").rstrip("/") + "/v1/traces"
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "promptweaver")
+EXPORT_BATCH_SIZE = 128
+EXPORT_INTERVAL_S = 1.0
+
+
+class Span:
+    """One timed operation; finished spans are handed to the exporter."""
+
+    __slots__ = ("trace_id", "span_id", "parent_span_id", "name", "start_ns", "end_ns",
+                 "attributes", "events", "status", "status_message")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent.span_id if parent else None
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.events: List[Dict[str, Any]] = []
+        self.status = "UNSET"
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes: Any):
+        self.events.append({"name": name, "time_unix_nano": time.time_ns(), "attributes": attributes})
+
+    def set_status(self, status: str, message: str = ""):
+        self.status = status
+        self.status_message = message
+
+    def record_exception(self, error: BaseException):
+        self.set_status("ERROR", f"{type(error).__name__}: {error}")
+        self.add_event("exception", **{"exception.type": type(error).__name__, "exception.message": str(error)})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "kind": "INTERNAL",
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": {"code": self.status, "message": self.status_message},
+            "resource": {"service.name": SERVICE_NAME},
+        }
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def add_event(self, name, **attributes):
+        pass
+
+    def set_status(self, status, message=""):
+        pass
+
+    def record_exception(self, error):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+_current_span: contextvars.ContextVar = contextvars.ContextVar("trace_span", default=None)
+_span_listeners: List[Callable[[Span], None]] = []
+
+
+def add_span_listener(listener: Callable[[Span], None]):
+    """Call listener with every finished span (on the thread that ran it; keep it cheap)."""
+    _span_listeners.append(listener)
+
+
+def current_span():
+    """The active span (a no-op span when tracing is off or no span is open)."""
+    return _current_span.get() or NOOP_SPAN
+
+
+@contextmanager
+def span(name: str, require_parent: bool = False, **attributes: Any) -> Iterator[Any]:
+    """
+    Time the enclosed block as a child of the active span (or as a new trace).
+
+    With require_parent, the block is only traced inside another span, so
+    operations such as retrievals are recorded as part of a run but not when
+    called on their own (benchmarks, scripts).
+    """
+    parent = _current_span.get()
+    if require_parent and parent is None:
+        yield NOOP_SPAN
+        return
+    fields = current_context()
+    for key in ("task_id", "run_id"):
+        if key in fields:
+            attributes.setdefault(key.replace("_", "."), fields[key])
+    current = Span(name, parent, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        if current.status == "UNSET":
+            current.status = "OK"
+        for listener in _span_listeners:
+            try:
+                listener(current)
+            except Exception as e:
+                logger.debug(f"Span listener failed: {e}")
+        if TRACING_ENABLED:
+            get_exporter().export(current)
+
+
+@contextmanager
+def stage_span(name: str, **attributes: Any) -> Iterator[Any]:
+    """A pipeline stage: sets the log "stage" field, opens a "stage.<name>" span and tags profile samples."""
+    with log_context(stage=name), span(f"stage.{name}", **attributes) as current, profile_stage(name):
+        yield current
+
+
+def traced(name: str, require_parent: bool = False) -> Callable:
+    """Decorator: run each call inside span(name, require_parent=require_parent)."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, require_parent=require_parent):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# === CrewAI instrumentation ===
+def _short(text: Any, limit: int = 80) -> str:
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def instrument_crewai_tasks():
+    """Wrap crewai Task.execute_sync so every task run by a crew gets a "task" span (idempotent)."""
+    try:
+        from crewai import Task
+    except ImportError:
+        return
+    original = getattr(Task, "execute_sync", None)
+    if original is None or getattr(original, "_traced", False):
+        return
+
+    @wraps(original)
+    def execute_sync(self, *args, **kwargs):
+        agent = kwargs.get("agent") or (args[0] if args else None) or getattr(self, "agent", None)
+        role = getattr(agent, "role", None) or "task"
+        with span(f"task {getattr(self, 'name', None) or role}", require_parent=True, **{
+            "crewai.agent": role,
+            "crewai.task": _short(getattr(self, "description", "")),
+        }), profile_stage(f"task:{role}"):
+            return original(self, *args, **kwargs)
+
+    execute_sync._traced = True
+    Task.execute_sync = execute_sync
+
+
+# The "llm.call" span of the completion running in this thread/task
+_llm_call_span: contextvars.ContextVar = contextvars.ContextVar("llm_call_span", default=None)
+
+
+def _response_tokens(usage: Any) -> Tuple[int, int]:
+    """(prompt, completion) tokens from a response's usage (dict or object; OpenAI, Anthropic or Bedrock names)."""
+    def field(*names: str) -> int:
+        for name in names:
+            value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+            if value:
+                return int(value)
+        return 0
+    return (field("prompt_tokens", "input_tokens", "inputTokens"),
+            field("completion_tokens", "output_tokens", "outputTokens"))
+
+
+def instrument_llm(llm: Any) -> Any:
+    """
+    Wrap the call() method of the LLM's class so every completion gets an
+    "llm.call" span (idempotent).
+
+    Tokens come from each response's usage, which crewai passes to the LLM's
+    _track_token_usage_internal while the call runs. That hook is wrapped too
+    and books the usage on the span of the call in progress in the same
+    thread, so concurrent calls on a shared LLM instance (variant branches,
+    A2A tasks) each get their own counts.
+    """
+    if llm is None:
+        return llm
+    cls = type(llm)
+    original = getattr(cls, "call", None)
+    if original is None or getattr(original, "_traced", False):
+        return llm
+
+    @wraps(original)
+    def call(self, messages, *args, **kwargs):
+        with span("llm.call", require_parent=True, **{
+            "llm.model": str(getattr(self, "model", "")),
+            "llm.temperature": getattr(self, "temperature", None),
+            "llm.messages": len(messages) if isinstance(messages, list) else 1,
+        }) as current:
+            token = _llm_call_span.set(current)
+            try:
+                result = original(self, messages, *args, **kwargs)
+            finally:
+                _llm_call_span.reset(token)
+            current.set_attribute("llm.response_chars", len(str(result or "")))
+            return result
+
+    call._traced = True
+    cls.call = call
+
+    original_track = getattr(cls, "_track_token_usage_internal", None)
+    if original_track is not None and not getattr(original_track, "_traced", False):
+        @wraps(original_track)
+        def track_token_usage(self, usage, *args, **kwargs):
+            result = original_track(self, usage, *args, **kwargs)
+            current = _llm_call_span.get()
+            if isinstance(current, Span) and usage:
+                # A call with tool rounds reports usage once per response
+                for kind, used in zip(("prompt", "completion"), _response_tokens(usage)):
+                    if used:
+                        key = f"llm.{kind}_tokens"
+                        current.set_attribute(key, current.attributes.get(key, 0) + used)
+            return result
+
+        track_token_usage._traced = True
+        cls._track_token_usage_internal = track_token_usage
+    return llm
+
+
+# === Export ===
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+def to_otlp(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """OTLP/JSON ExportTraceServiceRequest body for span dicts."""
+    status_codes = {"UNSET": 0, "OK": 1, "ERROR": 2}
+    return {"resourceSpans": [{
+        "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+        "scopeSpans": [{
+            "scope": {"name": "promptweaver.tracing"},
+            "spans": [{
+                "traceId": s["trace_id"],
+                "spanId": s["span_id"],
+                "parentSpanId": s["parent_span_id"] or "",
+                "name": s["name"],
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(s["start_time_unix_nano"]),
+                "endTimeUnixNano": str(s["end_time_unix_nano"]),
+                "attributes": _otlp_attributes(s["attributes"]),
+                "events": [{"name": e["name"], "timeUnixNano": str(e["time_unix_nano"]),
+                            "attributes": _otlp_attributes(e["attributes"])} for e in s["events"]],
+                "status": {"code": status_codes[s["status"]["code"]], "message": s["status"]["message"]},
+            } for s in spans],
+        }],
+    }]}
+
+
+class SpanExporter:
+    """Writes finished spans to a JSONL file (and an OTLP collector) from a background thread."""
+
+    def __init__(self, trace_dir: str = TRACE_DIR, otlp_endpoint: str = OTLP_ENDPOINT):
+        self.path = os.path.join(trace_dir, TRACE_FILE)
+        self.otlp_endpoint = otlp_endpoint
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._otlp_failed = False
+
+    def export(self, finished: Span):
+        self._queue.put(finished.to_dict())
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                    self._thread.start()
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < EXPORT_BATCH_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            time.sleep(EXPORT_INTERVAL_S)
+            self.flush()
+
+    def flush(self):
+        """Write out every queued span (called periodically and at exit)."""
+        with self._lock:
+            while True:
+                batch = self._drain()
+                if not batch:
+                    return
+                self._write(batch)
+                if self.otlp_endpoint:
+                    self._post(batch)
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if TRACE_MAX_MB and os.path.exists(self.path) and os.path.getsize(self.path) > TRACE_MAX_MB * 1024 * 1024:
+                os.replace(self.path, f"{self.path}.1")
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(s, ensure_ascii=False, default=str) + "\n" for s in batch))
+        except OSError as e:
+            logger.warning(f"Could not write spans to {self.path}: {e}")
+
+    def _post(self, batch: List[Dict[str, Any]]):
+        request = urllib.request.Request(
+            self.otlp_endpoint, data=json.dumps(to_otlp(batch)).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=2):
+                pass
+            self._otlp_failed = False
+        except OSError as e:
+            if not self._otlp_failed:  # warn once per outage
+                logger.warning(f"OTLP export to {self.otlp_endpoint} failed: {e}")
+            self._otlp_failed = True
+
+
+_exporter: Optional[SpanExporter] = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> SpanExporter:
+    """Process-wide exporter (flushed at exit)."""
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = SpanExporter()
+                atexit.register(_exporter.flush)
+    return _exporter
+
+
+# === Reading traces ===
+def load_spans(trace_dir: str = TRACE_DIR) -> List[Dict[str, Any]]:
+    """Every exported span in trace_dir (the rotated file first)."""
+    spans = []
+    base = os.path.join(trace_dir, TRACE_FILE)
+    for path in (f"{base}.1", base):
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        spans.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue  # partially written last line
+        except FileNotFoundError:
+            continue
+    return spans
+
+
+def find_traces(spans: List[Dict[str, Any]], key: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Spans grouped by trace id, for traces with a span matching a task id, run id or trace id."""
+    wanted = {s["trace_id"] for s in spans if key in (
+        s["trace_id"], s["attributes"].get("task.id"), s["attributes"].get("run.id"))}
+    traces: Dict[str, List[Dict[str, Any]]] = {}
+    for s in spans:
+        if s["trace_id"] in wanted:
+            traces.setdefault(s["trace_id"], []).append(s)
+    return traces
+
+
+def render_waterfall(trace: List[Dict[str, Any]], width: int = 40) -> List[str]:
+    """Indented span tree with start offset, duration and a timeline bar."""
+    start = min(s["start_time_unix_nano"] for s in trace)
+    end = max(s["end_time_unix_nano"] for s in trace)
+    total = max(end - start, 1)
+    ids = {s["span_id"] for s in trace}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for s in sorted(trace, key=lambda s: s["start_time_unix_nano"]):
+        parent = s["parent_span_id"] if s["parent_span_id"] in ids else None
+        children.setdefault(parent, []).append(s)
+
+    lines = []
+
+    def visit(s: Dict[str, Any], depth: int):
+        offset = s["start_time_unix_nano"] - start
+        duration = s["end_time_unix_nano"] - s["start_time_unix_nano"]
+        left = int(offset / total * width)
+        bar = " " * left + "█" * max(1, int(round(duration / total * width)))
+        marker = " !" if s["status"]["code"] == "ERROR" else ""
+        name = ("  " * depth + s["name"])[:44]
+        lines.append(f"{offset / 1e9:8.2f}s {duration / 1e9:8.2f}s  {name:<44} |{bar[:width]:<{width}}|{marker}")
+        for child in children.get(s["span_id"], []):
+            visit(child, depth + 1)
+
+    for root in children.get(None, []):
+        visit(root, 0)
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect exported tracing spans.")
+    parser.add_argument("--dir", default=TRACE_DIR, help=f"Trace directory (default: {TRACE_DIR}).")
+    sub = parser.add_subparsers(dest="command", required=True)
+    listing = sub.add_parser("list", help="Recent traces, newest first.")
+    listing.add_argument("--limit", type=int, default=20)
+    waterfall = sub.add_parser("waterfall", help="Span waterfall for a task id, run id or trace id.")
+    waterfall.add_argument("key")
+    args = parser.parse_args(argv)
+
+    spans = load_spans(args.dir)
+    if args.command == "list":
+        roots = [s for s in spans if not s["parent_span_id"]]
+        for s in sorted(roots, key=lambda s: s["start_time_unix_nano"], reverse=True)[:args.limit]:
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(s["start_time_unix_nano"] / 1e9))
+            duration = (s["end_time_unix_nano"] - s["start_time_unix_nano"]) / 1e9
+            print(f"{started}  {duration:8.2f}s  {s['status']['code']:<5}  task={s['attributes'].get('task.id', '-')}  "
+                  f"run={s['attributes'].get('run.id', '-')}  {s['name']}")
+        return
+    traces = find_traces(spans, args.key)
+    if not traces:
+        parser.exit(1, f"No spans for '{args.key}' in {args.dir}\n")
+    for trace_id, trace in sorted(traces.items(), key=lambda item: min(s["start_time_unix_nano"] for s in item[1])):
+        root = min(trace, key=lambda s: s["start_time_unix_nano"])
+        print(f"\ntrace {trace_id}  task={root['attributes'].get('task.id', '-')}  "
+              f"run={root['attributes'].get('run.id', '-')}  {len(trace)} spans")
+        print(f"{'start':>9} {'duration':>9}  {'span':<44} timeline")
+        for line in render_waterfall(trace):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Token usage and estimated cost per task, stage and model.
+
+LLM calls are already traced as "llm.call" spans carrying the model and the
+prompt/completion token counts (see utils.tracing). A span listener adds each
+finished call to the UsageLedger opened by collect_usage() in the current
+context, so a ledger follows its run into asyncio.to_thread and
+bind_context()-wrapped pool workers. Calls made inside a CrewAI task are
+booked under "task:<agent role>", other calls under the log "stage" field.
+
+Costs are estimates from a price table in USD per million tokens. LLM_PRICES
+overrides or extends the defaults, either as inline JSON or as the path of a
+JSON file, keyed by model with "prompt" and "completion" prices; "*" prices
+any model that is not listed. Models without a price count tokens but no
+cost and are reported under "unpriced_models". Every call also feeds the
+promptweaver_llm_cost_usd_total and promptweaver_stage_tokens_total metrics.
+
+Usage:
+    with collect_usage() as usage:
+        run_prompt_weaver_crew(instruction)
+    usage.summary()  # tokens, cost_usd, stages, models
+"""
+import os
+import json
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+try:
+    from .log_context import current_context
+    from .metrics import LLM_COST, STAGE_TOKENS, split_model
+    from .tracing import add_span_listener, current_span
+except ImportError:
+    from log_context import current_context
+    from metrics import LLM_COST, STAGE_TOKENS, split_model
+    from tracing import add_span_listener, current_span
+
+logger = logging.getLogger(__name__)
+
+# USD per million tokens (OpenRouter list prices for the default model and the OpenAI fallback)
+DEFAULT_PRICES: Dict[str, Dict[str, float]] = {
+    "openrouter/mistralai/mistral-7b-instruct": {"prompt": 0.028, "completion": 0.054},
+    "openai/gpt-3.5-turbo": {"prompt": 0.5, "completion": 1.5},
+}
+# Log a warning when one task's estimated cost goes past this (0 disables)
+USAGE_BUDGET_USD = float(os.getenv("USAGE_BUDGET_USD", "0"))
+
+
+def load_prices(spec: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """DEFAULT_PRICES updated with LLM_PRICES (inline JSON or a JSON file path)."""
+    prices = {model: dict(price) for model, price in DEFAULT_PRICES.items()}
+    spec = os.getenv("LLM_PRICES", "") if spec is None else spec
+    if not spec.strip():
+        return prices
+    try:
+        if spec.lstrip().startswith("{"):
+            overrides = json.loads(spec)
+        else:
+            with open(spec, encoding="utf-8") as f:
+                overrides = json.load(f)
+        for model, price in overrides.items():
+            prices[model] = {"prompt": float(price.get("prompt", 0)), "completion": float(price.get("completion", 0))}
+    except (OSError, ValueError, AttributeError) as e:
+        logger.warning(f"Ignoring LLM_PRICES ({e}); using the default price table")
+    return prices
+
+
+PRICES = load_prices()
+
+
+def price_for(model: str, prices: Optional[Dict[str, Dict[str, float]]] = None) -> Optional[Dict[str, float]]:
+    """Price of a model, matched with or without its provider prefix, else the "*" price."""
+    prices = PRICES if prices is None else prices
+    if model in prices:
+        return prices[model]
+    _, name = split_model(model)
+    return prices.get(name) or prices.get("*")
+
+
+def _cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    price = price_for(model)
+    if price is None:
+        return None
+    return (prompt_tokens * price["prompt"] + completion_tokens * price["completion"]) / 1e6
+
+
+def _empty() -> Dict[str, Any]:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+
+
+class UsageLedger:
+    """Token counts and estimated cost of the LLM calls made while it is active."""
+
+    def __init__(self, parent: Optional["UsageLedger"] = None):
+        self.parent = parent
+        self._entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._unpriced = set()
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, model: str, prompt_tokens: int, completion_tokens: int, cost: Optional[float]):
+        with self._lock:
+            entry = self._entries.get((stage, model))
+            if entry is None:
+                entry = self._entries[(stage, model)] = _empty()
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            if cost is None:
+                self._unpriced.add(model)
+            else:
+                entry["cost_usd"] += cost
+        if self.parent is not None:
+            self.parent.add(stage, model, prompt_tokens, completion_tokens, cost)
+
+    @property
+    def cost_usd(self) -> float:
+        with self._lock:
+            return sum(entry["cost_usd"] for entry in self._entries.values())
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals plus "stages" and "models" breakdowns (JSON-serialisable)."""
+        with self._lock:
+            entries = {key: dict(entry) for key, entry in self._entries.items()}
+            unpriced = sorted(self._unpriced)
+        total, stages, models = _empty(), {}, {}
+        for (stage, model), entry in entries.items():
+            for bucket in (total, stages.setdefault(stage, _empty()), models.setdefault(model, _empty())):
+                for key, value in entry.items():
+                    bucket[key] += value
+        for bucket in [total, *stages.values(), *models.values()]:
+            bucket["total_tokens"] = bucket["prompt_tokens"] + bucket["completion_tokens"]
+            bucket["cost_usd"] = round(bucket["cost_usd"], 6)
+        total.update(stages=stages, models=models)
+        if unpriced:
+            total["unpriced_models"] = unpriced
+        return total
+
+
+_ledger: contextvars.ContextVar = contextvars.ContextVar("usage_ledger", default=None)
+
+
+@contextmanager
+def collect_usage(ledger: Optional[UsageLedger] = None) -> Iterator[UsageLedger]:
+    """
+    Book the LLM calls of the enclosed block on a ledger (a new one, or the
+    given one to keep adding to it, e.g. for a task's follow-up refinements).
+    Calls also count towards any ledger already active around the block.
+    """
+    ledger = ledger or UsageLedger()
+    outer = _ledger.get()
+    if outer is not None and ledger is not outer and ledger.parent is None:
+        ledger.parent = outer
+    token = _ledger.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _ledger.reset(token)
+        if USAGE_BUDGET_USD and ledger.cost_usd > USAGE_BUDGET_USD:
+            logger.warning("Estimated LLM cost $%.4f is over the USAGE_BUDGET_USD budget of $%.4f",
+                           ledger.cost_usd, USAGE_BUDGET_USD)
+
+
+def _stage() -> str:
+    """The CrewAI task (the finished LLM span's parent) or else the log stage of the call."""
+    parent = current_span()
+    if getattr(parent, "name", "").startswith("task "):
+        return f"task:{parent.attributes.get('crewai.agent', parent.name[5:])}"
+    return current_context().get("stage") or "other"
+
+
+def record_usage(span) -> None:
+    """Span listener: book finished LLM calls on the active ledger and the cost/stage metrics."""
+    if span.name not in ("llm.call", "llm.fallback_completion"):
+        return
+    attributes = span.attributes
+    prompt_tokens = int(attributes.get("llm.prompt_tokens") or 0)
+    completion_tokens = int(attributes.get("llm.completion_tokens") or 0)
+    model = attributes.get("llm.model") or "openai/fallback"
+    stage = _stage()
+    cost = _cost(model, prompt_tokens, completion_tokens)
+    if cost:
+        LLM_COST.labels(*split_model(model)).inc(cost)
+    metric_stage = "variant" if stage.startswith("variant-") else stage
+    for kind, tokens in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+        if tokens:
+            STAGE_TOKENS.labels(metric_stage, kind).inc(tokens)
+    ledger = _ledger.get()
+    if ledger is not None:
+        ledger.add(stage, model, prompt_tokens, completion_tokens, cost)
+
+
+add_span_listener(record_usage)